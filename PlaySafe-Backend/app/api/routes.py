@@ -1,14 +1,68 @@
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, Request, UploadFile, File, Form, Query, Body
+from fastapi.responses import StreamingResponse, Response
+import asyncio
+import json
 import shutil
 import os
+import re
+import time
 
-from app.services.video_processor import process_video
+from app.services.video_processor import process_video, run_detection, encode_processed_video
 from app.services.feature_engineer import compute_formation_metrics
 from app.services.risk_analyzer import analyze_tactics
-from app.services.llm_tactics import enrich_tactics_with_llm, analyze_injury_with_llm
-from app.services.pose_extractor import analyze_posture_file
-from app.services.baseline_model import update_posture_baseline, load_posture_baseline
-from typing import Optional
+from app.services.tactical_timeline import build_match_timeline
+from app.services.heatmaps import load_heatmap
+from app.services.admission import (
+    probe_media,
+    estimate_job,
+    admission,
+    admission_info,
+    admission_status,
+    preflight,
+)
+from app.services.llm_tactics import (
+    enrich_tactics_with_llm,
+    analyze_injury_with_llm,
+    analyze_squad_injury_with_llm,
+    stream_injury_analysis,
+)
+from app.services.llm_cache import cache_stats
+from app.services.pose_extractor import analyze_posture_events, get_pose_pool, select_pose_plan, pose_tiers
+from app.services.cancellation import (
+    JobCancelled,
+    start_job,
+    finish_job,
+    cancel_job,
+    active_jobs,
+    check_cancelled,
+    use_job,
+    gather_cancellable,
+    cancel_pending,
+    in_pool_job,
+)
+from app.services.scheduler import run_in_lane, lane_for, scheduler_status
+from app.services.live_stream import start_session, stop_session, live_sessions, latest_update
+from app.models.event_index import record_events, query_events
+from app.utils.metrics import (
+    stage_timer,
+    observe,
+    timed_call,
+    inc,
+    start_breakdown,
+    use_breakdown,
+    timing_breakdown,
+    render_prometheus,
+)
+from app.models.session_history import append_session, get_history
+from app.services.baseline_model import (
+    update_posture_baseline,
+    load_posture_baseline,
+    load_squad_baselines,
+    export_posture_baseline,
+    merge_posture_baseline,
+    summarize_posture_baseline,
+)
+from typing import List, Optional
 
 
 router = APIRouter()
@@ -17,6 +71,18 @@ router = APIRouter()
 UPLOAD_DIR = "data/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def _safe_name(name):
+    # Client-supplied names become upload paths: keep only the last path
+    # component, a conservative character set and no leading dots.
+    name = os.path.basename((name or "").replace("\\", "/"))
+    name = UNSAFE_NAME_CHARS.sub("_", name).lstrip(".")
+    if not name:
+        raise ValueError("Invalid file or player name.")
+    return name
+
 
 # ==============================
 # BASELINE TRAIN / PLAYER RISK
@@ -27,7 +93,7 @@ async def upload_baseline(
     file: UploadFile = File(...)
 ):
     try:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+        file_path = os.path.join(UPLOAD_DIR, _safe_name(file.filename))
 
         # Save file
         with open(file_path, "wb") as buffer:
@@ -69,73 +135,172 @@ async def upload_baseline(
 # ==============================
 @router.post("/analyze-match/")
 async def analyze_match(
+    request: Request,
     player_id: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    job_id: Optional[str] = Form(None),
 ):
+    # job_id (optional, client-chosen) lets the client cancel the run through
+    # POST /jobs/{job_id}/cancel; closing the connection cancels it too.
+    start_breakdown()
     try:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+        job = start_job(job_id, request)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    file_path = None
+    try:
+        # Prefixed with the job id so concurrent uploads that share a file
+        # name do not overwrite each other; run_detection keys its state on
+        # the content, so a re-upload still resumes.
+        file_path = os.path.join(UPLOAD_DIR, f"{_safe_name(job['job_id'])}_{_safe_name(file.filename)}")
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with stage_timer("upload_save"):
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
 
-        video_data = process_video(file_path)
+        with stage_timer("probe"):
+            estimate = estimate_job("match", [probe_media(file_path)])
 
-        metrics_A = compute_formation_metrics(video_data["teamA_positions"])
-        metrics_B = compute_formation_metrics(video_data["teamB_positions"])
+        async with admission(estimate) as ticket:
+            if ticket["status"] == "rejected":
+                os.remove(file_path)
+                return {
+                    "status": "rejected",
+                    "message": ticket["reason"],
+                    "admission": admission_info(ticket),
+                }
 
-        tactical_A = analyze_tactics(metrics_A)
-        tactical_B = analyze_tactics(metrics_B)
+            video_data, seconds = await run_in_lane(
+                "batch", player_id, timed_call, run_detection, file_path, cost=estimate["stages"]["detection"]
+            )
+            observe("run_detection", seconds)
+            check_cancelled()
 
-        llm_tactics = enrich_tactics_with_llm(metrics_A, metrics_B)
+            # Formation metrics only need detections, so the LLM call and the
+            # tactical heuristics overlap with the ffmpeg encode.
+            with stage_timer("formation_metrics"):
+                metrics_A = compute_formation_metrics(video_data["teamA_positions"])
+                metrics_B = compute_formation_metrics(video_data["teamB_positions"])
 
-        processed_path = video_data.get("processed_video")
-        player_metrics = video_data.get("player_metrics", {})
+            encode_task = asyncio.create_task(
+                run_in_lane(
+                    "batch", player_id, encode_processed_video, video_data, cost=estimate["stages"]["encode"]
+                )
+            )
+            llm_task = asyncio.create_task(enrich_tactics_with_llm(metrics_A, metrics_B))
+            try:
+                tactical_A = analyze_tactics(metrics_A)
+                tactical_B = analyze_tactics(metrics_B)
+                with stage_timer("tactical_timeline"):
+                    tactical_timeline = await run_in_lane("batch", player_id, build_match_timeline, video_data)
 
-        total_detections = len(video_data["teamA_positions"]) + len(
-            video_data["teamB_positions"]
+                with stage_timer("encode_llm_wait"):
+                    processed_path, llm_tactics = await asyncio.gather(encode_task, llm_task)
+            finally:
+                # No-op on success; otherwise stops the encode and LLM call.
+                await cancel_pending([encode_task, llm_task])
+            player_metrics = video_data.get("player_metrics", {})
+
+            total_detections = len(video_data["teamA_positions"]) + len(
+                video_data["teamB_positions"]
+            )
+            if total_detections == 0:
+                model_confidence = 0.5
+            elif total_detections < 50:
+                model_confidence = 0.8
+            else:
+                model_confidence = 0.95
+
+            return {
+                "status": "success",
+                "teamA": {
+                    "formation": tactical_A["formation"],
+                    "goal_probability": tactical_A["goal_probability"],
+                    "tactical_score": tactical_A["tactical_score"],
+                    "pressing_intensity": tactical_A["pressing_intensity"],
+                    "possession_rate": tactical_A["possession_rate"],
+                    "formation_label": llm_tactics["teamA"]["formation_label"],
+                    "strategy_label": llm_tactics["teamA"]["strategy_label"],
+                    "key_phases": llm_tactics["teamA"]["key_phases"],
+                },
+                "teamB": {
+                    "formation": tactical_B["formation"],
+                    "goal_probability": tactical_B["goal_probability"],
+                    "tactical_score": tactical_B["tactical_score"],
+                    "pressing_intensity": tactical_B["pressing_intensity"],
+                    "possession_rate": tactical_B["possession_rate"],
+                    "formation_label": llm_tactics["teamB"]["formation_label"],
+                    "strategy_label": llm_tactics["teamB"]["strategy_label"],
+                    "key_phases": llm_tactics["teamB"]["key_phases"],
+                },
+                "processed_video": processed_path,
+                "processed_video_path": processed_path,
+                "player_metrics": player_metrics,
+                "tactical_timeline": tactical_timeline,
+                "proximity": tactical_timeline.get("proximity"),
+                "heatmap_id": video_data.get("heatmap_id"),
+                "match_id": video_data.get("match_id"),
+                "event_count": video_data.get("event_count", 0),
+                "model_confidence": model_confidence,
+                "model_name": "meta/llama-3.3-70b-instruct",
+                "timings": timing_breakdown(),
+                "admission": admission_info(ticket),
+                "job_id": job["job_id"],
+            }
+
+    except JobCancelled as e:
+        _discard_uploads([file_path])
+        return {"status": "cancelled", "job_id": job["job_id"], "message": str(e)}
+    except Exception as e:
+        inc("playsafe_request_errors_total", endpoint="analyze-match")
+        return {"status": "error", "message": str(e)}
+    finally:
+        finish_job(job)
+
+
+@router.get("/events")
+async def list_events(
+    match_id: Optional[str] = None,
+    player_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    limit: int = 1000,
+):
+    # match_id is the source returned by /analyze-match/ (or event_source from
+    # the posture endpoints); start/end are seconds into that video and match
+    # any overlapping event. Types: sprint, hard_deceleration, decel_spike,
+    # change_of_direction.
+    try:
+        events = await asyncio.to_thread(
+            query_events, match_id, player_id, event_type, start, end, limit
         )
-        if total_detections == 0:
-            model_confidence = 0.5
-        elif total_detections < 50:
-            model_confidence = 0.8
-        else:
-            model_confidence = 0.95
+        return {"status": "success", "count": len(events), "events": events}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
-        return {
-            "status": "success",
-            "teamA": {
-                "formation": tactical_A["formation"],
-                "goal_probability": tactical_A["goal_probability"],
-                "tactical_score": tactical_A["tactical_score"],
-                "pressing_intensity": tactical_A["pressing_intensity"],
-                "possession_rate": tactical_A["possession_rate"],
-                "formation_label": llm_tactics["teamA"]["formation_label"],
-                "strategy_label": llm_tactics["teamA"]["strategy_label"],
-                "key_phases": llm_tactics["teamA"]["key_phases"],
-            },
-            "teamB": {
-                "formation": tactical_B["formation"],
-                "goal_probability": tactical_B["goal_probability"],
-                "tactical_score": tactical_B["tactical_score"],
-                "pressing_intensity": tactical_B["pressing_intensity"],
-                "possession_rate": tactical_B["possession_rate"],
-                "formation_label": llm_tactics["teamB"]["formation_label"],
-                "strategy_label": llm_tactics["teamB"]["strategy_label"],
-                "key_phases": llm_tactics["teamB"]["key_phases"],
-            },
-            "processed_video": processed_path,
-            "processed_video_path": processed_path,
-            "player_metrics": player_metrics,
-            "model_confidence": model_confidence,
-            "model_name": "meta/llama-3.3-70b-instruct",
-        }
 
+@router.get("/heatmaps/{match_id}")
+async def match_heatmap(
+    match_id: str,
+    team: Optional[str] = None,
+    player_id: Optional[str] = None,
+    downsample: int = 1,
+):
+    # Grids are accumulated during /analyze-match/; downsample sum-pools
+    # downsample x downsample cells.
+    try:
+        heatmap = load_heatmap(match_id, team, player_id, downsample)
+        if heatmap is None:
+            return {"status": "error", "message": f"No heatmap for match '{match_id}'"}
+        return {"status": "success", **heatmap}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
 @router.post("/analyze-posture/")
 async def analyze_posture(
+    request: Request,
     player_id: str = Form(...),
     file: UploadFile = File(...),
     height_cm: Optional[float] = Form(None),
@@ -143,26 +308,71 @@ async def analyze_posture(
     position: Optional[str] = Form(None),
     preferred_foot: Optional[str] = Form(None),
     mode: Optional[str] = Form("analysis"),
+    stream: Optional[bool] = Form(False),
+    job_id: Optional[str] = Form(None),
+    latency_budget_ms: Optional[float] = Form(None),
+    quality: Optional[str] = Form(None),
 ):
+    # latency_budget_ms / quality pick the pose model tier and frame stride
+    # (see GET /pose/tiers); without them every frame runs on the default tier.
+    breakdown = start_breakdown()
+    try:
+        job = start_job(job_id, request)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    file_path = None
+    streaming = False
     try:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+        # Job-id prefix as in analyze_match, so the cleanup on cancel only
+        # ever removes this request's upload.
+        file_path = os.path.join(UPLOAD_DIR, f"{_safe_name(job['job_id'])}_{_safe_name(file.filename)}")
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with stage_timer("upload_save"):
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
 
-        joint_metrics = analyze_posture_file(file_path)
+        with stage_timer("probe"):
+            probe = probe_media(file_path)
+            plan = select_pose_plan(probe["frames"] if probe else None, latency_budget_ms, quality)
+            estimate = estimate_job("posture", [probe], plans=[plan])
 
-        if not joint_metrics:
+        async with admission(estimate) as ticket:
+            if ticket["status"] == "rejected":
+                os.remove(file_path)
+                return {
+                    "status": "rejected",
+                    "message": ticket["reason"],
+                    "admission": admission_info(ticket),
+                }
+            (joint_metrics, events), seconds = await run_in_lane(
+                lane_for(estimate), player_id, timed_call, analyze_posture_events, file_path, plan, cost=estimate["cpu_s"]
+            )
+            observe("pose_analysis", seconds)
+
+        # A landmarker that failed to load yields all-zero metrics.
+        if not joint_metrics or not joint_metrics.get("frames_analyzed"):
             return {
                 "status": "no_pose_detected",
                 "message": "No player pose detected in the provided media.",
                 "joint_metrics": None,
             }
 
+        # Baseline reads and writes are SQLite transactions that may wait on
+        # the write lock, so they run off the event loop.
         if mode == "baseline":
-            baseline_info = update_posture_baseline(player_id, joint_metrics)
+            baseline_info = await asyncio.to_thread(update_posture_baseline, player_id, joint_metrics)
         else:
-            baseline_info = load_posture_baseline(player_id, joint_metrics)
+            baseline_info = await asyncio.to_thread(load_posture_baseline, player_id, joint_metrics)
+
+        # The history append takes a file lock and the event index writes to
+        # SQLite; neither should block the event loop.
+        with stage_timer("session_history"):
+            await asyncio.to_thread(
+                append_session, player_id, baseline_info["current"], is_baseline=mode == "baseline"
+            )
+        event_source = await asyncio.to_thread(
+            _record_posture_events, player_id, events, joint_metrics.get("fps_used")
+        )
 
         anthropometrics = None
         if any([height_cm, weight_kg, position, preferred_foot]):
@@ -178,10 +388,20 @@ async def analyze_posture(
             "baseline": baseline_info.get("baseline"),
             "deltas": baseline_info.get("deltas"),
             "sessions": baseline_info.get("sessions"),
+            "z_scores": baseline_info.get("z_scores"),
             "anthropometrics": anthropometrics,
         }
 
-        llm_injury = analyze_injury_with_llm(metrics_bundle)
+        if stream:
+            # The body generator owns the job from here, so cancelling it
+            # (by id or by disconnecting) stops the streamed LLM call.
+            streaming = True
+            return StreamingResponse(
+                _stream_posture_events(player_id, joint_metrics, baseline_info, metrics_bundle, breakdown, job),
+                media_type="application/x-ndjson",
+            )
+
+        llm_injury = await analyze_injury_with_llm(metrics_bundle)
 
         return {
             "status": "success",
@@ -189,7 +409,448 @@ async def analyze_posture(
             "joint_metrics": joint_metrics,
             "baseline": baseline_info,
             "injury_analysis": llm_injury,
+            "event_source": event_source,
             "model_name": "meta/llama-3.3-70b-instruct",
+            "pose_plan": plan,
+            "timings": timing_breakdown(),
+            "admission": admission_info(ticket),
+            "job_id": job["job_id"],
         }
+    except JobCancelled as e:
+        _discard_uploads([file_path])
+        return {"status": "cancelled", "job_id": job["job_id"], "message": str(e)}
     except Exception as e:
+        inc("playsafe_request_errors_total", endpoint="analyze-posture")
+        return {"status": "error", "message": str(e)}
+    finally:
+        if not streaming:
+            finish_job(job)
+
+
+def _discard_uploads(paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def _record_posture_events(player_id, events, fps):
+    source = f"posture:{player_id}:{int(time.time() * 1000)}"
+    for event in events:
+        event["track_id"] = player_id
+    record_events(source, events, fps)
+    return source
+
+
+async def _stream_posture_events(player_id, joint_metrics, baseline_info, metrics_bundle, breakdown, job):
+    # NDJSON: pose metrics first, then LLM tokens/items, then the validated
+    # result in the same shape as the non-streaming response.
+    use_breakdown(breakdown)
+    use_job(job)
+    try:
+        yield json.dumps(
+            {
+                "type": "metrics",
+                "status": "success",
+                "player_id": player_id,
+                "joint_metrics": joint_metrics,
+                "baseline": baseline_info,
+            }
+        ) + "\n"
+        async for event in stream_injury_analysis(metrics_bundle):
+            if event["type"] == "result":
+                event = {
+                    **event,
+                    "status": "success",
+                    "player_id": player_id,
+                    "joint_metrics": joint_metrics,
+                    "baseline": baseline_info,
+                    "model_name": "meta/llama-3.3-70b-instruct",
+                    "timings": timing_breakdown(),
+                }
+            yield json.dumps(event) + "\n"
+    except JobCancelled as e:
+        yield json.dumps({"type": "end", "status": "cancelled", "job_id": job["job_id"], "message": str(e)}) + "\n"
+    finally:
+        finish_job(job)
+
+
+@router.post("/analyze-squad-posture/")
+async def analyze_squad_posture(
+    request: Request,
+    player_ids: List[str] = Form(...),
+    files: List[UploadFile] = File(...),
+    mode: Optional[str] = Form("analysis"),
+    job_id: Optional[str] = Form(None),
+    latency_budget_ms: Optional[float] = Form(None),
+    quality: Optional[str] = Form(None),
+):
+    # The latency budget applies to each clip; clips run in parallel on the
+    # pose pool.
+    start_breakdown()
+    try:
+        job = start_job(job_id, request)
+    except ValueError as e:
         return {"status": "error", "message": str(e)}
+    file_paths = []
+    try:
+        if len(player_ids) != len(files):
+            return {
+                "status": "error",
+                "message": "player_ids and files must have the same length.",
+            }
+        if len(set(player_ids)) != len(player_ids):
+            return {"status": "error", "message": "player_ids must be unique."}
+
+        for player_id, file in zip(player_ids, files):
+            file_path = os.path.join(
+                UPLOAD_DIR, f"{_safe_name(job['job_id'])}_{_safe_name(player_id)}_{_safe_name(file.filename)}"
+            )
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+            file_paths.append(file_path)
+
+        with stage_timer("probe"):
+            probes = [probe_media(path) for path in file_paths]
+            plans = [
+                select_pose_plan(probe["frames"] if probe else None, latency_budget_ms, quality)
+                for probe in probes
+            ]
+            estimate = estimate_job("squad", probes, plans=plans)
+
+        async with admission(estimate) as ticket:
+            if ticket["status"] == "rejected":
+                for path in file_paths:
+                    os.remove(path)
+                return {
+                    "status": "rejected",
+                    "message": ticket["reason"],
+                    "admission": admission_info(ticket),
+                }
+            pool = get_pose_pool()
+            # Each clip is timed in its worker, so pose_pool is summed clip
+            # CPU time (what the pose rate is per unit of), not wall time.
+            # The job's token does not reach the pool workers: a cancellation
+            # drops the clips that have not started and the running ones stop
+            # at their next frame through the job's cancel file, before the
+            # lane slots and the admission ticket are released.
+            timed = await gather_cancellable(
+                [
+                    run_in_lane(
+                        "batch",
+                        player_id,
+                        in_pool_job,
+                        job["job_id"],
+                        job["cancel_file"],
+                        timed_call,
+                        analyze_posture_events,
+                        path,
+                        plan,
+                        executor=pool,
+                    )
+                    for player_id, path, plan in zip(player_ids, file_paths, plans)
+                ]
+            )
+            results = []
+            for result, seconds in timed:
+                observe("pose_pool", seconds)
+                results.append(result)
+
+        players = []
+        bundles = {}
+        for player_id, (joint_metrics, events), plan in zip(player_ids, results, plans):
+            if not joint_metrics or not joint_metrics.get("frames_analyzed"):
+                players.append(
+                    {
+                        "status": "no_pose_detected",
+                        "player_id": player_id,
+                        "joint_metrics": None,
+                        "pose_plan": plan,
+                    }
+                )
+                continue
+
+            if mode == "baseline":
+                baseline_info = await asyncio.to_thread(update_posture_baseline, player_id, joint_metrics)
+            else:
+                baseline_info = await asyncio.to_thread(load_posture_baseline, player_id, joint_metrics)
+
+            await asyncio.to_thread(
+                append_session, player_id, baseline_info["current"], is_baseline=mode == "baseline"
+            )
+            event_source = await asyncio.to_thread(
+                _record_posture_events, player_id, events, joint_metrics.get("fps_used")
+            )
+
+            bundles[player_id] = {
+                "current": joint_metrics,
+                "baseline": baseline_info.get("baseline"),
+                "deltas": baseline_info.get("deltas"),
+                "sessions": baseline_info.get("sessions"),
+                "z_scores": baseline_info.get("z_scores"),
+                "anthropometrics": None,
+            }
+            players.append(
+                {
+                    "status": "success",
+                    "player_id": player_id,
+                    "joint_metrics": joint_metrics,
+                    "baseline": baseline_info,
+                    "event_source": event_source,
+                    "pose_plan": plan,
+                }
+            )
+
+        injury_by_player = await analyze_squad_injury_with_llm(bundles)
+        for entry in players:
+            if entry["player_id"] in injury_by_player:
+                entry["injury_analysis"] = injury_by_player[entry["player_id"]]
+
+        return {
+            "status": "success",
+            "players": players,
+            "model_name": "meta/llama-3.3-70b-instruct",
+            "timings": timing_breakdown(),
+            "admission": admission_info(ticket),
+            "job_id": job["job_id"],
+        }
+    except JobCancelled as e:
+        _discard_uploads(file_paths)
+        return {"status": "cancelled", "job_id": job["job_id"], "message": str(e)}
+    except Exception as e:
+        inc("playsafe_request_errors_total", endpoint="analyze-squad-posture")
+        return {"status": "error", "message": str(e)}
+    finally:
+        finish_job(job)
+
+
+@router.get("/baselines/")
+async def squad_baselines(player_ids: Optional[List[str]] = Query(None)):
+    try:
+        return {"status": "success", "baselines": await asyncio.to_thread(load_squad_baselines, player_ids)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@router.get("/baselines/{player_id}")
+async def player_baseline(player_id: str, raw: bool = False):
+    # raw=true returns the mergeable record (stats + sketches) for export.
+    try:
+        record = await asyncio.to_thread(export_posture_baseline, player_id)
+        if record is None:
+            return {"status": "not_found", "player_id": player_id}
+        if raw:
+            return {"status": "success", "player_id": player_id, "record": record}
+        return {
+            "status": "success",
+            "player_id": player_id,
+            **summarize_posture_baseline(record),
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@router.post("/baselines/{player_id}/merge")
+async def merge_player_baseline(player_id: str, record: dict = Body(...)):
+    try:
+        return {
+            "status": "success",
+            "player_id": player_id,
+            **(await asyncio.to_thread(merge_posture_baseline, player_id, record)),
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@router.get("/players/{player_id}/history")
+async def player_history(
+    player_id: str,
+    metrics: Optional[List[str]] = Query(None),
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    max_points: int = 200,
+):
+    # start/end are unix timestamps; resolution is raw, day or week depending
+    # on how many sessions fall in the window.
+    try:
+        return {
+            "status": "success",
+            "player_id": player_id,
+            **(await asyncio.to_thread(get_history, player_id, metrics, start, end, max_points)),
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+# ==============================
+# ADMISSION (UPLOAD COST ESTIMATES)
+# ==============================
+@router.post("/admission/estimate")
+async def admission_estimate(
+    kind: str = Form("match"),
+    frames: int = Form(...),
+    width: int = Form(...),
+    height: int = Form(...),
+    fps: Optional[float] = Form(None),
+    files: int = Form(1),
+    latency_budget_ms: Optional[float] = Form(None),
+    quality: Optional[str] = Form(None),
+):
+    # Pre-flight check from client-side metadata, before uploading: kind is
+    # match, posture or squad; files is the number of clips in a squad upload.
+    # latency_budget_ms / quality cost posture clips with the plan they would get.
+    try:
+        if kind not in ("match", "posture", "squad"):
+            return {"status": "error", "message": f"Unknown kind '{kind}'"}
+        media = {"frames": frames, "width": width, "height": height, "fps": fps}
+        plans = None
+        if kind != "match":
+            plans = [select_pose_plan(frames, latency_budget_ms, quality)] * max(1, files)
+        estimate = estimate_job(kind, [media] * max(1, files), plans=plans)
+        return {"status": "success", **preflight(estimate)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@router.get("/admission/status")
+async def admission_state():
+    return admission_status()
+
+
+@router.get("/scheduler/status")
+async def scheduler_state():
+    return scheduler_status()
+
+
+@router.get("/pose/tiers")
+async def pose_model_tiers(frames: Optional[int] = None, latency_budget_ms: Optional[float] = None):
+    # Installed tiers with their measured ms/frame; with frames (and a budget)
+    # also the plan a posture request would get.
+    try:
+        info = {"status": "success", **pose_tiers()}
+        if frames is not None:
+            info["plan"] = select_pose_plan(frames, latency_budget_ms)
+        return info
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+# ==============================
+# JOB CANCELLATION
+# ==============================
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_running_job(job_id: str):
+    # Work stops at the next frame or before the next LLM call; the original
+    # request then answers with status "cancelled".
+    if not cancel_job(job_id):
+        return {"status": "not_found", "job_id": job_id}
+    return {"status": "success", "job_id": job_id}
+
+
+@router.get("/jobs")
+async def list_jobs():
+    return {"status": "success", "jobs": active_jobs()}
+
+
+# ==============================
+# LIVE STREAM
+# ==============================
+@router.post("/live/stream")
+async def live_stream(
+    source: str = Form(...),
+    latency_budget_ms: Optional[float] = Form(None),
+    pose: Optional[bool] = Form(False),
+    quality: Optional[str] = Form(None),
+    window_s: Optional[float] = Form(None),
+    job_id: Optional[str] = Form(None),
+):
+    # source is a stream URL allowed by LIVE_SCHEMES / LIVE_ALLOWED_SOURCES
+    # or a growing file or pipe under LIVE_LOCAL_DIR. Answers with NDJSON: a "start" line, a "metrics"
+    # line per LIVE_EMIT_INTERVAL_S and an "end" line. Stops on client
+    # disconnect, POST /jobs/{job_id}/cancel or when the source goes idle.
+    try:
+        job = start_job(job_id)
+        try:
+            session = start_session(source, latency_budget_ms, pose, quality, window_s, job["job_id"])
+        except Exception:
+            finish_job(job)
+            raise
+        if session is None:
+            finish_job(job)
+            return {"status": "rejected", "message": "Too many live sessions running."}
+        return StreamingResponse(_stream_live(session, job), media_type="application/x-ndjson")
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+async def _stream_live(session, job):
+    try:
+        yield json.dumps(
+            {
+                "type": "start",
+                "status": "success",
+                "session_id": session["id"],
+                "job_id": job["job_id"],
+                "latency_budget_ms": session["budget_s"] * 1000.0,
+                "window_s": session["window_s"],
+                "pose": session["pose"],
+            }
+        ) + "\n"
+        sent = 0
+        while True:
+            if job["event"].is_set():
+                stop_session(session)
+            version, metrics = latest_update(session)
+            if version != sent:
+                sent = version
+                if metrics is not None and not session["ended"]:
+                    yield json.dumps({"type": "metrics", **metrics}) + "\n"
+            if session["ended"]:
+                status = "cancelled" if job["event"].is_set() else "error" if session["error"] else "success"
+                yield json.dumps(
+                    {
+                        "type": "end",
+                        "status": status,
+                        "session_id": session["id"],
+                        "message": session["error"] or job["reason"],
+                        "metrics": metrics,
+                    }
+                ) + "\n"
+                return
+            await asyncio.sleep(0.05)
+    finally:
+        stop_session(session)
+        finish_job(job)
+
+
+@router.get("/live/sessions")
+async def list_live_sessions():
+    return {"status": "success", "sessions": live_sessions()}
+
+
+@router.get("/llm-cache/stats")
+async def llm_cache_stats():
+    return await asyncio.to_thread(cache_stats)
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    stats = await asyncio.to_thread(cache_stats)
+    gauges = {
+        "playsafe_llm_cache_hits": ("LLM cache hits since start.", stats["hits"]),
+        "playsafe_llm_cache_misses": ("LLM cache misses since start.", stats["misses"]),
+        "playsafe_llm_cache_coalesced": ("LLM requests coalesced onto an in-flight call.", stats["coalesced"]),
+        "playsafe_llm_cache_size": ("Entries in the LLM response cache.", stats["size"]),
+        "playsafe_llm_inflight": ("LLM calls currently in flight.", stats["inflight"]),
+    }
+    admitted = admission_status()
+    gauges["playsafe_admission_running"] = ("Admitted jobs currently running.", admitted["running"])
+    gauges["playsafe_admission_queued"] = ("Jobs waiting for admission.", admitted["queued"])
+    for lane, state in scheduler_status()["lanes"].items():
+        gauges[f"playsafe_scheduler_{lane}_running"] = (f"Jobs running in the {lane} lane.", state["running"])
+        gauges[f"playsafe_scheduler_{lane}_queued"] = (f"Jobs queued in the {lane} lane.", state["queued"])
+    gauges["playsafe_live_sessions"] = ("Live stream sessions running.", len(live_sessions()))
+    gauges["playsafe_admission_in_flight_cpu_seconds"] = (
+        "Estimated CPU seconds of admitted jobs.",
+        admitted["in_flight_cpu_s"],
+    )
+    return Response(render_prometheus(gauges), media_type="text/plain; version=0.0.4")
@@ -1,2 +1,167 @@
+import json
+import os
+
 BASELINE_PATH = "data/baselines/"
+BASELINE_DB_PATH = os.getenv("BASELINE_DB_PATH", os.path.join(BASELINE_PATH, "baselines.db"))
 UPLOAD_PATH = "data/uploads/"
+HISTORY_PATH = os.getenv("HISTORY_PATH", "data/history/")
+HISTORY_CHUNK_ROWS = int(os.getenv("HISTORY_CHUNK_ROWS", "256"))
+EVENTS_DB_PATH = os.getenv("EVENTS_DB_PATH", "data/events.db")
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "data/checkpoints/")
+CHECKPOINT_EVERY_FRAMES = int(os.getenv("CHECKPOINT_EVERY_FRAMES", "1500"))
+HEATMAP_PATH = os.getenv("HEATMAP_PATH", "data/heatmaps/")
+HEATMAP_GRID_ROWS = int(os.getenv("HEATMAP_GRID_ROWS", "68"))
+HEATMAP_GRID_COLS = int(os.getenv("HEATMAP_GRID_COLS", "105"))
+HEATMAP_COMPACT_EVERY = int(os.getenv("HEATMAP_COMPACT_EVERY", "65536"))
+
+# LLM upstream (OpenAI-compatible chat completions endpoint)
+LLM_BASE_URL = os.getenv("NVIDIA_BASE_URL", "https://integrate.api.nvidia.com/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "meta/llama-3.3-70b-instruct")
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "40"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+
+# LLM response cache
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.db")
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(6 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+# Bucket widths used to quantize metrics before they are put into a prompt.
+# Fields not listed here are rounded to LLM_CACHE_DEFAULT_SIG_DIGITS
+# significant digits. Override with a JSON object in LLM_CACHE_BUCKETS.
+LLM_CACHE_BUCKETS = {
+    "width": 20.0,
+    "depth": 20.0,
+    "compactness": 5000.0,
+    "left_knee_mean": 2.0,
+    "left_knee_min": 2.0,
+    "left_knee_max": 2.0,
+    "right_knee_mean": 2.0,
+    "right_knee_min": 2.0,
+    "right_knee_max": 2.0,
+    "trunk_angle_mean": 1.0,
+    "trunk_angle_max": 1.0,
+    "shoulder_angle_mean": 1.0,
+    "hip_tilt_deg": 1.0,
+    "shoulder_tilt_deg": 1.0,
+    "knee_asymmetry": 1.0,
+    "body_orientation_deg": 5.0,
+    "shoulder_asymmetry": 0.005,
+    "hip_asymmetry": 0.005,
+    "height_cm": 2.0,
+    "weight_kg": 2.0,
+    "fps_used": 1.0,
+}
+LLM_CACHE_BUCKETS.update(json.loads(os.getenv("LLM_CACHE_BUCKETS", "{}")))
+LLM_CACHE_DEFAULT_SIG_DIGITS = int(os.getenv("LLM_CACHE_DEFAULT_SIG_DIGITS", "2"))
+# Z-scores and baseline deltas are keyed by metric name but are on a different
+# scale, so they get one fixed bucket width instead of LLM_CACHE_BUCKETS.
+LLM_CACHE_DEVIATION_BUCKET = float(os.getenv("LLM_CACHE_DEVIATION_BUCKET", "0.1"))
+
+# Batched squad injury analysis
+LLM_BATCH_PROMPT_TOKENS = int(os.getenv("LLM_BATCH_PROMPT_TOKENS", "6000"))
+LLM_BATCH_MAX_PLAYERS = int(os.getenv("LLM_BATCH_MAX_PLAYERS", "8"))
+LLM_BATCH_OUTPUT_TOKENS_PER_PLAYER = int(os.getenv("LLM_BATCH_OUTPUT_TOKENS_PER_PLAYER", "500"))
+POSE_POOL_WORKERS = int(os.getenv("POSE_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+# Pose model tiers (MediaPipe PoseLandmarker bundles under models/). ms_per_frame
+# is the starting inference cost per tier; timings measured in the API process
+# (posture requests) replace it as each tier is used. Squad clips run in pool
+# workers and do not feed back. Override with a JSON object in
+# POSE_MODEL_TIERS.
+POSE_MODEL_TIERS = {
+    "lite": {"model": "pose_landmarker_lite.task", "ms_per_frame": 12.0},
+    "full": {"model": "pose_landmarker_full.task", "ms_per_frame": 30.0},
+    "heavy": {"model": "pose_landmarker_heavy.task", "ms_per_frame": 95.0},
+}
+POSE_MODEL_TIERS.update(json.loads(os.getenv("POSE_MODEL_TIERS", "{}")))
+POSE_DEFAULT_TIER = os.getenv("POSE_DEFAULT_TIER", "full")
+# A latency budget picks the heaviest tier that still samples this many frames.
+POSE_MIN_SAMPLED_FRAMES = int(os.getenv("POSE_MIN_SAMPLED_FRAMES", "30"))
+POSE_TIMING_ALPHA = float(os.getenv("POSE_TIMING_ALPHA", "0.1"))
+
+# Incremental baseline statistics
+BASELINE_EWMA_ALPHA = float(os.getenv("BASELINE_EWMA_ALPHA", "0.3"))
+BASELINE_SKETCH_RELATIVE_ACCURACY = float(os.getenv("BASELINE_SKETCH_RELATIVE_ACCURACY", "0.02"))
+BASELINE_SKETCH_MAX_BINS = int(os.getenv("BASELINE_SKETCH_MAX_BINS", "256"))
+
+# Tactical time series
+FORMATION_WINDOW_S = float(os.getenv("FORMATION_WINDOW_S", "5"))
+FORMATION_STEP_S = float(os.getenv("FORMATION_STEP_S", "2.5"))
+FORMATION_MIN_RUN_WINDOWS = int(os.getenv("FORMATION_MIN_RUN_WINDOWS", "2"))
+
+# Opponent proximity / pressing
+PITCH_LENGTH_M = float(os.getenv("PITCH_LENGTH_M", "105"))
+PRESS_RADIUS_M = float(os.getenv("PRESS_RADIUS_M", "5"))
+BALL_SIDE_RADIUS_M = float(os.getenv("BALL_SIDE_RADIUS_M", "15"))
+
+# Opt-in request profiling (X-PlaySafe-Profile header)
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_PATH = os.getenv("PROFILE_PATH", "data/profiles/")
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "1"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "20"))
+PROFILE_SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_INTERVAL_S", "0.005"))
+
+# Upload admission control. Jobs are costed from probed container metadata
+# (frames, resolution) with per-stage rates: seconds per frame-megapixel for
+# match detection and encode, seconds per second of planned pose-model time
+# (sampled frames x the tier's ms_per_frame) for pose, seconds per LLM call.
+# Observed stage timings recalibrate the rates in-process. Override the
+# starting rates with a JSON object in ADMISSION_STAGE_RATES.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() in ("1", "true", "yes")
+ADMISSION_WORKERS = int(os.getenv("ADMISSION_WORKERS", str(os.cpu_count() or 1)))
+ADMISSION_CAPACITY_S = float(os.getenv("ADMISSION_CAPACITY_S", "300"))
+ADMISSION_MAX_JOB_S = float(os.getenv("ADMISSION_MAX_JOB_S", "3600"))
+ADMISSION_MAX_QUEUE_S = float(os.getenv("ADMISSION_MAX_QUEUE_S", "600"))
+ADMISSION_CALIBRATION_ALPHA = float(os.getenv("ADMISSION_CALIBRATION_ALPHA", "0.2"))
+# CPU seconds of capacity only interactive-lane jobs may use, and how long a
+# queued job may be passed by later jobs that fit before it blocks them.
+ADMISSION_INTERACTIVE_RESERVED_S = float(os.getenv("ADMISSION_INTERACTIVE_RESERVED_S", "30"))
+ADMISSION_MAX_STARVE_S = float(os.getenv("ADMISSION_MAX_STARVE_S", "60"))
+ADMISSION_STAGE_RATES = {
+    "detection": 0.022,
+    "encode": 0.006,
+    "pose": 1.0,
+    "llm": 4.0,
+}
+ADMISSION_STAGE_RATES.update(json.loads(os.getenv("ADMISSION_STAGE_RATES", "{}")))
+# Media assumed when a probe fails (unreadable header, no frame count or
+# bitrate), so the job is still costed: about five minutes of 720p video.
+ADMISSION_UNKNOWN_MEDIA = {"frames": 9000, "fps": 30.0, "width": 1280, "height": 720}
+ADMISSION_UNKNOWN_MEDIA.update(json.loads(os.getenv("ADMISSION_UNKNOWN_MEDIA", "{}")))
+
+# Lane scheduler for CPU-bound stages. Slots are shared across lanes; each
+# lane caps its own concurrency ("workers"), holds back "reserved" slots from
+# the other lanes and gets a share of contended slots proportional to
+# "weight". Posture jobs estimated under SCHEDULER_INTERACTIVE_MAX_S CPU
+# seconds go to the interactive lane. Override lanes with a JSON object in
+# SCHEDULER_LANES.
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", str(max(2, os.cpu_count() or 1))))
+SCHEDULER_INTERACTIVE_MAX_S = float(os.getenv("SCHEDULER_INTERACTIVE_MAX_S", "15"))
+SCHEDULER_LANES = {
+    "interactive": {"workers": 2, "weight": 4, "reserved": 1},
+    "batch": {"workers": max(1, SCHEDULER_WORKERS - 1), "weight": 1, "reserved": 0},
+}
+SCHEDULER_LANES.update(json.loads(os.getenv("SCHEDULER_LANES", "{}")))
+
+# Live stream mode. Frames older than LIVE_LATENCY_BUDGET_MS when the
+# processor gets to them are dropped rather than queued, and pose runs on a
+# frame only when it fits in what is left of the budget. Rolling metrics cover
+# the last LIVE_WINDOW_S seconds of the stream. Local sources (growing files,
+# pipes) must live under LIVE_LOCAL_DIR. Stream URLs must use one of
+# LIVE_SCHEMES and match LIVE_ALLOWED_SOURCES (comma separated hosts, or URL
+# prefixes such as rtsp://cam1.local:554/live/); with no allowlist only local
+# sources can be opened.
+LIVE_LATENCY_BUDGET_MS = float(os.getenv("LIVE_LATENCY_BUDGET_MS", "250"))
+LIVE_WINDOW_S = float(os.getenv("LIVE_WINDOW_S", "10"))
+LIVE_EMIT_INTERVAL_S = float(os.getenv("LIVE_EMIT_INTERVAL_S", "1.0"))
+LIVE_POSE_TIER = os.getenv("LIVE_POSE_TIER", "lite")
+LIVE_IDLE_TIMEOUT_S = float(os.getenv("LIVE_IDLE_TIMEOUT_S", "10"))
+LIVE_RECONNECT_INTERVAL_S = float(os.getenv("LIVE_RECONNECT_INTERVAL_S", "0.5"))
+LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", "2"))
+LIVE_LOCAL_DIR = os.getenv("LIVE_LOCAL_DIR", "data/live")
+LIVE_SCHEMES = [s.strip().lower() for s in os.getenv("LIVE_SCHEMES", "rtsp,rtsps").split(",") if s.strip()]
+LIVE_ALLOWED_SOURCES = [s.strip() for s in os.getenv("LIVE_ALLOWED_SOURCES", "").split(",") if s.strip()]
@@ -1,9 +1,21 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.api.routes import router
+from app.services.llm_client import close_client
+from app.config import PROFILE_ENABLED
+from app.utils.profiling import ProfileMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_client()
 
-app = FastAPI(title="PlaySafe AI Backend")
+
+app = FastAPI(title="PlaySafe AI Backend", lifespan=lifespan)
 
 origins = [
     "http://localhost:8080",
@@ -18,6 +30,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if PROFILE_ENABLED:
+    app.add_middleware(ProfileMiddleware)
+
 app.include_router(router)
 
 app.mount("/processed", StaticFiles(directory="processed"), name="processed")
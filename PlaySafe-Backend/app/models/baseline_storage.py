@@ -1,39 +1,140 @@
-from fastapi import APIRouter, UploadFile, File
-from app.core.video_processor import process_video
-from app.core.baseline_model import build_baseline
-from app.core.deviation_detector import compute_deviation
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
 
-router = APIRouter()
+from app.config import BASELINE_PATH, BASELINE_DB_PATH
 
-baseline_features = None
+SCHEMA_VERSION = 1
 
+# Each entry upgrades the schema from version N-1 to N.
+MIGRATIONS = {
+    1: [
+        "CREATE TABLE IF NOT EXISTS posture_baselines ("
+        "player_id TEXT PRIMARY KEY, "
+        "sessions INTEGER NOT NULL, "
+        "data TEXT NOT NULL, "
+        "updated_at REAL NOT NULL)",
+    ],
+}
 
-@router.post("/train")
-async def train_baseline(file: UploadFile = File(...)):
-    global baseline_features
+_local = threading.local()
 
-    video_path = f"temp_{file.filename}"
-    with open(video_path, "wb") as f:
-        f.write(await file.read())
 
-    features = process_video(video_path)
-    baseline_features = build_baseline(features)
+def _connect():
+    # SQLite connections are not shareable across threads, so keep one per
+    # thread; WAL lets readers run while a player's row is being updated.
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        directory = os.path.dirname(BASELINE_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(BASELINE_DB_PATH, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        _migrate(conn)
+        _local.conn = conn
+    return conn
 
-    return {"status": "Baseline trained"}
 
+def _migrate(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            for statement in MIGRATIONS[target]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+        if version == 0:
+            _import_json_baselines(conn, BASELINE_PATH)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
-@router.post("/analyze")
-async def analyze_video(file: UploadFile = File(...)):
-    global baseline_features
 
-    if baseline_features is None:
-        return {"error": "Train baseline first"}
+def _import_json_baselines(conn, directory):
+    imported = 0
+    for path in glob.glob(os.path.join(directory, "*_posture.json")):
+        player_id = os.path.basename(path)[: -len("_posture.json")]
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO posture_baselines (player_id, sessions, data, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (player_id, int(data.get("sessions", 0)), json.dumps(data), os.path.getmtime(path)),
+        )
+        imported += cursor.rowcount
+    return imported
 
-    video_path = f"temp_{file.filename}"
-    with open(video_path, "wb") as f:
-        f.write(await file.read())
 
-    features = process_video(video_path)
-    score = compute_deviation(features, baseline_features)
+def migrate_json_baselines(directory=BASELINE_PATH):
+    # Imports legacy <player_id>_posture.json files; existing rows win. Runs
+    # automatically when the database is first created.
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        imported = _import_json_baselines(conn, directory)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return imported
 
-    return {"injury_risk_score": score}
+
+def get_baseline(player_id):
+    row = _connect().execute(
+        "SELECT data FROM posture_baselines WHERE player_id = ?", (player_id,)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def get_baselines(player_ids=None):
+    conn = _connect()
+    if player_ids is None:
+        rows = conn.execute("SELECT player_id, data FROM posture_baselines").fetchall()
+    else:
+        player_ids = list(player_ids)
+        rows = []
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(player_ids), 500):
+            chunk = player_ids[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            rows.extend(
+                conn.execute(
+                    f"SELECT player_id, data FROM posture_baselines WHERE player_id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+            )
+    return {player_id: json.loads(data) for player_id, data in rows}
+
+
+def update_baseline(player_id, update_fn):
+    # Atomic read-modify-write of one player's record. update_fn receives the
+    # stored record (or None) and returns the record to store; returning None
+    # leaves the row untouched.
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT data FROM posture_baselines WHERE player_id = ?", (player_id,)
+        ).fetchone()
+        current = json.loads(row[0]) if row else None
+        updated = update_fn(current)
+        if updated is not None:
+            conn.execute(
+                "INSERT OR REPLACE INTO posture_baselines (player_id, sessions, data, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (player_id, int(updated.get("sessions", 0)), json.dumps(updated), time.time()),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return updated if updated is not None else current
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+import time
+
+from app.config import EVENTS_DB_PATH
+
+SCHEMA_VERSION = 1
+
+# Each entry upgrades the schema from version N-1 to N.
+MIGRATIONS = {
+    1: [
+        "CREATE TABLE IF NOT EXISTS events ("
+        "id INTEGER PRIMARY KEY, "
+        "source TEXT NOT NULL, "
+        "track_id TEXT NOT NULL, "
+        "event_type TEXT NOT NULL, "
+        "start_frame INTEGER NOT NULL, "
+        "end_frame INTEGER NOT NULL, "
+        "start_s REAL NOT NULL, "
+        "end_s REAL NOT NULL, "
+        "peak REAL, "
+        "created_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_events_source_time ON events (source, start_s)",
+        "CREATE INDEX IF NOT EXISTS idx_events_source_track ON events (source, track_id, start_s)",
+        "CREATE INDEX IF NOT EXISTS idx_events_track ON events (track_id, event_type, start_s)",
+        "CREATE INDEX IF NOT EXISTS idx_events_type_time ON events (event_type, start_s)",
+        # Longest event per source, so overlap queries can bound start_s from
+        # both sides instead of scanning every earlier event.
+        "CREATE TABLE IF NOT EXISTS event_spans ("
+        "source TEXT PRIMARY KEY, "
+        "max_span_s REAL NOT NULL)",
+    ],
+}
+
+EVENT_COLUMNS = (
+    "source",
+    "track_id",
+    "event_type",
+    "start_frame",
+    "end_frame",
+    "start_s",
+    "end_s",
+    "peak",
+)
+
+_local = threading.local()
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        directory = os.path.dirname(EVENTS_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(EVENTS_DB_PATH, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        _migrate(conn)
+        _local.conn = conn
+    return conn
+
+
+def _migrate(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            for statement in MIGRATIONS[target]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def record_events(source, events, fps, first_frame=0):
+    # Replaces every event previously stored for source (re-analysing a match
+    # must not duplicate rows). Frames are converted to seconds once here so
+    # time-range queries hit the index directly; first_frame is the number of
+    # the frame at t = 0 (1 for the detection loop, 0 for pose samples).
+    fps = float(fps) if fps and fps > 0 else 30.0
+    now = time.time()
+    rows = [
+        (
+            source,
+            str(e["track_id"]),
+            e["event_type"],
+            int(e["start_frame"]),
+            int(e["end_frame"]),
+            (e["start_frame"] - first_frame) / fps,
+            (e["end_frame"] - first_frame) / fps,
+            None if e.get("peak") is None else float(e["peak"]),
+            now,
+        )
+        for e in events
+    ]
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM events WHERE source = ?", (source,))
+        conn.executemany(
+            "INSERT INTO events (source, track_id, event_type, start_frame, end_frame, "
+            "start_s, end_s, peak, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO event_spans (source, max_span_s) VALUES (?, ?)",
+            (source, max((r[6] - r[5] for r in rows), default=0.0)),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+
+def query_events(source=None, track_id=None, event_type=None, start=None, end=None, limit=1000):
+    # start/end are seconds from the start of the source video; an event
+    # matches if it overlaps the range.
+    conn = _connect()
+    clauses = []
+    params = []
+    if source is not None:
+        clauses.append("source = ?")
+        params.append(source)
+    if track_id is not None:
+        clauses.append("track_id = ?")
+        params.append(track_id)
+    if event_type is not None:
+        clauses.append("event_type = ?")
+        params.append(event_type)
+    if end is not None:
+        clauses.append("start_s <= ?")
+        params.append(float(end))
+    if start is not None:
+        if source is not None:
+            span = conn.execute(
+                "SELECT max_span_s FROM event_spans WHERE source = ?", (source,)
+            ).fetchone()
+        else:
+            span = conn.execute("SELECT MAX(max_span_s) FROM event_spans").fetchone()
+        max_span = span[0] if span and span[0] is not None else 0.0
+        clauses.append("start_s >= ?")
+        params.append(float(start) - max_span)
+        clauses.append("end_s >= ?")
+        params.append(float(start))
+
+    sql = "SELECT " + ", ".join(EVENT_COLUMNS) + " FROM events"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY start_s, id LIMIT ?"
+    params.append(max(1, int(limit)))
+
+    rows = conn.execute(sql, params).fetchall()
+    return [dict(zip(EVENT_COLUMNS, row)) for row in rows]
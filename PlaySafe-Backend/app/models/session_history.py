@@ -0,0 +1,391 @@
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.config import HISTORY_PATH, HISTORY_CHUNK_ROWS
+
+# Append-only per-player session log:
+#
+#   data/history/<player_id>/
+#       active.jsonl          rows of the segment currently being filled, one
+#                             JSON object per session (appended, never
+#                             rewritten)
+#       sealing_000002.jsonl  a full active segment being sealed into chunk 2
+#       chunk_000001.npz ...  sealed segments as NumPy column chunks
+#       index.json            per-chunk row counts and time ranges
+#       rollup_day.npz        per-day count/sum/sumsq/min/max per metric of
+#                             the sealed chunks, plus the number of chunks
+#                             folded in
+#       rollup_week.npz       same, per ISO week
+#
+# An append writes one line, so its cost does not grow with history. When the
+# active segment reaches HISTORY_CHUNK_ROWS rows it is renamed to its sealing
+# file, written as a chunk and folded into the rollups; queries add the
+# (bounded) active segment on top. The index is written last and a chunk
+# counts once it lists it, so a seal interrupted by a crash is redone from
+# the sealing file by the next append or query (rollups that already include
+# the chunk are skipped). A per-player file lock covers concurrent appends
+# from several worker processes.
+
+DAY_S = 86400.0
+# Epoch day 0 was a Thursday; shift so weeks start on Monday.
+_WEEK_OFFSET_DAYS = 3
+ROLLUP_STATS = ("count", "sum", "sumsq", "min", "max")
+ACTIVE_FILE = "active.jsonl"
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _thread_lock(player_id):
+    with _locks_guard:
+        lock = _locks.get(player_id)
+        if lock is None:
+            lock = _locks[player_id] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def _player_lock(player_id, shared=False):
+    directory = _player_dir(player_id)
+    with _thread_lock(player_id):
+        if shared and not os.path.isdir(directory):
+            yield directory
+            return
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield directory
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _player_dir(player_id):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(player_id))
+    return os.path.join(HISTORY_PATH, safe)
+
+
+def _load_npz(path):
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _save_npz(path, arrays):
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _load_index(directory):
+    path = os.path.join(directory, "index.json")
+    if not os.path.exists(path):
+        return {"chunks": []}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_index(directory, index):
+    path = os.path.join(directory, "index.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def _bucket_of(ts, resolution):
+    day = np.floor(np.asarray(ts, dtype=float) / DAY_S).astype(np.int64)
+    if resolution == "day":
+        return day
+    return (day + _WEEK_OFFSET_DAYS) // 7
+
+
+def _bucket_start(bucket, resolution):
+    if resolution == "day":
+        return bucket * DAY_S
+    return (bucket * 7 - _WEEK_OFFSET_DAYS) * DAY_S
+
+
+def _column(table, key, rows):
+    if key in table:
+        return table[key]
+    return np.full(rows, np.nan)
+
+
+def _load_rollup(directory, resolution):
+    # Returns the rollup and the number of chunks folded into it.
+    rollup = _load_npz(os.path.join(directory, f"rollup_{resolution}.npz"))
+    return rollup, int(rollup.pop("chunks", 0))
+
+
+def _read_active(directory):
+    return _read_rows(os.path.join(directory, ACTIVE_FILE))
+
+
+def _read_rows(path):
+    if not os.path.exists(path):
+        return {}
+    rows = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # A torn final line from an interrupted append.
+                continue
+    if not rows:
+        return {}
+    keys = set().union(*rows)
+    return {key: np.array([row.get(key, np.nan) for row in rows], dtype=float) for key in keys}
+
+
+def _rollup_fill(key):
+    if key == "sessions" or key.endswith(("__count", "__sum", "__sumsq")):
+        return 0.0
+    return np.nan
+
+
+def _rollup_rows(table, resolution):
+    # Rollup of a block of raw rows, vectorised per metric.
+    if not table or not len(table["ts"]):
+        return {}
+    buckets, inverse = np.unique(_bucket_of(table["ts"], resolution), return_inverse=True)
+    size = len(buckets)
+    rollup = {"bucket": buckets, "sessions": np.bincount(inverse, minlength=size).astype(float)}
+    for key, values in table.items():
+        if not key.startswith("m__"):
+            continue
+        finite = np.isfinite(values)
+        groups = inverse[finite]
+        values = values[finite]
+        rollup[f"{key}__count"] = np.bincount(groups, minlength=size).astype(float)
+        rollup[f"{key}__sum"] = np.bincount(groups, weights=values, minlength=size)
+        rollup[f"{key}__sumsq"] = np.bincount(groups, weights=values * values, minlength=size)
+        rollup[f"{key}__min"] = np.full(size, np.nan)
+        rollup[f"{key}__max"] = np.full(size, np.nan)
+        np.fmin.at(rollup[f"{key}__min"], groups, values)
+        np.fmax.at(rollup[f"{key}__max"], groups, values)
+    return rollup
+
+
+def _merge_rollups(a, b):
+    if not a:
+        return b
+    if not b:
+        return a
+    buckets = np.union1d(a["bucket"], b["bucket"])
+    merged = {"bucket": buckets}
+    for key in (set(a) | set(b)) - {"bucket"}:
+        values = np.full(len(buckets), _rollup_fill(key))
+        for part in (a, b):
+            if key not in part:
+                continue
+            pos = np.searchsorted(buckets, part["bucket"])
+            if key.endswith("__min"):
+                values[pos] = np.fmin(values[pos], part[key])
+            elif key.endswith("__max"):
+                values[pos] = np.fmax(values[pos], part[key])
+            else:
+                values[pos] += part[key]
+        merged[key] = values
+    return merged
+
+
+def _sealing_path(directory, number):
+    return os.path.join(directory, f"sealing_{number:06d}.jsonl")
+
+
+def _seal_pending(directory):
+    number = len(_load_index(directory)["chunks"])
+    return any(os.path.exists(_sealing_path(directory, n)) for n in (number, number + 1))
+
+
+def _finish_seal(directory):
+    # Seals the segment waiting in its sealing file, if any. Safe to repeat:
+    # the chunk is rewritten under the same name, rollups that already fold
+    # it in are left alone, and a sealing file the index already covers is
+    # only removed.
+    index = _load_index(directory)
+    number = len(index["chunks"])
+    done = _sealing_path(directory, number)
+    if number and os.path.exists(done):
+        os.remove(done)
+    path = _sealing_path(directory, number + 1)
+    if not os.path.exists(path):
+        return
+    table = _read_rows(path)
+    if table:
+        _seal(directory, index, number + 1, table)
+    os.remove(path)
+
+
+def _seal(directory, index, number, table):
+    chunk_name = f"chunk_{number:06d}.npz"
+    _save_npz(os.path.join(directory, chunk_name), table)
+    for resolution in ("day", "week"):
+        rollup, folded = _load_rollup(directory, resolution)
+        if folded < number:
+            rollup = _merge_rollups(rollup, _rollup_rows(table, resolution))
+            _save_npz(
+                os.path.join(directory, f"rollup_{resolution}.npz"), {**rollup, "chunks": np.array(number)}
+            )
+    index["chunks"].append(
+        {
+            "file": chunk_name,
+            "rows": int(len(table["ts"])),
+            "ts_min": float(np.min(table["ts"])),
+            "ts_max": float(np.max(table["ts"])),
+        }
+    )
+    _save_index(directory, index)
+
+
+def append_session(player_id, metrics, ts=None, is_baseline=False):
+    ts = time.time() if ts is None else float(ts)
+    row = {"ts": ts, "is_baseline": 1.0 if is_baseline else 0.0}
+    for name, value in metrics.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if math.isfinite(value):
+            row[f"m__{name}"] = float(value)
+
+    with _player_lock(player_id) as directory:
+        # Completes a seal a crash interrupted before the active segment
+        # can take its sealing file's name.
+        _finish_seal(directory)
+        active_path = os.path.join(directory, ACTIVE_FILE)
+        with open(active_path, "a+") as f:
+            f.write(json.dumps(row) + "\n")
+            f.seek(0)
+            # Bounded by HISTORY_CHUNK_ROWS, whatever the history length.
+            rows = sum(1 for _ in f)
+        if rows >= HISTORY_CHUNK_ROWS:
+            number = len(_load_index(directory)["chunks"]) + 1
+            os.replace(active_path, _sealing_path(directory, number))
+            _finish_seal(directory)
+
+
+def _read_raw(directory, start, end, active):
+    index = _load_index(directory)
+    tables = []
+    for chunk in index["chunks"]:
+        if chunk["ts_max"] < start or chunk["ts_min"] > end:
+            continue
+        tables.append(_load_npz(os.path.join(directory, chunk["file"])))
+    if active:
+        tables.append(active)
+    if not tables:
+        return {}
+    keys = set().union(*tables)
+    merged = {
+        key: np.concatenate([_column(t, key, len(t["ts"])) for t in tables]) for key in keys
+    }
+    mask = (merged["ts"] >= start) & (merged["ts"] <= end)
+    order = np.argsort(merged["ts"][mask], kind="stable")
+    return {key: values[mask][order] for key, values in merged.items()}
+
+
+def _merge_groups(values, groups, how):
+    # Reduces consecutive rows into len(groups)-1 groups given boundary indices.
+    if how == "sum":
+        return np.add.reduceat(values, groups[:-1])
+    if how == "min":
+        return np.fmin.reduceat(values, groups[:-1])
+    return np.fmax.reduceat(values, groups[:-1])
+
+
+def _nan_to_none(values):
+    return [None if not math.isfinite(v) else float(v) for v in values]
+
+
+def get_history(player_id, metrics=None, start=None, end=None, max_points=200):
+    directory = _player_dir(player_id)
+    start = -math.inf if start is None else float(start)
+    end = math.inf if end is None else float(end)
+    max_points = max(1, int(max_points))
+
+    if os.path.isdir(directory) and _seal_pending(directory):
+        with _player_lock(player_id) as directory:
+            _finish_seal(directory)
+
+    with _player_lock(player_id, shared=True) as directory:
+        active = _read_active(directory)
+        day = _merge_rollups(_load_rollup(directory, "day")[0], _rollup_rows(active, "day"))
+        if not day:
+            return {"resolution": "raw", "t": [], "series": {}}
+
+        all_metrics = sorted(
+            key[len("m__"):-len("__count")] for key in day if key.endswith("__count")
+        )
+        metrics = [m for m in (metrics or all_metrics) if m in all_metrics]
+
+        day_starts = day["bucket"] * DAY_S
+        in_range = (day_starts + DAY_S > start) & (day_starts <= end)
+        session_count = int(day["sessions"][in_range].sum())
+
+        if session_count <= max_points:
+            raw = _read_raw(directory, start, end, active)
+            if not raw:
+                return {"resolution": "raw", "t": [], "series": {}}
+            series = {}
+            for name in metrics:
+                values = raw.get(f"m__{name}", np.full(len(raw["ts"]), np.nan))
+                counts = np.isfinite(values).astype(float)
+                # Same keys as the rollup resolutions; a single session has no
+                # spread.
+                series[name] = {
+                    "mean": _nan_to_none(values),
+                    "std": [None] * len(values),
+                    "min": _nan_to_none(values),
+                    "max": _nan_to_none(values),
+                    "count": counts.astype(int).tolist(),
+                }
+            return {
+                "resolution": "raw",
+                "t": raw["ts"].tolist(),
+                "is_baseline": raw["is_baseline"].astype(bool).tolist(),
+                "series": series,
+            }
+
+        resolution = "day"
+        rollup = day
+        if int(in_range.sum()) > max_points:
+            resolution = "week"
+            rollup = _merge_rollups(_load_rollup(directory, "week")[0], _rollup_rows(active, "week"))
+
+        starts = np.array([_bucket_start(b, resolution) for b in rollup["bucket"]], dtype=float)
+        width = DAY_S if resolution == "day" else 7 * DAY_S
+        mask = (starts + width > start) & (starts <= end)
+        idx = np.nonzero(mask)[0]
+        if len(idx) == 0:
+            return {"resolution": resolution, "t": [], "series": {}}
+
+        # Still too many buckets: merge neighbours into at most max_points.
+        groups = np.linspace(0, len(idx), min(len(idx), max_points) + 1).astype(int)
+        groups = np.unique(groups)
+
+        t = starts[idx][groups[:-1]]
+        series = {}
+        for name in metrics:
+            count = _merge_groups(rollup[f"m__{name}__count"][idx], groups, "sum")
+            total = _merge_groups(rollup[f"m__{name}__sum"][idx], groups, "sum")
+            sumsq = _merge_groups(rollup[f"m__{name}__sumsq"][idx], groups, "sum")
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(count > 0, total / count, np.nan)
+                var = np.where(count > 1, (sumsq - count * mean * mean) / (count - 1), np.nan)
+            series[name] = {
+                "mean": _nan_to_none(mean),
+                "std": _nan_to_none(np.sqrt(np.maximum(var, 0.0))),
+                "min": _nan_to_none(_merge_groups(rollup[f"m__{name}__min"][idx], groups, "min")),
+                "max": _nan_to_none(_merge_groups(rollup[f"m__{name}__max"][idx], groups, "max")),
+                "count": count.astype(int).tolist(),
+            }
+        return {"resolution": resolution, "t": t.tolist(), "series": series}
@@ -0,0 +1,332 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import cv2
+
+from app.config import (
+    ADMISSION_ENABLED,
+    ADMISSION_WORKERS,
+    ADMISSION_CAPACITY_S,
+    ADMISSION_MAX_JOB_S,
+    ADMISSION_MAX_QUEUE_S,
+    ADMISSION_CALIBRATION_ALPHA,
+    ADMISSION_INTERACTIVE_RESERVED_S,
+    ADMISSION_MAX_STARVE_S,
+    ADMISSION_STAGE_RATES,
+    ADMISSION_UNKNOWN_MEDIA,
+    POSE_POOL_WORKERS,
+)
+from app.services.pose_extractor import IMAGE_EXTENSIONS, pose_window, tier_ms_per_frame
+from app.services.scheduler import lane_for
+from app.utils.metrics import inc, timing_breakdown
+
+# Upfront job costing and admission. probe_media() reads container metadata
+# right after upload, estimate_job() turns it into estimated CPU and wall
+# seconds using per-stage rates, and admission() admits the job when the
+# estimated CPU seconds of running jobs leave room for it, queues it
+# otherwise, and rejects it outright when it is larger than
+# ADMISSION_MAX_JOB_S or its estimated queue wait exceeds
+# ADMISSION_MAX_QUEUE_S. Jobs are admitted in their scheduler lane:
+# ADMISSION_INTERACTIVE_RESERVED_S of the capacity is kept for interactive
+# (quick posture) jobs, and a queued job that does not fit yet is passed by
+# later jobs that do, until it has waited ADMISSION_MAX_STARVE_S. When a job
+# finishes, its stage timings recalibrate the rates (EWMA); the stages are
+# timed inside the lane callables (timed_call), so queue wait does not count
+# as work.
+
+# Breakdown stage -> rate it calibrates.
+CALIBRATION_STAGES = {
+    "run_detection": "detection",
+    "ffmpeg_encode": "encode",
+    "pose_analysis": "pose",
+    "pose_pool": "pose",
+    "llm_call": "llm",
+}
+
+_lock = threading.Lock()
+_rates = dict(ADMISSION_STAGE_RATES)
+_running = {}
+_waiting = []
+_ids = itertools.count(1)
+
+
+def probe_media(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        image = cv2.imread(path)
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        return {"kind": "image", "frames": 1, "fps": 0.0, "width": width, "height": height, "duration_s": 0.0}
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return None
+    try:
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        kbps = cap.get(cv2.CAP_PROP_BITRATE)
+    finally:
+        cap.release()
+    if not fps or fps <= 1 or fps > 240:
+        fps = 30.0
+    if frames <= 0:
+        # Some containers carry no frame count; take the duration from the
+        # size and bitrate instead of demuxing the whole file.
+        if not kbps or kbps <= 0:
+            return None
+        frames = int(os.path.getsize(path) * 8 / (kbps * 1000) * fps)
+    return {
+        "kind": "video",
+        "frames": frames,
+        "fps": fps,
+        "width": width,
+        "height": height,
+        "duration_s": frames / fps,
+    }
+
+
+def estimate_job(kind, probes, llm_calls=1, plans=None):
+    # kind: "match" (detection + encode per frame-megapixel), "posture" or
+    # "squad" (pose per planned model second, squad files run on the pose
+    # pool). plans are the select_pose_plan() results for the probes, so the
+    # tier and stride are costed; without them each clip is costed at the
+    # default tier on every frame of its window.
+    units = {"detection": 0.0, "encode": 0.0, "pose": 0.0, "llm": float(llm_calls)}
+    for index, probe in enumerate(probes):
+        # A failed probe is costed as ADMISSION_UNKNOWN_MEDIA rather than
+        # free, so it cannot slip past admission.
+        probe = probe or ADMISSION_UNKNOWN_MEDIA
+        if kind == "match":
+            frame_mpix = probe["frames"] * probe["width"] * probe["height"] / 1e6
+            units["detection"] += frame_mpix
+            units["encode"] += frame_mpix
+        else:
+            if plans:
+                units["pose"] += plans[index]["frames"] * plans[index]["ms_per_frame"] / 1000.0
+            else:
+                # Costed whether or not the default tier's model is installed.
+                units["pose"] += pose_window(probe["frames"]) * tier_ms_per_frame() / 1000.0
+
+    with _lock:
+        stages = {stage: units[stage] * _rates[stage] for stage in units}
+
+    cpu_s = stages["detection"] + stages["encode"] + stages["pose"]
+    if kind == "match":
+        # The encode overlaps with the LLM call.
+        wall_s = stages["detection"] + max(stages["encode"], stages["llm"])
+    elif kind == "squad":
+        parallel = max(1, min(len(probes), POSE_POOL_WORKERS))
+        wall_s = stages["pose"] / parallel + stages["llm"]
+    else:
+        wall_s = stages["pose"] + stages["llm"]
+
+    return {
+        "kind": kind,
+        "units": units,
+        "stages": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+        "cpu_s": cpu_s,
+        "wall_s": wall_s,
+        "media": [probe for probe in probes if probe is not None],
+    }
+
+
+def _lane_of(estimate):
+    # Match and squad uploads always run in the batch lane (see routes).
+    return lane_for(estimate) if estimate["kind"] == "posture" else "batch"
+
+
+def _in_flight_s(lane=None):
+    return sum(t["cpu_s"] for t in _running.values() if lane is None or t["lane"] == lane)
+
+
+def _within_reserve(ticket):
+    return (
+        ticket["lane"] == "interactive"
+        and _in_flight_s("interactive") + ticket["cpu_s"] <= ADMISSION_INTERACTIVE_RESERVED_S
+    )
+
+
+def _fits(ticket):
+    # A job larger than the whole capacity still runs, alone. Batch jobs
+    # cannot use the interactive reserve; interactive jobs can always use it.
+    if not _running or _within_reserve(ticket):
+        return True
+    limit = ADMISSION_CAPACITY_S
+    if ticket["lane"] != "interactive":
+        limit -= ADMISSION_INTERACTIVE_RESERVED_S
+    return _in_flight_s() + ticket["cpu_s"] <= limit
+
+
+def _queue_wait_s(cpu_s, now):
+    # CPU seconds that must drain before a new job fits, spread over the
+    # node's workers.
+    remaining = sum(max(0.0, t["cpu_s"] - (now - t["started_at"])) for t in _running.values())
+    queued = sum(t["cpu_s"] for t in _waiting)
+    excess = remaining + queued + cpu_s - ADMISSION_CAPACITY_S
+    if not _running and not _waiting:
+        return 0.0
+    return max(0.0, excess) / max(1, ADMISSION_WORKERS)
+
+
+def _expected_wait_s(job, now):
+    # job: a ticket, or any dict with its lane and cpu_s.
+    return 0.0 if _fits(job) else _queue_wait_s(job["cpu_s"], now)
+
+
+def _reject_reason(cpu_s, wait_s):
+    if cpu_s > ADMISSION_MAX_JOB_S:
+        return (
+            f"Estimated processing time {cpu_s:.0f}s exceeds the per-job limit "
+            f"of {ADMISSION_MAX_JOB_S:.0f}s."
+        )
+    if wait_s > ADMISSION_MAX_QUEUE_S:
+        return f"Node is at capacity; estimated queue wait {wait_s:.0f}s."
+    return None
+
+
+def _start(ticket, now):
+    ticket["status"] = "running"
+    ticket["started_at"] = now
+    ticket["estimated_completion"] = now + ticket["wall_s"]
+    _running[ticket["id"]] = ticket
+
+
+def _dispatch(now):
+    # Starts every queued job that fits, oldest first. A job that has been
+    # passed over for ADMISSION_MAX_STARVE_S holds back later jobs of its
+    # lane, and everything beyond the interactive reserve, until it starts.
+    blocked = set()
+    for ticket in list(_waiting):
+        if ticket["lane"] in blocked or (blocked and not _within_reserve(ticket)):
+            continue
+        if _fits(ticket):
+            _waiting.remove(ticket)
+            _start(ticket, now)
+            ticket["event"].set()
+        elif now - ticket["queued_at"] >= ADMISSION_MAX_STARVE_S:
+            blocked.add(ticket["lane"])
+
+
+def preflight(estimate):
+    # What admission() would do with this job right now, without queueing it.
+    now = time.time()
+    with _lock:
+        job = {"lane": _lane_of(estimate), "cpu_s": estimate["cpu_s"]}
+        wait_s = _expected_wait_s(job, now) if ADMISSION_ENABLED else 0.0
+    reason = _reject_reason(estimate["cpu_s"], wait_s) if ADMISSION_ENABLED else None
+    return {
+        "accepted": reason is None,
+        "message": reason,
+        "estimated_cpu_s": round(estimate["cpu_s"], 3),
+        "estimated_wall_s": round(estimate["wall_s"], 3),
+        "estimated_wait_s": round(wait_s, 3),
+        "estimated_completion": now + wait_s + estimate["wall_s"],
+        "stages": estimate["stages"],
+    }
+
+
+@asynccontextmanager
+async def admission(estimate):
+    # Yields a ticket. ticket["status"] is "rejected" (with ticket["reason"])
+    # when the job was not taken; otherwise the body runs once the job is
+    # admitted and its capacity is returned on exit.
+    now = time.time()
+    ticket = {
+        "id": next(_ids),
+        "kind": estimate["kind"],
+        "lane": _lane_of(estimate),
+        "cpu_s": estimate["cpu_s"],
+        "wall_s": estimate["wall_s"],
+        "units": estimate["units"],
+        "stages": estimate["stages"],
+        "queued_at": now,
+        "started_at": None,
+        "status": "queued",
+        "reason": None,
+        "event": asyncio.Event(),
+    }
+    if not ADMISSION_ENABLED:
+        ticket["status"] = "running"
+        ticket["started_at"] = now
+        ticket["estimated_completion"] = now + ticket["wall_s"]
+        yield ticket
+        return
+
+    with _lock:
+        wait_s = _expected_wait_s(ticket, now)
+        ticket["reason"] = _reject_reason(ticket["cpu_s"], wait_s)
+        if ticket["reason"] is not None:
+            ticket["status"] = "rejected"
+            ticket["retry_after_s"] = max(1.0, wait_s - ADMISSION_MAX_QUEUE_S)
+        else:
+            ticket["estimated_completion"] = now + wait_s + ticket["wall_s"]
+            _waiting.append(ticket)
+            _dispatch(now)
+    outcome = "admitted" if ticket["status"] == "running" else ticket["status"]
+    inc("playsafe_admission_total", kind=ticket["kind"], outcome=outcome)
+
+    if ticket["status"] == "rejected":
+        yield ticket
+        return
+
+    try:
+        if ticket["status"] == "queued":
+            await ticket["event"].wait()
+        yield ticket
+    finally:
+        with _lock:
+            if ticket in _waiting:
+                _waiting.remove(ticket)
+            _running.pop(ticket["id"], None)
+            _dispatch(time.time())
+        if ticket["started_at"] is not None:
+            calibrate(ticket["units"], timing_breakdown())
+
+
+def calibrate(units, breakdown):
+    observed = {}
+    for stage, rate in CALIBRATION_STAGES.items():
+        if stage in breakdown:
+            observed[rate] = observed.get(rate, 0.0) + breakdown[stage]["seconds"]
+    with _lock:
+        for rate, seconds in observed.items():
+            if units.get(rate, 0) > 0:
+                _rates[rate] += ADMISSION_CALIBRATION_ALPHA * (seconds / units[rate] - _rates[rate])
+
+
+def admission_info(ticket):
+    info = {
+        "status": ticket["status"],
+        "estimated_cpu_s": round(ticket["cpu_s"], 3),
+        "estimated_wall_s": round(ticket["wall_s"], 3),
+        "stages": ticket["stages"],
+    }
+    if ticket["status"] == "rejected":
+        info["retry_after_s"] = round(ticket["retry_after_s"], 1)
+        return info
+    info["queued_s"] = round(ticket["started_at"] - ticket["queued_at"], 3)
+    info["estimated_completion"] = ticket["estimated_completion"]
+    return info
+
+
+def admission_status():
+    now = time.time()
+    with _lock:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "capacity_s": ADMISSION_CAPACITY_S,
+            "workers": ADMISSION_WORKERS,
+            "running": len(_running),
+            "queued": len(_waiting),
+            "interactive_reserved_s": ADMISSION_INTERACTIVE_RESERVED_S,
+            "in_flight_cpu_s": round(_in_flight_s(), 3),
+            "estimated_wait_s": round(_queue_wait_s(0.0, now), 3),
+            "rates": dict(_rates),
+        }
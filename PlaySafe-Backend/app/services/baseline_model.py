@@ -1,6 +1,19 @@
-import os
-import json
-from app.config import BASELINE_PATH
+import copy
+
+from app.models.baseline_storage import get_baseline, get_baselines, update_baseline
+from app.services.baseline_stats import (
+    new_metric_stats,
+    update_metric_stats,
+    merge_metric_stats,
+    sketch_add,
+    metric_summary,
+    z_score,
+    percentile,
+)
+from app.utils.metrics import stage_timer
+
+CORE_METRICS = ("left_knee_mean", "right_knee_mean", "trunk_angle_mean")
+EXCLUDED_METRICS = {"fps_used"}
 
 
 def _safe_float(value, default=0.0):
@@ -11,72 +24,160 @@ def _safe_float(value, default=0.0):
 
 
 def _build_current(joint_metrics):
+    current = {}
+    for key, value in joint_metrics.items():
+        if key in EXCLUDED_METRICS or isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            current[key] = _safe_float(value)
+    for key in CORE_METRICS:
+        current.setdefault(key, 0.0)
+    return current
+
+
+def _record_stats(data):
+    if not data:
+        return {}
+    if "stats" in data:
+        return data["stats"]
+    # Records written before per-metric statistics only kept running means.
+    # The spread behind that mean is unknown, so it is seeded as a single
+    # observation: claiming `sessions` observations with m2 = 0 would report
+    # zero variance and inflate every z-score. Variance (and z-scores) start
+    # once a real session has been added.
+    sessions = int(data.get("sessions", 0))
+    stats = {}
+    for key, mean in (data.get("baseline") or {}).items():
+        s = new_metric_stats()
+        mean = _safe_float(mean)
+        if sessions > 0:
+            s.update({"count": 1, "mean": mean, "min": mean, "max": mean, "ewma": mean})
+            sketch_add(s["sketch"], mean)
+        stats[key] = s
+    return stats
+
+
+def _apply_session(data, current):
+    stats = _record_stats(data)
+    for key, value in current.items():
+        stats[key] = update_metric_stats(stats.get(key) or new_metric_stats(), value)
+    sessions = int(data.get("sessions", 0)) if data else 0
+    return _build_record(sessions + 1, stats)
+
+
+def _build_record(sessions, stats):
     return {
-        "left_knee_mean": _safe_float(joint_metrics.get("left_knee_mean", 0.0)),
-        "right_knee_mean": _safe_float(joint_metrics.get("right_knee_mean", 0.0)),
-        "trunk_angle_mean": _safe_float(joint_metrics.get("trunk_angle_mean", 0.0)),
+        "sessions": sessions,
+        "baseline": {key: s["mean"] for key, s in stats.items() if s["count"]},
+        "stats": stats,
     }
 
 
-def load_posture_baseline(player_id, joint_metrics):
-    os.makedirs(BASELINE_PATH, exist_ok=True)
-    path = os.path.join(BASELINE_PATH, f"{player_id}_posture.json")
-    current = _build_current(joint_metrics)
+def _deviations(stats, current):
+    z_scores = {}
+    percentiles = {}
+    for key, value in current.items():
+        metric = stats.get(key)
+        if not metric or not metric["count"]:
+            continue
+        z_scores[key] = z_score(metric, value)
+        percentiles[key] = percentile(metric, value)
+    return z_scores, percentiles
 
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            data = json.load(f)
-        sessions = int(data.get("sessions", 0))
-        baseline = data.get("baseline", current)
-    else:
-        sessions = 1
-        baseline = current
-        with open(path, "w") as f:
-            json.dump({"sessions": sessions, "baseline": baseline}, f)
 
+def _baseline_info(data, current, reference_stats):
+    stats = _record_stats(data)
+    baseline = data.get("baseline", current)
     deltas = {key: current[key] - baseline.get(key, current[key]) for key in current}
-
+    z_scores, percentiles = _deviations(reference_stats, current)
     return {
-        "sessions": sessions,
+        "sessions": int(data.get("sessions", 0)),
         "baseline": baseline,
+        "recent_baseline": {
+            key: s["ewma"] for key, s in stats.items() if s.get("ewma") is not None
+        },
         "current": current,
         "deltas": deltas,
+        "z_scores": z_scores,
+        "percentiles": percentiles,
     }
 
 
+def load_posture_baseline(player_id, joint_metrics):
+    current = _build_current(joint_metrics)
+
+    def init_if_missing(data):
+        if data is not None:
+            return None
+        return _apply_session(None, current)
+
+    with stage_timer("baseline_load"):
+        data = get_baseline(player_id)
+        if data is None:
+            data = update_baseline(player_id, init_if_missing)
+
+        return _baseline_info(data, current, _record_stats(data))
+
+
 def update_posture_baseline(player_id, joint_metrics):
-    os.makedirs(BASELINE_PATH, exist_ok=True)
-    path = os.path.join(BASELINE_PATH, f"{player_id}_posture.json")
     current = _build_current(joint_metrics)
+    previous = {}
+
+    def apply_session(data):
+        previous["stats"] = copy.deepcopy(_record_stats(data))
+        return _apply_session(data, current)
+
+    with stage_timer("baseline_update"):
+        data = update_baseline(player_id, apply_session)
 
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            data = json.load(f)
-        sessions = int(data.get("sessions", 0))
-        baseline = data.get("baseline", current)
-    else:
-        sessions = 0
-        baseline = current
+        # Deviation scores compare this session with the history before it, so
+        # a session cannot pull its own z-score towards zero.
+        return _baseline_info(data, current, previous["stats"])
 
-    n = sessions
-    updated_baseline = {}
-    for key in current:
-        prev = _safe_float(baseline.get(key, current[key]))
-        val = current[key]
-        updated_baseline[key] = (prev * n + val) / (n + 1) if n >= 0 else val
 
-    sessions = n + 1
+def merge_posture_baseline(player_id, other):
+    # Folds a baseline record exported from another device/server (as returned
+    # by export_posture_baseline) into this player's record.
+    other_stats = _record_stats(other)
 
-    deltas = {key: current[key] - updated_baseline[key] for key in current}
+    def merge(data):
+        stats = dict(_record_stats(data))
+        for key, metric in other_stats.items():
+            stats[key] = merge_metric_stats(stats.get(key), metric)
+        sessions = (int(data.get("sessions", 0)) if data else 0) + int(other.get("sessions", 0))
+        return _build_record(sessions, stats)
 
-    data = {"sessions": sessions, "baseline": updated_baseline}
+    data = update_baseline(player_id, merge)
+    return summarize_posture_baseline(data)
 
-    with open(path, "w") as f:
-        json.dump(data, f)
 
+def export_posture_baseline(player_id):
+    data = get_baseline(player_id)
+    if data is None:
+        return None
+    return _build_record(int(data.get("sessions", 0)), _record_stats(data))
+
+
+def summarize_posture_baseline(data):
+    stats = _record_stats(data)
     return {
-        "sessions": sessions,
-        "baseline": updated_baseline,
-        "current": current,
-        "deltas": deltas,
+        "sessions": int(data.get("sessions", 0)),
+        "baseline": data.get("baseline"),
+        "metrics": {key: metric_summary(s) for key, s in stats.items() if s["count"]},
+    }
+
+
+def load_squad_baselines(player_ids=None):
+    from_store = get_baselines(player_ids)
+    return {
+        player_id: {
+            "sessions": int(data.get("sessions", 0)),
+            "baseline": data.get("baseline"),
+            "recent_baseline": {
+                key: s["ewma"]
+                for key, s in _record_stats(data).items()
+                if s.get("ewma") is not None
+            },
+        }
+        for player_id, data in from_store.items()
     }
@@ -0,0 +1,204 @@
+import math
+
+from app.config import (
+    BASELINE_EWMA_ALPHA,
+    BASELINE_SKETCH_RELATIVE_ACCURACY,
+    BASELINE_SKETCH_MAX_BINS,
+)
+
+# Per-metric running statistics that update in O(1) per session and merge
+# across devices/servers:
+#   - count / mean / m2: Welford running variance (Chan et al. for merges)
+#   - ewma / ewma_var: exponentially weighted recent baseline
+#   - sketch: DDSketch-style log-bucket histogram for quantiles/percentiles
+
+_GAMMA = (1 + BASELINE_SKETCH_RELATIVE_ACCURACY) / (1 - BASELINE_SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_INDEXABLE = 1e-9
+
+
+def new_sketch():
+    return {"pos": {}, "neg": {}, "zero": 0}
+
+
+def _bucket_index(value):
+    return int(math.ceil(math.log(value) / _LOG_GAMMA))
+
+
+def _bucket_value(index):
+    return 2.0 * (_GAMMA ** index) / (_GAMMA + 1.0)
+
+
+def _collapse(store):
+    # Keeps the sketch bounded by folding the smallest-magnitude buckets
+    # together; accuracy is only lost near zero.
+    if len(store) <= BASELINE_SKETCH_MAX_BINS:
+        return
+    indices = sorted(store, key=int)
+    excess = len(indices) - BASELINE_SKETCH_MAX_BINS
+    target = indices[excess]
+    folded = sum(store.pop(k) for k in indices[:excess])
+    store[target] += folded
+
+
+def sketch_add(sketch, value, count=1):
+    if abs(value) < _MIN_INDEXABLE:
+        sketch["zero"] += count
+        return
+    store = sketch["pos"] if value > 0 else sketch["neg"]
+    key = str(_bucket_index(abs(value)))
+    store[key] = store.get(key, 0) + count
+    _collapse(store)
+
+
+def sketch_merge(a, b):
+    merged = {"pos": dict(a["pos"]), "neg": dict(a["neg"]), "zero": a["zero"] + b["zero"]}
+    for side in ("pos", "neg"):
+        for key, count in b[side].items():
+            merged[side][key] = merged[side].get(key, 0) + count
+        _collapse(merged[side])
+    return merged
+
+
+def _sketch_buckets(sketch):
+    # Ascending (value, count) pairs.
+    buckets = [(-_bucket_value(int(k)), c) for k, c in sketch["neg"].items()]
+    buckets.sort()
+    if sketch["zero"]:
+        buckets.append((0.0, sketch["zero"]))
+    buckets.extend(sorted((_bucket_value(int(k)), c) for k, c in sketch["pos"].items()))
+    return buckets
+
+
+def sketch_quantile(sketch, q):
+    buckets = _sketch_buckets(sketch)
+    total = sum(c for _, c in buckets)
+    if total == 0:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for value, count in buckets:
+        seen += count
+        if seen > rank:
+            return value
+    return buckets[-1][0]
+
+
+def sketch_percentile(sketch, value):
+    # Fraction of recorded sessions below value (ties count half), 0-100.
+    buckets = _sketch_buckets(sketch)
+    total = sum(c for _, c in buckets)
+    if total == 0:
+        return None
+    if abs(value) < _MIN_INDEXABLE:
+        probe = 0.0
+    else:
+        probe = math.copysign(_bucket_value(_bucket_index(abs(value))), value)
+    below = sum(c for v, c in buckets if v < probe)
+    equal = sum(c for v, c in buckets if v == probe)
+    return 100.0 * (below + 0.5 * equal) / total
+
+
+def new_metric_stats():
+    return {
+        "count": 0,
+        "mean": 0.0,
+        "m2": 0.0,
+        "min": None,
+        "max": None,
+        "ewma": None,
+        "ewma_var": 0.0,
+        "sketch": new_sketch(),
+    }
+
+
+def update_metric_stats(stats, value):
+    stats["count"] += 1
+    delta = value - stats["mean"]
+    stats["mean"] += delta / stats["count"]
+    stats["m2"] += delta * (value - stats["mean"])
+    stats["min"] = value if stats["min"] is None else min(stats["min"], value)
+    stats["max"] = value if stats["max"] is None else max(stats["max"], value)
+
+    if stats["ewma"] is None:
+        stats["ewma"] = value
+        stats["ewma_var"] = 0.0
+    else:
+        diff = value - stats["ewma"]
+        incr = BASELINE_EWMA_ALPHA * diff
+        stats["ewma"] += incr
+        stats["ewma_var"] = (1 - BASELINE_EWMA_ALPHA) * (stats["ewma_var"] + diff * incr)
+
+    sketch_add(stats["sketch"], value)
+    return stats
+
+
+def merge_metric_stats(a, b):
+    if not a or not a.get("count"):
+        return _copy_stats(b)
+    if not b or not b.get("count"):
+        return _copy_stats(a)
+
+    n = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    mean = a["mean"] + delta * b["count"] / n
+    m2 = a["m2"] + b["m2"] + delta * delta * a["count"] * b["count"] / n
+
+    # EWMAs from independent streams have no shared timeline; weight them by
+    # how many sessions each side has seen.
+    wa = a["count"] / n
+    wb = b["count"] / n
+    ewma = wa * a["ewma"] + wb * b["ewma"]
+    ewma_var = wa * a["ewma_var"] + wb * b["ewma_var"]
+
+    return {
+        "count": n,
+        "mean": mean,
+        "m2": m2,
+        "min": min(a["min"], b["min"]),
+        "max": max(a["max"], b["max"]),
+        "ewma": ewma,
+        "ewma_var": ewma_var,
+        "sketch": sketch_merge(a["sketch"], b["sketch"]),
+    }
+
+
+def _copy_stats(stats):
+    merged = new_metric_stats()
+    if stats:
+        merged.update({k: v for k, v in stats.items() if k != "sketch"})
+        merged["sketch"] = sketch_merge(new_sketch(), stats.get("sketch") or new_sketch())
+    return merged
+
+
+def metric_variance(stats):
+    if stats["count"] < 2:
+        return None
+    return stats["m2"] / (stats["count"] - 1)
+
+
+def metric_summary(stats):
+    variance = metric_variance(stats)
+    return {
+        "count": stats["count"],
+        "mean": stats["mean"],
+        "std": math.sqrt(variance) if variance is not None else None,
+        "min": stats["min"],
+        "max": stats["max"],
+        "ewma": stats["ewma"],
+        "ewma_std": math.sqrt(stats["ewma_var"]) if stats["ewma"] is not None else None,
+        "p10": sketch_quantile(stats["sketch"], 0.1),
+        "p50": sketch_quantile(stats["sketch"], 0.5),
+        "p90": sketch_quantile(stats["sketch"], 0.9),
+    }
+
+
+def z_score(stats, value):
+    variance = metric_variance(stats)
+    if not variance or variance <= 0:
+        return None
+    return (value - stats["mean"]) / math.sqrt(variance)
+
+
+def percentile(stats, value):
+    return sketch_percentile(stats["sketch"], value)
@@ -0,0 +1,180 @@
+import asyncio
+import contextvars
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from app.utils.metrics import inc
+
+# Cooperative job cancellation. A request registers a job (client-supplied
+# job_id or a generated one) whose token travels in a ContextVar, so it
+# reaches the scheduler's lane threads and the LLM tasks. Long loops call
+# check_cancelled() between frames and the LLM helpers call it before a
+# request goes out; a cancelled job raises JobCancelled, and each stage
+# removes what it had written. Tokens are set by POST /jobs/{job_id}/cancel
+# or by a watcher that waits for the client to disconnect. Process pool
+# workers cannot see the token, so cancel_job also writes the job's cancel
+# file, which in_pool_job checks in place of the token.
+
+
+class JobCancelled(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_jobs = {}
+_current = contextvars.ContextVar("cancel_token", default=None)
+
+
+class _CancelFile:
+    # Event-like view of a cancel file for tokens in pool workers.
+    def __init__(self, path):
+        self.path = path
+
+    def is_set(self):
+        return os.path.exists(self.path)
+
+
+def start_job(job_id=None, request=None):
+    token = {
+        "job_id": job_id or uuid.uuid4().hex,
+        "event": threading.Event(),
+        "reason": None,
+        "started_at": time.time(),
+        "watcher": None,
+        "cancel_file": os.path.join(tempfile.gettempdir(), f"playsafe-cancel-{uuid.uuid4().hex}"),
+    }
+    with _lock:
+        if token["job_id"] in _jobs:
+            raise ValueError(f"Job {token['job_id']} is already running")
+        _jobs[token["job_id"]] = token
+    _current.set(token)
+    if request is not None:
+        token["watcher"] = asyncio.create_task(_watch_disconnect(request, token))
+    return token
+
+
+def use_job(token):
+    # Re-attaches a job in code that runs outside the request's context (e.g.
+    # a StreamingResponse body generator).
+    _current.set(token)
+
+
+def finish_job(token):
+    if token["watcher"] is not None:
+        token["watcher"].cancel()
+    with _lock:
+        if _jobs.get(token["job_id"]) is token:
+            del _jobs[token["job_id"]]
+    try:
+        os.remove(token["cancel_file"])
+    except FileNotFoundError:
+        pass
+
+
+def cancel_job(job_id, reason="cancelled"):
+    with _lock:
+        token = _jobs.get(job_id)
+    if token is None or token["event"].is_set():
+        return token is not None
+    token["reason"] = reason
+    token["event"].set()
+    with open(token["cancel_file"], "w") as f:
+        f.write(reason)
+    inc("playsafe_jobs_cancelled_total", reason=reason)
+    return True
+
+
+def active_jobs():
+    with _lock:
+        return [
+            {"job_id": job_id, "started_at": token["started_at"], "cancelled": token["event"].is_set()}
+            for job_id, token in _jobs.items()
+        ]
+
+
+def in_pool_job(job_id, cancel_file, fn, *args):
+    # Runs fn(*args) in a process pool worker under a token backed by the
+    # job's cancel file, so the worker's check_cancelled() calls see a
+    # cancellation made in the API process.
+    token = {"job_id": job_id, "event": _CancelFile(cancel_file), "reason": "cancelled"}
+    reset = _current.set(token)
+    try:
+        return fn(*args)
+    finally:
+        _current.reset(reset)
+
+
+def is_cancelled():
+    token = _current.get()
+    return token is not None and token["event"].is_set()
+
+
+def check_cancelled():
+    token = _current.get()
+    if token is not None and token["event"].is_set():
+        raise JobCancelled(f"Job {token['job_id']} {token['reason']}")
+
+
+async def gather_cancellable(tasks, poll_interval=0.1):
+    # asyncio.gather for process pool jobs: polls the current job and, once
+    # it is cancelled, cancels the tasks that have not finished (queued pool
+    # work never starts) and raises JobCancelled. The cancelled tasks are
+    # awaited, so work already running in a worker has stopped at its next
+    # cancel-file check before this returns.
+    tasks = [asyncio.ensure_future(task) for task in tasks]
+    try:
+        pending = tasks
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=poll_interval)
+            if pending and is_cancelled():
+                check_cancelled()
+        return [task.result() for task in tasks]
+    finally:
+        await cancel_pending(tasks)
+
+
+async def cancel_pending(tasks, reason="aborted"):
+    # Cleanup for tasks a request started but will not await because it is
+    # failing: cancels the job (so lane threads and ffmpeg children stop at
+    # their next check) and the unfinished tasks, then awaits them so their
+    # exceptions are retrieved.
+    pending = [task for task in tasks if task is not None and not task.done()]
+    if pending:
+        token = _current.get()
+        if token is not None:
+            cancel_job(token["job_id"], reason)
+        for task in pending:
+            task.cancel()
+    await asyncio.gather(*[task for task in tasks if task is not None], return_exceptions=True)
+
+
+async def _watch_disconnect(request, token):
+    # The body is already consumed by the time the route runs, so the next
+    # ASGI message is the disconnect. (request.is_disconnected() only peeks
+    # and never sees it through the http middleware.)
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            cancel_job(token["job_id"], "client_disconnected")
+            return
+
+
+def run_cancellable(cmd, poll_interval=0.1):
+    # subprocess.run(check=True) that kills the child once the current job is
+    # cancelled.
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        try:
+            returncode = proc.wait(timeout=poll_interval)
+            break
+        except subprocess.TimeoutExpired:
+            if is_cancelled():
+                proc.kill()
+                proc.wait()
+                check_cancelled()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
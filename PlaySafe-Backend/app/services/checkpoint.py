@@ -0,0 +1,190 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from app.config import CHECKPOINT_PATH
+
+# Resumable run_detection state. Rendered frames are durable PNGs kept next to
+# the checkpoint, so a checkpoint only has to capture the tracker. Every
+# detection is stored with the track it was assigned to, one append-only
+# segment per checkpoint:
+#
+#   data/checkpoints/<match>/
+#       manifest.json        video fingerprint, last frame, next track ids,
+#                            committed segment files
+#       seg_000001.npz ...   frame/x/y/track number per team since the
+#                            previous checkpoint
+#       frames/              frames rendered so far
+#   data/checkpoints/<match>.lock
+#
+# <match> is match_key(): derived from the video content, so uploads that
+# share a file name never share state and a re-upload of the same video
+# resumes. The lock keeps two runs of one video from writing the same
+# checkpoint at once.
+#
+# Tracks, position lists and heatmaps are rebuilt from the segments on resume,
+# so a resumed run ends in exactly the same state as an uninterrupted one.
+
+TEAMS = (("teamA", "A"), ("teamB", "B"))
+# Rendered frame file names (1-based), also the ffmpeg input pattern.
+FRAME_PATTERN = "frame_%04d.png"
+
+
+def _checkpoint_dir(match_id):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(match_id))
+    return os.path.join(CHECKPOINT_PATH, safe)
+
+
+def video_fingerprint(video_path):
+    # Size plus a hash of the first MiB: cheap, and stable across re-uploads
+    # of the same file (mtime is not).
+    digest = hashlib.sha1()
+    with open(video_path, "rb") as f:
+        digest.update(f.read(1 << 20))
+    return f"{os.path.getsize(video_path)}:{digest.hexdigest()}"
+
+
+def match_key(video_path):
+    return hashlib.sha1(video_fingerprint(video_path).encode("utf-8")).hexdigest()[:16]
+
+
+def frames_dir(match_id):
+    return os.path.join(_checkpoint_dir(match_id), "frames")
+
+
+def claim_checkpoint(match_id):
+    # Returns the locked lock file, or None while another run holds it.
+    os.makedirs(CHECKPOINT_PATH, exist_ok=True)
+    lock_file = open(_checkpoint_dir(match_id) + ".lock", "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def release_checkpoint(lock_file):
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+
+def _load_manifest(directory):
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(directory, manifest):
+    path = os.path.join(directory, "manifest.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def open_checkpoint(match_id, video_path):
+    # Returns (manifest, restored) where restored is None for a fresh run or
+    # the concatenated per-team detections with track numbers to resume from.
+    directory = _checkpoint_dir(match_id)
+    fingerprint = video_fingerprint(video_path)
+    manifest = _load_manifest(directory)
+    if (
+        manifest is None
+        or manifest.get("fingerprint") != fingerprint
+        or not _frames_rendered(frames_dir(match_id), manifest.get("frame_count", 0))
+    ):
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        manifest = {
+            "fingerprint": fingerprint,
+            "frame_count": 0,
+            "next_id": {"teamA": 1, "teamB": 1},
+            "offsets": {"teamA": 0, "teamB": 0},
+            "segments": [],
+        }
+        return manifest, None
+
+    parts = {team: {"frame": [], "x": [], "y": [], "tid": []} for team, _ in TEAMS}
+    for name in manifest["segments"]:
+        with np.load(os.path.join(directory, name)) as data:
+            for team, _ in TEAMS:
+                for key in ("frame", "x", "y", "tid"):
+                    parts[team][key].append(data[f"{team}__{key}"])
+    restored = {
+        team: {
+            key: np.concatenate(values) if values else np.zeros(0, dtype=np.int64)
+            for key, values in columns.items()
+        }
+        for team, columns in parts.items()
+    }
+    return manifest, restored
+
+
+def _frames_rendered(directory, frame_count):
+    # A resumed run skips frames up to the checkpoint, so the encode needs
+    # every one of them already on disk.
+    try:
+        names = set(os.listdir(directory))
+    except OSError:
+        return frame_count == 0
+    return all(FRAME_PATTERN % index in names for index in range(1, frame_count + 1))
+
+
+def save_checkpoint(match_id, manifest, frame_count, next_ids, stores):
+    # stores: {team: (frames, xs, ys, track_numbers)} lists covering the whole
+    # run so far; only rows past the last checkpoint are written.
+    directory = _checkpoint_dir(match_id)
+    name = f"seg_{len(manifest['segments']) + 1:06d}.npz"
+    arrays = {}
+    offsets = {}
+    for team, _ in TEAMS:
+        start = manifest["offsets"][team]
+        columns = stores[team]
+        for key, values in zip(("frame", "x", "y", "tid"), columns):
+            arrays[f"{team}__{key}"] = np.asarray(values[start:], dtype=np.int64)
+        offsets[team] = len(columns[0])
+
+    path = os.path.join(directory, name)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+    manifest["segments"].append(name)
+    manifest["frame_count"] = frame_count
+    manifest["next_id"] = dict(next_ids)
+    manifest["offsets"] = offsets
+    _save_manifest(directory, manifest)
+
+
+def restore_tracks(columns, prefix):
+    # Rebuilds tracker tracks in creation (track number) order, positions in
+    # frame order, matching what _update_tracks produced the first time.
+    order = np.lexsort((columns["frame"], columns["tid"]))
+    tids = columns["tid"][order].tolist()
+    frames = columns["frame"][order].tolist()
+    xs = columns["x"][order].tolist()
+    ys = columns["y"][order].tolist()
+    tracks = []
+    current = None
+    for tid, frame_index, x, y in zip(tids, frames, xs, ys):
+        if current is None or current[0] != tid:
+            current = (tid, {"id": f"{prefix}{tid}", "positions": []})
+            tracks.append(current[1])
+        current[1]["positions"].append((frame_index, x, y))
+    return tracks
+
+
+def clear_checkpoint(match_id):
+    shutil.rmtree(_checkpoint_dir(match_id), ignore_errors=True)
@@ -1,3 +1,4 @@
+import cv2
 import numpy as np
 
 def compute_formation_metrics(team_positions):
@@ -9,11 +10,12 @@ def compute_formation_metrics(team_positions):
             "compactness": 0
         }
 
-    xs = [p[0] for p in team_positions]
-    ys = [p[1] for p in team_positions]
+    positions = np.asarray(team_positions)
+    xs = positions[:, 0]
+    ys = positions[:, 1]
 
-    width = max(xs) - min(xs)
-    depth = max(ys) - min(ys)
+    width = (xs.max() - xs.min()).item()
+    depth = (ys.max() - ys.min()).item()
 
     compactness = width * depth
 
@@ -22,3 +24,193 @@ def compute_formation_metrics(team_positions):
         "depth": depth,
         "compactness": compactness
     }
+
+
+def build_detection_store(frames, xs, ys):
+    # Columnar detections for one team, in frame order (frames are 1-based,
+    # matching the tracker's frame indices).
+    return {
+        "frame": np.asarray(frames, dtype=np.int64),
+        "x": np.asarray(xs, dtype=np.float64),
+        "y": np.asarray(ys, dtype=np.float64),
+    }
+
+
+def _nan_series(num_frames):
+    return np.full(num_frames, np.nan)
+
+
+def compute_formation_series(store, num_frames):
+    # Per-frame shape metrics for one team, computed as segmented NumPy
+    # reductions over the detection store (no per-frame Python loop).
+    frame = store["frame"]
+    x = store["x"]
+    y = store["y"]
+
+    series = {
+        "frame": np.arange(1, num_frames + 1),
+        "count": np.zeros(num_frames, dtype=np.int64),
+    }
+    for key in (
+        "width",
+        "depth",
+        "compactness",
+        "hull_area",
+        "centroid_x",
+        "centroid_y",
+        "def_mid_distance",
+        "mid_att_distance",
+    ):
+        series[key] = _nan_series(num_frames)
+
+    if len(frame) == 0 or num_frames == 0:
+        return series
+
+    starts = np.flatnonzero(np.r_[True, frame[1:] != frame[:-1]])
+    ends = np.r_[starts[1:], len(frame)]
+    rows = frame[starts] - 1
+    counts = ends - starts
+
+    width = np.maximum.reduceat(x, starts) - np.minimum.reduceat(x, starts)
+    depth = np.maximum.reduceat(y, starts) - np.minimum.reduceat(y, starts)
+
+    series["count"][rows] = counts
+    series["width"][rows] = width
+    series["depth"][rows] = depth
+    series["compactness"][rows] = width * depth
+    series["centroid_x"][rows] = np.add.reduceat(x, starts) / counts
+    series["centroid_y"][rows] = np.add.reduceat(y, starts) / counts
+
+    # Lines: split each frame's players into depth terciles (by y) and measure
+    # the gaps between the defensive, middle and attacking line means.
+    # frame + normalised y sorts by frame, then y, in one float argsort
+    # (several times faster than lexsort on long matches).
+    y_span = y.max() - y.min() + 1.0
+    order = np.argsort(frame + (y - y.min()) / y_span, kind="stable")
+    seg = np.repeat(np.arange(len(starts)), counts)
+    rank = np.arange(len(frame)) - np.repeat(starts, counts)
+    line = (3 * rank) // np.repeat(counts, counts)
+    line_key = seg * 3 + line
+    line_sum = np.bincount(line_key, weights=y[order], minlength=len(starts) * 3)
+    line_n = np.bincount(line_key, minlength=len(starts) * 3)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        line_mean = (line_sum / line_n).reshape(-1, 3)
+    enough = counts >= 3
+    series["def_mid_distance"][rows[enough]] = np.abs(line_mean[enough, 1] - line_mean[enough, 0])
+    series["mid_att_distance"][rows[enough]] = np.abs(line_mean[enough, 2] - line_mean[enough, 1])
+
+    series["hull_area"][rows] = _hull_areas(x, y, starts, counts)
+
+    return series
+
+
+HULL_VECTOR_MAX_POINTS = 32
+
+
+def _hull_areas(x, y, starts, counts):
+    # Convex hull area per frame segment. Frames are grouped by point count and
+    # each group runs a gift-wrapping walk over all its frames at once, so the
+    # Python-level work is O(k^2) array ops per distinct count k rather than
+    # per frame. Unusually crowded frames fall back to cv2.
+    areas = np.zeros(len(starts))
+    for k in np.unique(counts):
+        if k < 3:
+            continue
+        group = np.flatnonzero(counts == k)
+        if k > HULL_VECTOR_MAX_POINTS:
+            for g in group:
+                areas[g] = _cv2_hull_area(x[starts[g]:starts[g] + k], y[starts[g]:starts[g] + k])
+            continue
+        idx = starts[group][:, None] + np.arange(k)[None, :]
+        areas[group], closed = _gift_wrap_area(x[idx], y[idx])
+        # Walks that did not close (inconsistent float orientation tests on
+        # near-collinear points) are redone one frame at a time.
+        for g in group[~closed]:
+            areas[g] = _cv2_hull_area(x[starts[g]:starts[g] + k], y[starts[g]:starts[g] + k])
+    return areas
+
+
+def _cv2_hull_area(px, py):
+    pts = np.stack([px, py], axis=1).astype(np.float32)
+    return float(cv2.contourArea(cv2.convexHull(pts)))
+
+
+def _gift_wrap_area(px, py):
+    # px, py: (n, k) point coordinates for n frames of k points each. Returns
+    # (areas, closed) where closed marks frames whose walk got back to the
+    # start.
+    n, k = px.shape
+    frames = np.arange(n)
+    # Columns as contiguous rows: column r is read k^2 times below.
+    cols_x = np.ascontiguousarray(px.T)
+    cols_y = np.ascontiguousarray(py.T)
+    start = np.lexsort((py, px), axis=1)[:, 0]
+    sx = px[frames, start]
+    sy = py[frames, start]
+    current = start.copy()
+    cx = sx
+    cy = sy
+    done = np.zeros(n, dtype=bool)
+    twice_area = np.zeros(n)
+
+    for _ in range(k):
+        cand = (current + 1) % k
+        ax = px[frames, cand] - cx
+        ay = py[frames, cand] - cy
+        for r in range(k):
+            bx = cols_x[r] - cx
+            by = cols_y[r] - cy
+            cross = ax * by - ay * bx
+            take = (cross < 0) | ((cross == 0) & (bx * bx + by * by > ax * ax + ay * ay))
+            cand = np.where(take, r, cand)
+            ax = np.where(take, bx, ax)
+            ay = np.where(take, by, ay)
+        # Read the chosen point back by index; rebuilding it from the offsets
+        # drifts in floating point.
+        nx = px[frames, cand]
+        ny = py[frames, cand]
+        twice_area += np.where(done, 0.0, cx * ny - nx * cy)
+        # Compare positions, not indices: a duplicate of the start point closes
+        # the hull, and a walk with nowhere left to go (all points coincide)
+        # stops.
+        done |= ((nx == sx) & (ny == sy)) | ((nx == cx) & (ny == cy))
+        current = np.where(done, current, cand)
+        cx = np.where(done, cx, nx)
+        cy = np.where(done, cy, ny)
+        if done.all():
+            break
+
+    return np.abs(twice_area) / 2.0, done
+
+
+def aggregate_formation_windows(series, window_frames, step_frames):
+    # Mean of each per-frame metric over sliding windows, ignoring frames with
+    # no detections. Uses prefix sums so cost is independent of window size.
+    num_frames = len(series["frame"])
+    window_frames = max(1, int(window_frames))
+    step_frames = max(1, int(step_frames))
+    if num_frames == 0:
+        return {"start_frame": np.zeros(0, dtype=np.int64), "end_frame": np.zeros(0, dtype=np.int64)}
+
+    starts = np.arange(0, max(num_frames - window_frames, 0) + 1, step_frames)
+    ends = np.minimum(starts + window_frames, num_frames)
+
+    windows = {
+        "start_frame": series["frame"][starts],
+        "end_frame": series["frame"][ends - 1],
+        "detections": _window_sum(series["count"].astype(np.float64), starts, ends),
+    }
+    for key, values in series.items():
+        if key in ("frame", "count"):
+            continue
+        valid = np.isfinite(values)
+        total = _window_sum(np.where(valid, values, 0.0), starts, ends)
+        n = _window_sum(valid.astype(np.float64), starts, ends)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            windows[key] = np.where(n > 0, total / n, np.nan)
+    return windows
+
+
+def _window_sum(values, starts, ends):
+    prefix = np.r_[0.0, np.cumsum(values)]
+    return prefix[ends] - prefix[starts]
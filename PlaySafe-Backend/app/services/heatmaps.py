@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+
+from app.config import HEATMAP_PATH, HEATMAP_GRID_ROWS, HEATMAP_GRID_COLS, HEATMAP_COMPACT_EVERY
+
+# Fixed-resolution occupancy grids filled while the video is being decoded:
+# a dense grid per team and sparse (cell, count) pairs per track id, since
+# the tracker creates far more ids than there are players. Player hits are
+# buffered as track * cells + cell keys and merged with np.unique every
+# HEATMAP_COMPACT_EVERY hits, so memory follows the number of distinct
+# (track, cell) pairs. No position lists are kept and serving a heatmap never
+# needs the video again.
+
+
+def new_heatmaps(width, height, rows=HEATMAP_GRID_ROWS, cols=HEATMAP_GRID_COLS):
+    return {
+        "width": width,
+        "height": height,
+        "rows": rows,
+        "cols": cols,
+        "teams": {},
+        "track_index": {},
+        "keys": np.zeros(0, dtype=np.int64),
+        "counts": np.zeros(0, dtype=np.int64),
+        "pending": [],
+        "pending_size": 0,
+    }
+
+
+def _bin_index(heatmaps, centers):
+    points = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    col = (points[:, 0] * heatmaps["cols"] / heatmaps["width"]).astype(np.int64)
+    row = (points[:, 1] * heatmaps["rows"] / heatmaps["height"]).astype(np.int64)
+    col = np.clip(col, 0, heatmaps["cols"] - 1)
+    row = np.clip(row, 0, heatmaps["rows"] - 1)
+    return row * heatmaps["cols"] + col
+
+
+def _compact(heatmaps):
+    if not heatmaps["pending"]:
+        return
+    pending = np.concatenate(heatmaps["pending"])
+    keys, inverse = np.unique(np.concatenate([heatmaps["keys"], pending]), return_inverse=True)
+    weights = np.concatenate([heatmaps["counts"], np.ones(len(pending), dtype=np.int64)])
+    heatmaps["keys"] = keys
+    heatmaps["counts"] = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+    heatmaps["pending"] = []
+    heatmaps["pending_size"] = 0
+
+
+def accumulate_heatmaps(heatmaps, team, centers, track_ids):
+    if not centers:
+        return
+    size = heatmaps["rows"] * heatmaps["cols"]
+    cells = _bin_index(heatmaps, centers)
+    grid = heatmaps["teams"].get(team)
+    if grid is None:
+        grid = heatmaps["teams"][team] = np.zeros(size, dtype=np.uint32)
+    np.add.at(grid, cells, 1)
+
+    index = heatmaps["track_index"]
+    tracks = np.fromiter(
+        (index.setdefault(t, len(index)) for t in track_ids), dtype=np.int64, count=len(cells)
+    )
+    heatmaps["pending"].append(tracks * size + cells)
+    heatmaps["pending_size"] += len(cells)
+    if heatmaps["pending_size"] >= HEATMAP_COMPACT_EVERY:
+        _compact(heatmaps)
+
+
+def _heatmap_file(match_id):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(match_id))
+    return os.path.join(HEATMAP_PATH, safe + ".npz")
+
+
+def save_heatmaps(match_id, heatmaps):
+    os.makedirs(HEATMAP_PATH, exist_ok=True)
+    shape = (heatmaps["rows"], heatmaps["cols"])
+    size = shape[0] * shape[1]
+    _compact(heatmaps)
+
+    arrays = {
+        "frame_size": np.array([heatmaps["width"], heatmaps["height"]]),
+        "grid_shape": np.array(shape),
+    }
+    for team, grid in heatmaps["teams"].items():
+        arrays[f"team__{team}"] = grid.reshape(shape)
+
+    # keys are sorted, so each track's cells are one contiguous run.
+    keys = heatmaps["keys"]
+    tracks = keys // size
+    bounds = np.searchsorted(tracks, np.arange(len(heatmaps["track_index"]) + 1))
+    for track_id, i in heatmaps["track_index"].items():
+        lo, hi = bounds[i], bounds[i + 1]
+        arrays[f"player__{track_id}"] = np.stack(
+            [keys[lo:hi] - i * size, heatmaps["counts"][lo:hi]]
+        ).astype(np.uint32)
+
+    path = _heatmap_file(match_id)
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _downsample(grid, factor):
+    # Sum-pools factor x factor blocks; edge blocks are zero padded.
+    if factor <= 1:
+        return grid
+    rows, cols = grid.shape
+    pad_r = -rows % factor
+    pad_c = -cols % factor
+    padded = np.pad(grid, ((0, pad_r), (0, pad_c)))
+    return padded.reshape(
+        padded.shape[0] // factor, factor, padded.shape[1] // factor, factor
+    ).sum(axis=(1, 3))
+
+
+def load_heatmap(match_id, team=None, player_id=None, downsample=1):
+    path = _heatmap_file(match_id)
+    if not os.path.exists(path):
+        return None
+
+    # np.load reads npz members lazily, so only the requested grid is loaded.
+    with np.load(path) as data:
+        player_ids = sorted(key[len("player__"):] for key in data.files if key.startswith("player__"))
+        teams = sorted(key[len("team__"):] for key in data.files if key.startswith("team__"))
+        shape = tuple(data["grid_shape"].tolist())
+        if player_id is not None:
+            if player_id not in player_ids:
+                raise ValueError(f"Unknown player_id '{player_id}'")
+            cells, counts = data[f"player__{player_id}"].astype(np.int64)
+            grid = np.bincount(cells, weights=counts, minlength=shape[0] * shape[1]).reshape(shape)
+        else:
+            team = team or "teamA"
+            if team not in teams:
+                raise ValueError(f"Unknown team '{team}'")
+            grid = data[f"team__{team}"]
+        frame_size = data["frame_size"].tolist()
+
+    grid = _downsample(grid.astype(np.int64), max(1, int(downsample)))
+    total = int(grid.sum())
+    return {
+        "match_id": match_id,
+        "team": None if player_id is not None else team,
+        "player_id": player_id,
+        "frame_size": frame_size,
+        "shape": list(grid.shape),
+        "total": total,
+        "max": int(grid.max()) if grid.size else 0,
+        "counts": grid.tolist(),
+        "teams": teams,
+        "player_ids": player_ids,
+    }
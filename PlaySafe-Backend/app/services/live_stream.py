@@ -0,0 +1,379 @@
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlsplit
+
+import cv2
+
+from app.config import (
+    LIVE_LATENCY_BUDGET_MS,
+    LIVE_WINDOW_S,
+    LIVE_EMIT_INTERVAL_S,
+    LIVE_POSE_TIER,
+    LIVE_IDLE_TIMEOUT_S,
+    LIVE_RECONNECT_INTERVAL_S,
+    LIVE_MAX_SESSIONS,
+    LIVE_LOCAL_DIR,
+    LIVE_SCHEMES,
+    LIVE_ALLOWED_SOURCES,
+    POSE_MODEL_TIERS,
+)
+from app.services.feature_engineer import compute_formation_metrics
+from app.services.pose_extractor import extract_pose, get_landmarker, compute_joint_metrics, tier_ms_per_frame
+from app.services.video_processor import (
+    detect_players_by_color,
+    extract_centroids,
+    _update_tracks,
+    _compute_player_metrics,
+)
+from app.utils.metrics import observe, inc
+
+# Live stream mode. A session reads a continuous source (an allowlisted stream
+# URL, or a growing file or named pipe under LIVE_LOCAL_DIR) on a capture thread
+# that keeps only the newest frame: when the processor falls behind, the frame
+# waiting in the slot is overwritten and counted as dropped, so nothing ever
+# queues. The processing thread runs detection, tracking and (optionally)
+# pose on that frame, drops it if it is already older than the latency budget,
+# and skips pose when the tier's measured cost would push the frame past the
+# budget. Every LIVE_EMIT_INTERVAL_S it publishes rolling metrics over the
+# last window_s seconds of the stream.
+
+LATENCY_SAMPLES = 500
+
+_lock = threading.Lock()
+_sessions = {}
+
+
+def _allowed_url(parts, entry):
+    # entry is a bare host ("cam1.local") or a URL prefix; prefixes must match
+    # scheme, host and port exactly and the path by prefix, so that
+    # "rtsp://cam1.local.evil.net" or "rtsp://cam1.local@evil.net" do not
+    # pass for "rtsp://cam1.local".
+    if "://" not in entry:
+        return parts.hostname == entry.lower()
+    allowed = urlsplit(entry)
+    return (
+        parts.scheme.lower() == allowed.scheme.lower()
+        and parts.hostname == allowed.hostname
+        and (allowed.port is None or parts.port == allowed.port)
+        and parts.path.startswith(allowed.path)
+    )
+
+
+def resolve_source(source):
+    # Returns (capture source, is_local). The server opens whatever it is
+    # given, so stream URLs are limited to LIVE_SCHEMES and
+    # LIVE_ALLOWED_SOURCES, and local sources to LIVE_LOCAL_DIR.
+    if "://" in source:
+        try:
+            parts = urlsplit(source)
+            parts.port  # raises on a malformed port
+        except ValueError:
+            raise ValueError(f"Invalid live source URL '{source}'")
+        if parts.scheme.lower() not in LIVE_SCHEMES:
+            raise ValueError(f"Live sources with scheme '{parts.scheme}' are not enabled")
+        if not parts.hostname or not any(_allowed_url(parts, entry) for entry in LIVE_ALLOWED_SOURCES):
+            raise ValueError(f"Live source '{parts.hostname}' is not in LIVE_ALLOWED_SOURCES")
+        return source, False
+    root = os.path.abspath(LIVE_LOCAL_DIR)
+    path = os.path.abspath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Local live sources must be under {LIVE_LOCAL_DIR}")
+    if not os.path.exists(path):
+        raise ValueError(f"Live source '{source}' not found")
+    return path, True
+
+
+def start_session(source, latency_budget_ms=None, pose=False, tier=None, window_s=None, session_id=None):
+    # Returns None when LIVE_MAX_SESSIONS sessions are already running.
+    tier = tier or LIVE_POSE_TIER
+    if pose and tier not in POSE_MODEL_TIERS:
+        raise ValueError(f"Unknown pose quality '{tier}'")
+    capture_source, local = resolve_source(source)
+    session = {
+        "id": session_id or uuid.uuid4().hex,
+        "source": capture_source,
+        "local": local,
+        "budget_s": (latency_budget_ms or LIVE_LATENCY_BUDGET_MS) / 1000.0,
+        "window_s": window_s or LIVE_WINDOW_S,
+        "pose": bool(pose) and get_landmarker(tier) is not None,
+        "tier": tier,
+        "started_at": time.time(),
+        "fps": None,
+        "frame_size": None,
+        "stop": threading.Event(),
+        "cond": threading.Condition(),
+        "slot": None,
+        "capture_done": False,
+        "ended": False,
+        "error": None,
+        "captured": 0,
+        "processed": 0,
+        "dropped": 0,
+        "pose_frames": 0,
+        "pose_skipped": 0,
+        "over_budget": 0,
+        "latencies": deque(maxlen=LATENCY_SAMPLES),
+        "metrics": None,
+        "version": 0,
+    }
+    with _lock:
+        if len(_sessions) >= LIVE_MAX_SESSIONS:
+            return None
+        _sessions[session["id"]] = session
+    inc("playsafe_live_sessions_total")
+    for target, name in ((_capture, "capture"), (_process, "process")):
+        threading.Thread(target=target, args=(session,), name=f"live-{name}-{session['id'][:8]}", daemon=True).start()
+    return session
+
+
+def stop_session(session):
+    session["stop"].set()
+    with session["cond"]:
+        session["cond"].notify_all()
+
+
+def live_sessions():
+    with _lock:
+        sessions = list(_sessions.values())
+    return [
+        {
+            "session_id": s["id"],
+            "started_at": s["started_at"],
+            "latency_budget_ms": s["budget_s"] * 1000.0,
+            "pose": s["pose"],
+            "frames": _frame_counts(s),
+        }
+        for s in sessions
+    ]
+
+
+def latest_update(session):
+    # (version, metrics); the version changes whenever new metrics are
+    # published.
+    with session["cond"]:
+        return session["version"], session["metrics"]
+
+
+def _open(session, position):
+    cap = cv2.VideoCapture(session["source"])
+    # Keep the backend's own buffer short; this thread drains it continuously.
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    if position and session["local"] and cap.isOpened():
+        # Reopened growing file: carry on after the frames already read.
+        cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+    return cap
+
+
+def _capture(session):
+    cap = _open(session, 0)
+    index = 0
+    idle_since = None
+    paced_from = None
+    try:
+        while not session["stop"].is_set():
+            ret, frame = cap.read() if cap.isOpened() else (False, None)
+            if not ret:
+                # End of what has been written so far, or a dropped stream:
+                # wait and reopen where we left off.
+                now = time.monotonic()
+                idle_since = idle_since or now
+                if now - idle_since > LIVE_IDLE_TIMEOUT_S:
+                    break
+                cap.release()
+                session["stop"].wait(LIVE_RECONNECT_INTERVAL_S)
+                cap = _open(session, index)
+                continue
+            idle_since = None
+            index += 1
+
+            if session["fps"] is None:
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                if not fps or fps <= 1 or fps > 240:
+                    fps = 30.0
+                height, width = frame.shape[:2]
+                session["fps"] = fps
+                session["frame_size"] = (width, height)
+            if session["local"]:
+                # Replay local sources no faster than real time; frames that
+                # are already due (a writer ahead of us) are read immediately.
+                if paced_from is None:
+                    paced_from = time.monotonic()
+                delay = paced_from + (index - 1) / session["fps"] - time.monotonic()
+                if delay > 0:
+                    session["stop"].wait(delay)
+
+            with session["cond"]:
+                session["captured"] += 1
+                if session["slot"] is not None:
+                    session["dropped"] += 1
+                session["slot"] = (index, time.monotonic(), frame)
+                session["cond"].notify()
+    except Exception as e:
+        session["error"] = str(e)
+    finally:
+        cap.release()
+        with session["cond"]:
+            session["capture_done"] = True
+            session["cond"].notify_all()
+
+
+def _process(session):
+    budget_s = session["budget_s"]
+    teams = {"teamA": "A", "teamB": "B"}
+    tracks = {team: [] for team in teams}
+    next_ids = {team: 1 for team in teams}
+    positions = {team: deque() for team in teams}
+    landmarks = deque()
+    last_index = 0
+    last_emit = time.monotonic()
+    try:
+        while True:
+            with session["cond"]:
+                while session["slot"] is None and not session["capture_done"] and not session["stop"].is_set():
+                    session["cond"].wait(0.5)
+                if session["slot"] is None or session["stop"].is_set():
+                    break
+                index, captured_at, frame = session["slot"]
+                session["slot"] = None
+
+            started = time.monotonic()
+            if started - captured_at > budget_s:
+                with session["cond"]:
+                    session["dropped"] += 1
+                inc("playsafe_live_frames_total", outcome="dropped")
+                continue
+
+            fps = session["fps"]
+            width, height = session["frame_size"]
+            # Dropped frames leave gaps; let a track reach further across them.
+            gap = min(index - last_index, 5) if last_index else 1
+            max_distance = max(width, height) * 0.08 * gap
+            last_index = index
+
+            maskA, maskB = detect_players_by_color(frame)
+            for team, mask in (("teamA", maskA), ("teamB", maskB)):
+                centers = extract_centroids(mask)
+                next_ids[team], _ = _update_tracks(
+                    tracks[team], centers, index, teams[team], next_ids[team], max_distance
+                )
+                positions[team].extend((index, x, y) for x, y in centers)
+
+            if session["pose"]:
+                elapsed = time.monotonic() - captured_at
+                if elapsed + tier_ms_per_frame(session["tier"]) / 1000.0 <= budget_s:
+                    pose = extract_pose(frame, session["tier"])
+                    session["pose_frames"] += 1
+                    if pose:
+                        landmarks.append((index, pose))
+                else:
+                    session["pose_skipped"] += 1
+
+            latency = time.monotonic() - captured_at
+            observe("live_frame_latency", latency)
+            inc("playsafe_live_frames_total", outcome="processed")
+            with session["cond"]:
+                session["processed"] += 1
+                session["latencies"].append(latency)
+                if latency > budget_s:
+                    session["over_budget"] += 1
+
+            _prune(index - int(session["window_s"] * fps), tracks, positions, landmarks)
+            if time.monotonic() - last_emit >= LIVE_EMIT_INTERVAL_S:
+                _publish(session, index, tracks, positions, landmarks)
+                last_emit = time.monotonic()
+    except Exception as e:
+        session["error"] = str(e)
+    finally:
+        session["stop"].set()
+        if session["fps"] is not None:
+            _publish(session, last_index, tracks, positions, landmarks)
+        with session["cond"]:
+            session["ended"] = True
+            session["version"] += 1
+        with _lock:
+            _sessions.pop(session["id"], None)
+
+
+def _prune(first_index, tracks, positions, landmarks):
+    for team in tracks:
+        kept = []
+        for track in tracks[team]:
+            pts = track["positions"]
+            if pts[-1][0] < first_index:
+                continue
+            if pts[0][0] < first_index:
+                track["positions"] = [p for p in pts if p[0] >= first_index]
+            kept.append(track)
+        tracks[team][:] = kept
+        while positions[team] and positions[team][0][0] < first_index:
+            positions[team].popleft()
+    while landmarks and landmarks[0][0] < first_index:
+        landmarks.popleft()
+
+
+def _frame_counts(session):
+    return {
+        "captured": session["captured"],
+        "processed": session["processed"],
+        "dropped": session["dropped"],
+        "pose": session["pose_frames"],
+        "pose_skipped": session["pose_skipped"],
+    }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)]
+
+
+def _publish(session, index, tracks, positions, landmarks):
+    fps = session["fps"]
+    width, height = session["frame_size"]
+    metrics = {
+        "session_id": session["id"],
+        "frame": index,
+        "stream_time_s": index / fps,
+        "window_s": session["window_s"],
+        "formation": {
+            team: compute_formation_metrics([(x, y) for _, x, y in positions[team]]) for team in positions
+        },
+        "player_metrics": {
+            team: _compute_player_metrics(tracks[team], fps, width, height) for team in tracks
+        },
+    }
+    if session["pose"]:
+        metrics["joint_metrics"] = _window_joint_metrics(landmarks, fps)
+
+    with session["cond"]:
+        latencies = sorted(session["latencies"])
+        metrics["frames"] = _frame_counts(session)
+        metrics["latency"] = {
+            "budget_ms": session["budget_s"] * 1000.0,
+            "p50_ms": _percentile(latencies, 0.5) * 1000.0,
+            "p95_ms": _percentile(latencies, 0.95) * 1000.0,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000.0,
+            "over_budget": session["over_budget"],
+        }
+        metrics["published_at"] = time.time()
+        session["metrics"] = metrics
+        session["version"] += 1
+
+
+def _window_joint_metrics(landmarks, fps):
+    if len(landmarks) < 2:
+        return None
+    frames = [index for index, _ in landmarks]
+    metrics = compute_joint_metrics([lm for _, lm in landmarks], None, frames)
+    # Speeds are per pose sample; samples are irregular once frames are
+    # dropped or pose is skipped.
+    sample_rate = fps * (len(frames) - 1) / float(frames[-1] - frames[0])
+    metrics["relative_motion_intensity"] *= sample_rate
+    metrics["max_screen_speed"] *= sample_rate
+    metrics["avg_screen_speed"] *= sample_rate
+    metrics["fps_used"] = fps
+    return metrics
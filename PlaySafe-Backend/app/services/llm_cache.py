@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from app.config import (
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_S,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_BUCKETS,
+    LLM_CACHE_DEFAULT_SIG_DIGITS,
+)
+
+_conn = None
+_lock = threading.Lock()
+_inflight = {}
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "expired": 0,
+    "evictions": 0,
+    "upstream_errors": 0,
+}
+
+
+def _quantize_value(key, value, width=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    width = width or LLM_CACHE_BUCKETS.get(key)
+    if width:
+        return round(round(value / width) * width, 6)
+    if isinstance(value, int) or value == 0:
+        return value
+    digits = LLM_CACHE_DEFAULT_SIG_DIGITS - int(math.floor(math.log10(abs(value)))) - 1
+    return round(value, digits)
+
+
+def quantize_metrics(data, key=None):
+    # Returns a canonical copy (sorted keys, bucketed numbers) so that nearly
+    # identical metrics render to the same prompt text.
+    if isinstance(data, dict):
+        return {k: quantize_metrics(data[k], k) for k in sorted(data)}
+    if isinstance(data, (list, tuple)):
+        return [quantize_metrics(v, key) for v in data]
+    return _quantize_value(key, data)
+
+
+def quantize_fixed(data, width):
+    # Same canonical copy, but every number shares one bucket width whatever
+    # its field name (for z-scores and deltas, which reuse the metric names).
+    if isinstance(data, dict):
+        return {k: quantize_fixed(data[k], width) for k in sorted(data)}
+    if isinstance(data, (list, tuple)):
+        return [quantize_fixed(v, width) for v in data]
+    return _quantize_value(None, data, width)
+
+
+def cache_key(payload):
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        directory = os.path.dirname(LLM_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _conn = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+    return _conn
+
+
+def cache_get(key):
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute(
+            "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if now - created_at > LLM_CACHE_TTL_S:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            _stats["expired"] += 1
+            return None
+        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+    return json.loads(value)
+
+
+def cache_put(key, value):
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now),
+        )
+        count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - LLM_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            _stats["evictions"] += overflow
+
+
+def cache_lookup(key):
+    cached = cache_get(key)
+    _stats["hits" if cached is not None else "misses"] += 1
+    return cached
+
+
+class LeaderCancelled(Exception):
+    # Set on the shared future when the request that was fetching goes away;
+    # a follower then takes over the fetch.
+    pass
+
+
+async def get_or_fetch(key, fetch):
+    # SQLite reads and writes run off the event loop. There is no await
+    # between the _inflight check and registering as leader, so concurrent
+    # misses for one key still coalesce onto a single fetch.
+    cached = await asyncio.to_thread(cache_get, key)
+    if cached is not None:
+        _stats["hits"] += 1
+        return cached
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        _stats["coalesced"] += 1
+        try:
+            return await asyncio.shield(pending)
+        except LeaderCancelled:
+            return await get_or_fetch(key, fetch)
+
+    _stats["misses"] += 1
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await fetch()
+        if result is None:
+            _stats["upstream_errors"] += 1
+        future.set_result(result)
+        if result is not None:
+            # Requests arriving during the write still find the finished
+            # future in _inflight.
+            await asyncio.to_thread(cache_put, key, result)
+    except asyncio.CancelledError:
+        if not future.done():
+            future.set_exception(LeaderCancelled(key))
+            # Mark retrieved so waiter-less failures are not logged as unhandled.
+            future.exception()
+        raise
+    except Exception as e:
+        if not future.done():
+            _stats["upstream_errors"] += 1
+            future.set_exception(e)
+            future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+    return result
+
+
+def cache_stats():
+    with _lock:
+        size = _get_conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+    lookups = _stats["hits"] + _stats["misses"] + _stats["coalesced"]
+    return {
+        **_stats,
+        "size": size,
+        "max_entries": LLM_CACHE_MAX_ENTRIES,
+        "ttl_s": LLM_CACHE_TTL_S,
+        "inflight": len(_inflight),
+        "hit_rate": (_stats["hits"] + _stats["coalesced"]) / lookups if lookups else 0.0,
+        "miss_rate": _stats["misses"] / lookups if lookups else 0.0,
+    }
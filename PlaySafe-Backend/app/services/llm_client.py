@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import random
+
+import httpx
+
+from app.config import (
+    LLM_BASE_URL,
+    LLM_TIMEOUT_S,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_S,
+    LLM_BACKOFF_MAX_S,
+)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_loop = None
+_semaphore = None
+
+
+def get_client():
+    # One pooled keep-alive client per event loop; the batch CLI and tests may
+    # run several loops over the life of the process.
+    global _client, _client_loop, _semaphore
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            base_url=LLM_BASE_URL,
+            timeout=httpx.Timeout(LLM_TIMEOUT_S, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+        )
+        _client_loop = loop
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _client
+
+
+async def close_client():
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+def _backoff_delay(attempt, response=None):
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX_S)
+            except ValueError:
+                pass
+    # Full jitter: spreads retries from many concurrent analyses apart.
+    cap = min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def _auth_headers():
+    api_key = os.getenv("NVIDIA_API_KEY")
+    if not api_key:
+        return None
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+async def post_chat_completion(payload):
+    headers = _auth_headers()
+    if headers is None:
+        return None
+
+    client = get_client()
+    attempt = 0
+    while True:
+        async with _semaphore:
+            try:
+                response = await client.post("/chat/completions", headers=headers, json=payload)
+            except httpx.TransportError:
+                if attempt >= LLM_MAX_RETRIES:
+                    raise
+                response = None
+
+        if response is not None:
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= LLM_MAX_RETRIES:
+                response.raise_for_status()
+                return response.json()
+
+        # Sleep outside the semaphore so backoff does not hold a slot.
+        await asyncio.sleep(_backoff_delay(attempt, response))
+        attempt += 1
+
+
+async def stream_chat_completion(payload):
+    # Yields content deltas from an SSE chat completion. Retries only happen
+    # before the first byte of the body has been handed to the caller.
+    headers = _auth_headers()
+    if headers is None:
+        return
+
+    client = get_client()
+    payload = {**payload, "stream": True}
+    attempt = 0
+    started = False
+    while True:
+        async with _semaphore:
+            try:
+                async with client.stream(
+                    "POST", "/chat/completions", headers=headers, json=payload
+                ) as response:
+                    if response.status_code in RETRY_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                        await response.aread()
+                        retry_response = response
+                    else:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            try:
+                                chunk = json.loads(data)
+                                delta = chunk["choices"][0].get("delta", {}).get("content")
+                            except (ValueError, KeyError, IndexError):
+                                continue
+                            if delta:
+                                started = True
+                                yield delta
+                        return
+            except httpx.TransportError:
+                if started or attempt >= LLM_MAX_RETRIES:
+                    raise
+                retry_response = None
+
+        await asyncio.sleep(_backoff_delay(attempt, retry_response))
+        attempt += 1
@@ -1,6 +1,26 @@
-import os
+import asyncio
 import json
-import requests
+import re
+import time
+
+from app.config import (
+    LLM_MODEL,
+    LLM_BATCH_PROMPT_TOKENS,
+    LLM_BATCH_MAX_PLAYERS,
+    LLM_BATCH_OUTPUT_TOKENS_PER_PLAYER,
+    LLM_CACHE_DEVIATION_BUCKET,
+)
+from app.services.cancellation import JobCancelled, check_cancelled
+from app.services.llm_client import post_chat_completion, stream_chat_completion
+from app.services.llm_cache import (
+    quantize_metrics,
+    quantize_fixed,
+    cache_key,
+    cache_lookup,
+    cache_put,
+    get_or_fetch,
+)
+from app.utils.metrics import stage_timer, observe, inc
 
 
 def build_prompt(metrics_a, metrics_b):
@@ -28,21 +48,27 @@ def build_prompt(metrics_a, metrics_b):
     )
 
 
-def call_nvidia_llm(metrics_a, metrics_b):
-    api_key = os.getenv("NVIDIA_API_KEY")
-    if not api_key:
+async def _complete_json(payload):
+    try:
+        with stage_timer("llm_call"):
+            data = await post_chat_completion(payload)
+        if not data:
+            inc("playsafe_llm_failures_total")
+            return None
+        content = data["choices"][0]["message"]["content"]
+        parsed = json.loads(content)
+        return parsed
+    except Exception:
+        inc("playsafe_llm_failures_total")
         return None
 
-    url = "https://integrate.api.nvidia.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
 
-    prompt = build_prompt(metrics_a, metrics_b)
+async def call_nvidia_llm(metrics_a, metrics_b):
+    check_cancelled()
+    prompt = build_prompt(quantize_metrics(metrics_a), quantize_metrics(metrics_b))
 
     payload = {
-        "model": "meta/llama-3.3-70b-instruct",
+        "model": LLM_MODEL,
         "messages": [
             {"role": "system", "content": "You are a precise football tactics analyst."},
             {"role": "user", "content": prompt},
@@ -51,19 +77,11 @@ def call_nvidia_llm(metrics_a, metrics_b):
         "max_tokens": 512,
     }
 
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=40)
-        response.raise_for_status()
-        data = response.json()
-        content = data["choices"][0]["message"]["content"]
-        parsed = json.loads(content)
-        return parsed
-    except Exception:
-        return None
+    return await get_or_fetch(cache_key(payload), lambda: _complete_json(payload))
 
 
-def enrich_tactics_with_llm(metrics_a, metrics_b):
-    llm_result = call_nvidia_llm(metrics_a, metrics_b)
+async def enrich_tactics_with_llm(metrics_a, metrics_b):
+    llm_result = await call_nvidia_llm(metrics_a, metrics_b)
     if not llm_result:
         return {
             "teamA": {
@@ -92,99 +110,183 @@ def enrich_tactics_with_llm(metrics_a, metrics_b):
     }
 
 
-def build_injury_prompt(metrics_bundle):
+INJURY_INSTRUCTIONS = (
+    "You are an elite sports scientist and football physio. "
+    "You receive joint angle metrics and simple kinematic features extracted from a player's motion using computer vision. "
+    "Angles are in degrees. Higher trunk_angle_mean means more forward lean. "
+    "Knee angles near 180 are extended; lower angles are deeply flexed. "
+    "You also receive:\n"
+    "- Relative motion intensity and screen-space speed metrics (relative_motion_intensity, max_screen_speed, avg_screen_speed)\n"
+    "- Frame-level acceleration and deceleration proxies (frame_level_accel_proxy, frame_level_decel_proxy)\n"
+    "- Number of change-of-direction events (change_of_direction_events)\n"
+    "- Left-right knee asymmetry in degrees (knee_asymmetry)\n"
+    "- Shoulder tilt and hip tilt angles (shoulder_tilt_deg, hip_tilt_deg)\n"
+    "- Shoulder and hip height asymmetry (shoulder_asymmetry, hip_asymmetry)\n"
+    "- Overall body orientation relative to movement direction (body_orientation_deg)\n"
+    "You also receive the player's historical baseline posture metrics and anthropometrics. "
+    "Use how far the current posture and kinematic features deviate from baseline to reason about whether the player is attempting a movement pattern they are not accustomed to. "
+    "If current angles are much more extended or flexed than baseline, or if sprint intensity and deceleration spikes are much higher than normal, treat this as an increased risk period, especially during high-speed actions, decelerations, or cutting. "
+    "Your job is not just to output a risk score, but to give a precise biomechanical explanation tied to: sprint intensity, acceleration/deceleration spikes, joint angle patterns, left-right asymmetry, and change-of-direction stress. "
+    "Explain clearly why the risk is what it is, which joints are overloaded, and when it is likely due to an unusual technique for this player versus a pattern they are well adapted to. "
+)
+
+INJURY_RESULT_SCHEMA = (
+    "{\n"
+    '  "risk_score": 0.0-1.0,\n'
+    '  "risk_level": "low"|"moderate"|"high",\n'
+    '  "primary_risks": ["string", ...],\n'
+    '  "explanations": ["string", ...],\n'
+    '  "recommendations": ["string", ...],\n'
+    '  "zone_risks": [\n'
+    '    {\n'
+    '      "zone": "left_knee|right_knee|left_ankle|right_ankle|left_hip|right_hip|spine|lower_back|left_shoulder|right_shoulder",\n'
+    '      "level": "low"|"medium"|"high",\n'
+    '      "description": "short phrase about the local stress pattern"\n'
+    "    }\n"
+    "  ]\n"
+    "}\n"
+)
+
+
+def build_injury_metrics_block(metrics_bundle):
     current = metrics_bundle.get("current", {})
     baseline = metrics_bundle.get("baseline")
     deltas = metrics_bundle.get("deltas")
     anthropometrics = metrics_bundle.get("anthropometrics")
     sessions = metrics_bundle.get("sessions", 0)
+    z_scores = metrics_bundle.get("z_scores")
 
-    return (
-        "You are an elite sports scientist and football physio. "
-        "You receive joint angle metrics and simple kinematic features extracted from a player's motion using computer vision. "
-        "Angles are in degrees. Higher trunk_angle_mean means more forward lean. "
-        "Knee angles near 180 are extended; lower angles are deeply flexed. "
-        "You also receive:\n"
-        "- Relative motion intensity and screen-space speed metrics (relative_motion_intensity, max_screen_speed, avg_screen_speed)\n"
-        "- Frame-level acceleration and deceleration proxies (frame_level_accel_proxy, frame_level_decel_proxy)\n"
-        "- Number of change-of-direction events (change_of_direction_events)\n"
-        "- Left-right knee asymmetry in degrees (knee_asymmetry)\n"
-        "- Shoulder tilt and hip tilt angles (shoulder_tilt_deg, hip_tilt_deg)\n"
-        "- Shoulder and hip height asymmetry (shoulder_asymmetry, hip_asymmetry)\n"
-        "- Overall body orientation relative to movement direction (body_orientation_deg)\n"
-        "You also receive the player's historical baseline posture metrics and anthropometrics. "
-        "Use how far the current posture and kinematic features deviate from baseline to reason about whether the player is attempting a movement pattern they are not accustomed to. "
-        "If current angles are much more extended or flexed than baseline, or if sprint intensity and deceleration spikes are much higher than normal, treat this as an increased risk period, especially during high-speed actions, decelerations, or cutting. "
-        "Your job is not just to output a risk score, but to give a precise biomechanical explanation tied to: sprint intensity, acceleration/deceleration spikes, joint angle patterns, left-right asymmetry, and change-of-direction stress. "
-        "Explain clearly why the risk is what it is, which joints are overloaded, and when it is likely due to an unusual technique for this player versus a pattern they are well adapted to. "
-        "Respond in strict JSON with this structure only:\n"
-        "{\n"
-        '  "risk_score": 0.0-1.0,\n'
-        '  "risk_level": "low"|"moderate"|"high",\n'
-        '  "primary_risks": ["string", ...],\n'
-        '  "explanations": ["string", ...],\n'
-        '  "recommendations": ["string", ...],\n'
-        '  "zone_risks": [\n'
-        '    {\n'
-        '      "zone": "left_knee|right_knee|left_ankle|right_ankle|left_hip|right_hip|spine|lower_back|left_shoulder|right_shoulder",\n'
-        '      "level": "low"|"medium"|"high",\n'
-        '      "description": "short phrase about the local stress pattern"\n'
-        "    }\n"
-        "  ]\n"
-        "}\n"
+    block = (
         f"Anthropometrics (may be null): {json.dumps(anthropometrics)}\n"
         f"Current metrics: {json.dumps(current)}\n"
         f"Baseline metrics (running mean over sessions): {json.dumps(baseline)}\n"
         f"Current minus baseline deltas: {json.dumps(deltas)}\n"
         f"Number of historical sessions used for baseline: {sessions}\n"
     )
+    if z_scores:
+        block += (
+            "Z-scores of current metrics against this player's session-to-session "
+            f"variability (null when not enough history): {json.dumps(z_scores)}\n"
+        )
+    return block
 
 
-def call_nvidia_injury_llm(metrics_bundle):
-    api_key = os.getenv("NVIDIA_API_KEY")
-    if not api_key:
-        return None
+def quantize_injury_bundle(metrics_bundle):
+    # current/baseline hold raw metrics and use the per-metric buckets;
+    # z_scores/deltas share those names but not their scale.
+    quantized = quantize_metrics(metrics_bundle)
+    for field in ("z_scores", "deltas"):
+        if field in metrics_bundle:
+            quantized[field] = quantize_fixed(metrics_bundle[field], LLM_CACHE_DEVIATION_BUCKET)
+    return quantized
+
+
+def build_injury_prompt(metrics_bundle):
+    return (
+        INJURY_INSTRUCTIONS
+        + "Respond in strict JSON with this structure only:\n"
+        + INJURY_RESULT_SCHEMA
+        + build_injury_metrics_block(metrics_bundle)
+    )
+
+
+def build_squad_injury_prompt(player_blocks):
+    # player_blocks: list of (player_id, metrics block). The fixed instruction
+    # block is sent once per batch instead of once per player.
+    sections = "".join(
+        f"### Player {json.dumps(player_id)}\n{block}" for player_id, block in player_blocks
+    )
+    return (
+        INJURY_INSTRUCTIONS
+        + f"You will analyse {len(player_blocks)} players independently; do not mix their data. "
+        + "Respond in strict JSON with this structure only, with one entry per player id:\n"
+        + '{\n  "players": {\n    "<player_id>": '
+        + INJURY_RESULT_SCHEMA.replace("\n", "\n    ").rstrip()
+        + "\n  }\n}\n"
+        + sections
+    )
+
+
+def estimate_tokens(text):
+    # Rough English/JSON average; good enough for splitting batches.
+    return len(text) // 4 + 1
+
+
+def split_injury_batches(player_blocks):
+    fixed_tokens = estimate_tokens(build_squad_injury_prompt([]))
+    batches = []
+    current = []
+    current_tokens = fixed_tokens
+    for player_id, block in player_blocks:
+        block_tokens = estimate_tokens(block) + 8
+        if current and (
+            current_tokens + block_tokens > LLM_BATCH_PROMPT_TOKENS
+            or len(current) >= LLM_BATCH_MAX_PLAYERS
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = fixed_tokens
+        current.append((player_id, block))
+        current_tokens += block_tokens
+    if current:
+        batches.append(current)
+    return batches
 
-    url = "https://integrate.api.nvidia.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
+
+def _injury_payload(metrics_bundle):
+    prompt = build_injury_prompt(quantize_injury_bundle(metrics_bundle))
+
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a precise football injury risk analyst."},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.15,
+        "max_tokens": 700,
     }
 
-    prompt = build_injury_prompt(metrics_bundle)
+
+async def call_nvidia_injury_llm(metrics_bundle):
+    check_cancelled()
+    payload = _injury_payload(metrics_bundle)
+    return await get_or_fetch(cache_key(payload), lambda: _complete_json(payload))
+
+
+async def call_nvidia_squad_injury_llm(player_blocks):
+    check_cancelled()
+    prompt = build_squad_injury_prompt(player_blocks)
 
     payload = {
-        "model": "meta/llama-3.3-70b-instruct",
+        "model": LLM_MODEL,
         "messages": [
             {"role": "system", "content": "You are a precise football injury risk analyst."},
             {"role": "user", "content": prompt},
         ],
         "temperature": 0.15,
-        "max_tokens": 700,
+        "max_tokens": LLM_BATCH_OUTPUT_TOKENS_PER_PLAYER * len(player_blocks),
     }
 
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=40)
-        response.raise_for_status()
-        data = response.json()
-        content = data["choices"][0]["message"]["content"]
-        parsed = json.loads(content)
-        return parsed
-    except Exception:
-        return None
+    result = await get_or_fetch(cache_key(payload), lambda: _complete_json(payload))
+    if not isinstance(result, dict) or not isinstance(result.get("players"), dict):
+        return {}
+    return result["players"]
+
+
+def _empty_injury_result():
+    return {
+        "risk_score": 0.0,
+        "risk_level": "unknown",
+        "primary_risks": [],
+        "explanations": [],
+        "recommendations": [],
+        "zone_risks": [],
+    }
 
 
-def analyze_injury_with_llm(metrics_bundle):
-    llm_result = call_nvidia_injury_llm(metrics_bundle)
+def normalize_injury_result(llm_result):
     if not llm_result:
-        return {
-            "risk_score": 0.0,
-            "risk_level": "unknown",
-            "primary_risks": [],
-            "explanations": [],
-            "recommendations": [],
-            "zone_risks": [],
-        }
+        return _empty_injury_result()
 
     raw_zones = llm_result.get("zone_risks", []) or []
     zone_risks = []
@@ -208,3 +310,156 @@ def analyze_injury_with_llm(metrics_bundle):
         "recommendations": [str(r) for r in llm_result.get("recommendations", [])][:8],
         "zone_risks": zone_risks,
     }
+
+
+async def analyze_injury_with_llm(metrics_bundle):
+    llm_result = await call_nvidia_injury_llm(metrics_bundle)
+    return normalize_injury_result(llm_result)
+
+
+async def analyze_squad_injury_with_llm(bundles):
+    # bundles: {player_id: metrics_bundle}. Returns {player_id: injury analysis}
+    # in the same shape as analyze_injury_with_llm.
+    player_blocks = [
+        (player_id, build_injury_metrics_block(quantize_injury_bundle(bundle)))
+        for player_id, bundle in bundles.items()
+    ]
+    batches = split_injury_batches(player_blocks)
+    batch_results = await asyncio.gather(
+        *[call_nvidia_squad_injury_llm(batch) for batch in batches]
+    )
+
+    results = {}
+    for batch_result in batch_results:
+        for player_id, llm_result in batch_result.items():
+            if player_id in bundles and isinstance(llm_result, dict):
+                try:
+                    results[player_id] = normalize_injury_result(llm_result)
+                except Exception:
+                    continue
+
+    # Players the batched answer dropped or mangled fall back to single calls.
+    missing = [player_id for player_id in bundles if player_id not in results]
+    if missing:
+        singles = await asyncio.gather(
+            *[analyze_injury_with_llm(bundles[player_id]) for player_id in missing]
+        )
+        results.update(zip(missing, singles))
+
+    return results
+
+
+INJURY_LIST_FIELDS = ("primary_risks", "explanations", "recommendations", "zone_risks")
+STREAMED_LIST_FIELDS = ("explanations", "recommendations")
+
+
+def validate_injury_payload(parsed):
+    if not isinstance(parsed, dict):
+        return False
+    score = parsed.get("risk_score")
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        return False
+    if not isinstance(parsed.get("risk_level"), str):
+        return False
+    return all(isinstance(parsed.get(field), list) for field in INJURY_LIST_FIELDS)
+
+
+def _new_list_scan(field):
+    return {
+        "pattern": re.compile(r'"%s"\s*:\s*\[' % field),
+        "search_from": 0,
+        "pos": None,
+        "closed": False,
+    }
+
+
+def _scan_list_items(text, scan):
+    # Returns the string items of a JSON array that completed since the last
+    # call, from a completion that is still streaming. scan keeps the parse
+    # offset, so each call only looks at text that arrived since.
+    if scan["closed"]:
+        return []
+    if scan["pos"] is None:
+        match = scan["pattern"].search(text, scan["search_from"])
+        if not match:
+            # The key may be split across deltas: rescan a short tail.
+            scan["search_from"] = max(0, len(text) - 64)
+            return []
+        scan["pos"] = match.end()
+
+    decoder = json.JSONDecoder()
+    items = []
+    pos = scan["pos"]
+    while True:
+        while pos < len(text) and text[pos] in " \r\n\t,":
+            pos += 1
+        if pos >= len(text):
+            break
+        if text[pos] == "]":
+            scan["closed"] = True
+            break
+        try:
+            value, end = decoder.raw_decode(text, pos)
+        except ValueError:
+            # Item still arriving; retry from here on the next delta.
+            break
+        if not isinstance(value, str):
+            scan["closed"] = True
+            break
+        items.append(value)
+        pos = end
+    scan["pos"] = pos
+    return items
+
+
+async def stream_injury_analysis(metrics_bundle):
+    # Yields {"type": "token"|"item"|"result", ...} events. Explanation and
+    # recommendation items are forwarded as soon as each string closes; the
+    # final result is only accepted if the full completion validates.
+    payload = _injury_payload(metrics_bundle)
+    key = cache_key(payload)
+
+    check_cancelled()
+    cached = await asyncio.to_thread(cache_lookup, key)
+    if cached is not None:
+        yield {"type": "result", "cached": True, "injury_analysis": normalize_injury_result(cached)}
+        return
+
+    content = ""
+    scans = {field: _new_list_scan(field) for field in STREAMED_LIST_FIELDS}
+    sent = {field: 0 for field in STREAMED_LIST_FIELDS}
+    started = time.perf_counter()
+    try:
+        async for delta in stream_chat_completion(payload):
+            if not content:
+                observe("llm_stream_first_token", time.perf_counter() - started)
+            check_cancelled()
+            content += delta
+            yield {"type": "token", "text": delta}
+            for field in STREAMED_LIST_FIELDS:
+                for text in _scan_list_items(content, scans[field]):
+                    if sent[field] < 8:
+                        yield {"type": "item", "field": field, "index": sent[field], "text": text}
+                        sent[field] += 1
+    except JobCancelled:
+        raise
+    except Exception:
+        inc("playsafe_llm_failures_total")
+        yield {"type": "result", "error": "upstream_error", "injury_analysis": _empty_injury_result()}
+        return
+    observe("llm_stream", time.perf_counter() - started)
+
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        parsed = None
+
+    if not validate_injury_payload(parsed):
+        event = {"type": "result", "injury_analysis": _empty_injury_result()}
+        if content:
+            event["error"] = "invalid_llm_payload"
+        yield event
+        return
+
+    await asyncio.to_thread(cache_put, key, parsed)
+    yield {"type": "result", "cached": False, "injury_analysis": normalize_injury_result(parsed)}
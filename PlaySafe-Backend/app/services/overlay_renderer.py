@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+
+# Match overlay renderer. The banner tint, title text and border are identical
+# on every frame, so they are rasterised once per video resolution into small
+# patches. Per frame only the banner rows are dimmed, the border strips and
+# text box are blended in, and the dynamic elements are drawn on top.
+
+BANNER_TITLE = "TactIQ Analysis Overlay"
+BANNER_ALPHA = 0.6
+BORDER_COLOR = (255, 0, 0)
+BORDER_THICKNESS = 4
+TEXT_COLOR = (255, 255, 255)
+TEAM_A_COLOR = (0, 0, 255)
+TEAM_B_COLOR = (255, 0, 0)
+SHAPE_LINE_COLOR = (0, 255, 255)
+
+
+def _border_strips(width, height, banner_height):
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.rectangle(canvas, (0, 0), (width - 1, height - 1), BORDER_COLOR, BORDER_THICKNESS)
+    cv2.rectangle(mask, (0, 0), (width - 1, height - 1), 255, BORDER_THICKNESS)
+    # The border sits under the banner tint, as in the original overlay.
+    if banner_height:
+        canvas[:banner_height] = cv2.convertScaleAbs(canvas[:banner_height], alpha=1 - BANNER_ALPHA)
+
+    edge = int(np.argmin(mask[:, width // 2] > 0)) or height
+    regions = (
+        (slice(0, edge), slice(0, width)),
+        (slice(max(height - edge, edge), height), slice(0, width)),
+        (slice(edge, height - edge), slice(0, edge)),
+        (slice(edge, height - edge), slice(max(width - edge, edge), width)),
+    )
+    strips = []
+    for rows, cols in regions:
+        region_mask = mask[rows, cols] > 0
+        if region_mask.any():
+            strips.append((rows, cols, canvas[rows, cols].copy(), region_mask))
+    return strips
+
+
+def _text_patch(width, banner_height):
+    if banner_height <= 0:
+        return None
+    alpha = np.zeros((banner_height, width), dtype=np.uint8)
+    cv2.putText(
+        alpha,
+        BANNER_TITLE,
+        (20, int((banner_height - 1) * 0.7)),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        1.0,
+        255,
+        2,
+        cv2.LINE_AA,
+    )
+    ys, xs = np.nonzero(alpha)
+    if len(ys) == 0:
+        return None
+    rows = slice(int(ys.min()), int(ys.max()) + 1)
+    cols = slice(int(xs.min()), int(xs.max()) + 1)
+    weight = (alpha[rows, cols].astype(np.float32) / 255.0)[:, :, None]
+    color = np.array(TEXT_COLOR, dtype=np.float32) * weight
+    return rows, cols, 1.0 - weight, color
+
+
+def build_overlay(width, height):
+    # cv2.rectangle fills both corners inclusively, so the original banner
+    # covered rows 0..int(0.1 * height).
+    banner_height = min(int(0.1 * height) + 1, height)
+    return {
+        "size": (width, height),
+        "banner_height": banner_height,
+        "border": _border_strips(width, height, banner_height),
+        "text": _text_patch(width, banner_height),
+    }
+
+
+def apply_static_overlay(frame, overlay):
+    banner_height = overlay["banner_height"]
+    if banner_height:
+        frame[:banner_height] = cv2.convertScaleAbs(frame[:banner_height], alpha=1 - BANNER_ALPHA)
+    for rows, cols, patch, mask in overlay["border"]:
+        np.copyto(frame[rows, cols], patch, where=mask[:, :, None])
+    if overlay["text"] is not None:
+        rows, cols, keep, color = overlay["text"]
+        roi = frame[rows, cols]
+        roi[:] = (roi * keep + color + 0.5).astype(np.uint8)
+    return frame
+
+
+def draw_dynamic(frame, teamA, teamB):
+    for c in teamA:
+        cv2.circle(frame, c, 8, TEAM_A_COLOR, -1)
+
+    for c in teamB:
+        cv2.circle(frame, c, 8, TEAM_B_COLOR, -1)
+
+    if len(teamA) > 1:
+        for i in range(len(teamA) - 1):
+            cv2.line(frame, teamA[i], teamA[i + 1], SHAPE_LINE_COLOR, 2)
+    return frame
+
+
+def render_frame(frame, overlay, teamA, teamB):
+    apply_static_overlay(frame, overlay)
+    return draw_dynamic(frame, teamA, teamB)
@@ -1,8 +1,24 @@
 import math
+import multiprocessing
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 
+from app.config import (
+    POSE_POOL_WORKERS,
+    POSE_MODEL_TIERS,
+    POSE_DEFAULT_TIER,
+    POSE_MIN_SAMPLED_FRAMES,
+    POSE_TIMING_ALPHA,
+)
+from app.services.cancellation import is_cancelled, check_cancelled
+from app.utils.metrics import stage_timer
+
 pose_landmarker = None
+_pose_pool = None
 
 POSE_LH = 23
 POSE_LK = 25
@@ -13,37 +29,177 @@ POSE_RA = 28
 POSE_LS = 11
 POSE_RS = 12
 
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+MAX_POSTURE_FRAMES = 300
+
+# Tiers lightest to heaviest. Landmarkers other than the default tier load on
+# first use; each has a lock because detect() is not safe to call concurrently
+# from the scheduler's lane threads.
+TIER_ORDER = tuple(sorted(POSE_MODEL_TIERS, key=lambda t: POSE_MODEL_TIERS[t]["ms_per_frame"]))
+_MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "models"))
+_landmarkers = {}
+_landmarker_locks = {tier: threading.Lock() for tier in POSE_MODEL_TIERS}
+_load_lock = threading.Lock()
+_tier_ms = {tier: float(config["ms_per_frame"]) for tier, config in POSE_MODEL_TIERS.items()}
+_tier_calls = {tier: 0 for tier in POSE_MODEL_TIERS}
+
+
+def _model_path(tier):
+    return os.path.join(_MODELS_DIR, POSE_MODEL_TIERS[tier]["model"])
+
+
+def _create_landmarker(tier):
+    base_options = mp_python.BaseOptions(model_asset_path=_model_path(tier))
+    pose_options = mp_vision.PoseLandmarkerOptions(
+        base_options=base_options,
+        running_mode=mp_vision.RunningMode.IMAGE,
+    )
+    return mp_vision.PoseLandmarker.create_from_options(pose_options)
+
+
 try:
     import mediapipe as mp
     from mediapipe.tasks import python as mp_python
     from mediapipe.tasks.python import vision as mp_vision
 
-    _THIS_DIR = os.path.dirname(os.path.abspath(__file__))
-    _MODEL_PATH = os.path.join(_THIS_DIR, "..", "..", "models", "pose_landmarker_full.task")
-    _MODEL_PATH = os.path.abspath(_MODEL_PATH)
-
+    _MODEL_PATH = _model_path(POSE_DEFAULT_TIER)
     if os.path.exists(_MODEL_PATH):
-        base_options = mp_python.BaseOptions(model_asset_path=_MODEL_PATH)
-        VisionRunningMode = mp_vision.RunningMode
-        pose_options = mp_vision.PoseLandmarkerOptions(
-            base_options=base_options,
-            running_mode=VisionRunningMode.IMAGE,
-        )
-        pose_landmarker = mp_vision.PoseLandmarker.create_from_options(pose_options)
+        pose_landmarker = _landmarkers[POSE_DEFAULT_TIER] = _create_landmarker(POSE_DEFAULT_TIER)
     else:
         print("Pose model file not found at", _MODEL_PATH)
         pose_landmarker = None
 except Exception as e:
     print("Mediapipe PoseLandmarker init failed:", e)
     pose_landmarker = None
+    mp = None
+
+
+def get_pose_pool():
+    # Worker processes each load their own PoseLandmarker; spawn avoids
+    # forking a process that already holds mediapipe threads.
+    global _pose_pool
+    if _pose_pool is None:
+        _pose_pool = ProcessPoolExecutor(
+            max_workers=POSE_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pose_pool
+
+
+def available_tiers():
+    if mp is None:
+        return []
+    return [t for t in TIER_ORDER if os.path.exists(_model_path(t))]
+
+
+def get_landmarker(tier=None):
+    tier = tier or POSE_DEFAULT_TIER
+    landmarker = _landmarkers.get(tier)
+    if landmarker is None and tier in available_tiers():
+        with _load_lock:
+            landmarker = _landmarkers.get(tier)
+            if landmarker is None:
+                try:
+                    landmarker = _landmarkers[tier] = _create_landmarker(tier)
+                except Exception as e:
+                    print(f"Mediapipe PoseLandmarker init failed for tier {tier}:", e)
+    return landmarker
+
 
+def tier_ms_per_frame(tier=None):
+    return _tier_ms[tier or POSE_DEFAULT_TIER]
 
-def extract_pose(frame):
-    if pose_landmarker is None:
+
+def pose_tiers():
+    available = set(available_tiers())
+    return {
+        "default": POSE_DEFAULT_TIER,
+        "tiers": {
+            tier: {
+                "available": tier in available,
+                "loaded": tier in _landmarkers,
+                "ms_per_frame": round(_tier_ms[tier], 2),
+                "measured_calls": _tier_calls[tier],
+            }
+            for tier in TIER_ORDER
+        },
+    }
+
+
+def pose_window(total_frames):
+    # Frames a posture analysis looks at: the first MAX_POSTURE_FRAMES.
+    return max(1, min(total_frames or MAX_POSTURE_FRAMES, MAX_POSTURE_FRAMES))
+
+
+def select_pose_plan(total_frames, latency_budget_ms=None, quality=None):
+    # Picks the model tier and frame stride for one posture analysis. quality
+    # names a tier outright; latency_budget_ms picks the heaviest installed tier
+    # that can still sample POSE_MIN_SAMPLED_FRAMES of the analysis window
+    # (the first MAX_POSTURE_FRAMES frames) within the budget, thinning frames
+    # to fit. Without either, the default tier reads every frame.
+    # A tier whose model is not installed (named by quality or the default) is
+    # replaced by the nearest installed one and reported as fallback_from, so
+    # the analysis never runs without a landmarker; with no model installed at
+    # all there is nothing to plan and it raises.
+    if quality is not None and quality not in POSE_MODEL_TIERS:
+        raise ValueError(f"Unknown pose quality '{quality}'; choose from {', '.join(TIER_ORDER)}")
+    window = pose_window(total_frames)
+    installed = available_tiers()
+    if not installed:
+        raise RuntimeError(f"No pose model is installed; add a tier's model file under {_MODELS_DIR}")
+
+    tier = quality or POSE_DEFAULT_TIER
+    fallback_from = None
+    if tier not in installed and (quality or latency_budget_ms is None):
+        fallback_from, tier = tier, _nearest_installed(tier, installed)
+        quality = quality and tier
+    samples = window
+    if latency_budget_ms is not None:
+        candidates = [quality] if quality else list(reversed(installed))
+        min_samples = min(window, POSE_MIN_SAMPLED_FRAMES)
+        for tier in candidates:
+            samples = min(window, int(latency_budget_ms / _tier_ms[tier]))
+            if samples >= min_samples:
+                break
+        samples = max(1, samples)
+
+    stride = int(math.ceil(window / float(samples)))
+    samples = int(math.ceil(window / float(stride)))
+    return {
+        "tier": tier,
+        "stride": stride,
+        "frames": samples,
+        "window_frames": window,
+        "ms_per_frame": round(_tier_ms[tier], 2),
+        "estimated_ms": round(samples * _tier_ms[tier], 1),
+        "latency_budget_ms": latency_budget_ms,
+        "fallback_from": fallback_from,
+    }
+
+
+def _nearest_installed(tier, installed):
+    # Closest tier by weight; the lighter one wins a tie.
+    rank = TIER_ORDER.index(tier)
+    return min(installed, key=lambda t: (abs(TIER_ORDER.index(t) - rank), TIER_ORDER.index(t)))
+
+
+def extract_pose(frame, tier=None):
+    tier = tier or POSE_DEFAULT_TIER
+    landmarker = get_landmarker(tier)
+    if landmarker is None:
         return None
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
-    result = pose_landmarker.detect(mp_image)
+    with stage_timer("pose_landmarks"):
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+        with _landmarker_locks[tier]:
+            started = time.perf_counter()
+            result = landmarker.detect(mp_image)
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+    # Host calibration: the first call includes graph warm-up, skip it. Only
+    # calls in this process count; pool workers keep their own figures.
+    if _tier_calls[tier]:
+        _tier_ms[tier] += POSE_TIMING_ALPHA * (elapsed_ms - _tier_ms[tier])
+    _tier_calls[tier] += 1
     if not result or not result.pose_landmarks:
         return None
     landmarks = result.pose_landmarks[0]
@@ -65,7 +221,12 @@ def _angle(a, b, c):
     return math.degrees(math.acos(cos_value))
 
 
-def compute_joint_metrics(landmarks_sequence):
+def compute_joint_metrics(landmarks_sequence, events=None, frame_indices=None):
+    # frame_indices gives the video frame of each landmarks entry (defaults to
+    # its position). When events is a list, decel spikes and change-of-direction
+    # events are appended to it with their frame ranges.
+    if frame_indices is None:
+        frame_indices = list(range(len(landmarks_sequence)))
     left_knee_angles = []
     right_knee_angles = []
     trunk_angles = []
@@ -83,8 +244,9 @@ def compute_joint_metrics(landmarks_sequence):
 
     velocities = []
     centers = []
+    center_frames = []
 
-    for lm in landmarks_sequence:
+    for lm, frame_index in zip(landmarks_sequence, frame_indices):
         if len(lm) <= max(ls, rs, lh, lk, la, rh, rk, ra):
             continue
         left_knee = _angle(lm[lh], lm[lk], lm[la])
@@ -126,6 +288,7 @@ def compute_joint_metrics(landmarks_sequence):
 
         center = hip_mid
         centers.append(center)
+        center_frames.append(frame_index)
 
         if left_knee is not None:
             left_knee_angles.append(left_knee)
@@ -169,6 +332,15 @@ def compute_joint_metrics(landmarks_sequence):
                     accel_spikes += 1
                 if dv < -max_speed * 0.25:
                     decel_spikes += 1
+                    if events is not None:
+                        events.append(
+                            {
+                                "event_type": "decel_spike",
+                                "start_frame": center_frames[i - 1],
+                                "end_frame": center_frames[i + 1],
+                                "peak": -dv,
+                            }
+                        )
 
             first = centers[0]
             last = centers[-1]
@@ -188,6 +360,15 @@ def compute_joint_metrics(landmarks_sequence):
                 angle_deg = math.degrees(math.acos(cos_theta))
                 if angle_deg > 30.0:
                     cod_events += 1
+                    if events is not None:
+                        events.append(
+                            {
+                                "event_type": "change_of_direction",
+                                "start_frame": center_frames[i - 1],
+                                "end_frame": center_frames[i + 1],
+                                "peak": angle_deg,
+                            }
+                        )
 
     shoulder_tilts = []
     hip_tilts = []
@@ -236,8 +417,12 @@ def compute_joint_metrics(landmarks_sequence):
     }
 
 
-def analyze_posture_file(path):
-    if pose_landmarker is None:
+def analyze_posture_file(path, events=None, plan=None):
+    # plan comes from select_pose_plan(); None keeps the default tier on every
+    # frame of the window.
+    tier = plan["tier"] if plan else POSE_DEFAULT_TIER
+    stride = plan["stride"] if plan else 1
+    if get_landmarker(tier) is None:
         return {
             "left_knee_mean": 0.0,
             "left_knee_min": 0.0,
@@ -264,7 +449,7 @@ def analyze_posture_file(path):
             "fps_used": 0.0,
         }
     ext = os.path.splitext(path)[1].lower()
-    if ext in [".jpg", ".jpeg", ".png", ".webp", ".bmp"]:
+    if ext in IMAGE_EXTENSIONS:
         frame = cv2.imread(path)
         if frame is None:
             return {
@@ -292,7 +477,7 @@ def analyze_posture_file(path):
                 "body_orientation_deg": 0.0,
                 "fps_used": 0.0,
             }
-        landmarks = extract_pose(frame)
+        landmarks = extract_pose(frame, tier)
         if not landmarks:
             return {
                 "left_knee_mean": 0.0,
@@ -382,17 +567,27 @@ def analyze_posture_file(path):
         fps = 30.0
 
     landmarks_sequence = []
+    landmark_frames = []
     index = 0
-    max_frames = 300
 
     while True:
-        ret, frame = cap.read()
-        if not ret or index >= max_frames:
+        if is_cancelled():
+            cap.release()
+            check_cancelled()
+        with stage_timer("pose_decode"):
+            if index % stride:
+                # Thinned out by the plan: skip without decoding.
+                ret, frame = cap.grab(), None
+            else:
+                ret, frame = cap.read()
+        if not ret or index >= MAX_POSTURE_FRAMES:
             break
 
-        landmarks = extract_pose(frame)
-        if landmarks:
-            landmarks_sequence.append(landmarks)
+        if frame is not None:
+            landmarks = extract_pose(frame, tier)
+            if landmarks:
+                landmarks_sequence.append(landmarks)
+                landmark_frames.append(index)
 
         index += 1
 
@@ -411,23 +606,29 @@ def analyze_posture_file(path):
             target_indices.append(total_frames - 1)
 
         fallback_landmarks = []
+        fallback_frames = []
         current_index = 0
         targets_set = set(target_indices)
 
         while True:
+            if is_cancelled():
+                cap_fallback.release()
+                check_cancelled()
             ret, frame = cap_fallback.read()
             if not ret:
                 break
             if current_index in targets_set:
-                landmarks = extract_pose(frame)
+                landmarks = extract_pose(frame, tier)
                 if landmarks:
                     fallback_landmarks.append(landmarks)
+                    fallback_frames.append(current_index)
             current_index += 1
 
         cap_fallback.release()
 
         if fallback_landmarks:
             landmarks_sequence = fallback_landmarks
+            landmark_frames = fallback_frames
 
     if not landmarks_sequence:
         return {
@@ -456,7 +657,9 @@ def analyze_posture_file(path):
             "fps_used": fps,
         }
 
-    metrics = compute_joint_metrics(landmarks_sequence)
+    video_events = [] if events is not None else None
+    with stage_timer("joint_metrics"):
+        metrics = compute_joint_metrics(landmarks_sequence, video_events, landmark_frames)
     if not metrics:
         metrics = {
             "left_knee_mean": 0.0,
@@ -483,9 +686,26 @@ def analyze_posture_file(path):
             "body_orientation_deg": 0.0,
         }
 
-    metrics["relative_motion_intensity"] *= fps
-    metrics["max_screen_speed"] *= fps
-    metrics["avg_screen_speed"] *= fps
+    # Speeds are per analysed sample; with a stride each sample spans several
+    # frames.
+    sample_rate = fps / stride
+    metrics["relative_motion_intensity"] *= sample_rate
+    metrics["max_screen_speed"] *= sample_rate
+    metrics["avg_screen_speed"] *= sample_rate
     metrics["fps_used"] = fps
 
+    if events is not None:
+        for event in video_events:
+            if event["event_type"] == "decel_spike":
+                event["peak"] *= sample_rate
+            events.append(event)
+
     return metrics
+
+
+def analyze_posture_events(path, plan=None):
+    # Picklable (metrics, events) variant of analyze_posture_file for the pose
+    # process pool.
+    events = []
+    metrics = analyze_posture_file(path, events, plan)
+    return metrics, events
@@ -0,0 +1,147 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from app.config import PITCH_LENGTH_M, PRESS_RADIUS_M, BALL_SIDE_RADIUS_M
+
+# Opponent-proximity metrics over a whole match. Instead of one tree per
+# frame, every detection is shifted along x by frame * band, where band is
+# wider than the frame plus any query radius. A single KD-tree per team then
+# answers all per-frame queries at once, and neighbours can never come from
+# another frame.
+
+
+def _band(frame_size, radius):
+    # Twice the longest in-frame distance (the diagonal is below width +
+    # height) plus the radius, so a neighbour from another frame is always
+    # further away than any neighbour from the same frame.
+    width, height = frame_size
+    return 2.0 * (width + height + radius) + 1.0
+
+
+def _offset_points(store, band):
+    return np.stack([store["x"] + store["frame"] * band, store["y"]], axis=1)
+
+
+def _per_frame_mean(frames, values, num_frames):
+    valid = np.isfinite(values)
+    total = np.bincount(frames[valid], weights=values[valid], minlength=num_frames + 1)[1:]
+    n = np.bincount(frames[valid], minlength=num_frames + 1)[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, total / n, np.nan)
+
+
+def _pressed_fraction(pairs_opp_idx, opp_frames, num_frames):
+    # Share of the opponent's detections in each frame that have at least one
+    # presser within the press radius.
+    pressed = np.zeros(len(opp_frames), dtype=bool)
+    pressed[pairs_opp_idx] = True
+    hit = np.bincount(opp_frames[pressed], minlength=num_frames + 1)[1:]
+    n = np.bincount(opp_frames, minlength=num_frames + 1)[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, hit / n, np.nan)
+
+
+def compute_proximity_series(store_A, store_B, num_frames, frame_size, press_radius, cluster_radius):
+    frame_A = store_A["frame"]
+    frame_B = store_B["frame"]
+    series = {
+        "frame": np.arange(1, num_frames + 1),
+        "count": np.bincount(frame_A, minlength=num_frames + 1)[1:]
+        + np.bincount(frame_B, minlength=num_frames + 1)[1:],
+    }
+    nan = np.full(num_frames, np.nan)
+    for key in (
+        "nearest_opponent_A",
+        "nearest_opponent_B",
+        "pressing_A",
+        "pressing_B",
+        "pressing_pairs",
+        "ball_side_x",
+        "ball_side_y",
+        "ball_side_A",
+        "ball_side_B",
+    ):
+        series[key] = nan.copy()
+    if len(frame_A) == 0 or len(frame_B) == 0 or num_frames == 0:
+        return series
+
+    band = _band(frame_size, max(press_radius, cluster_radius))
+    pts_A = _offset_points(store_A, band)
+    pts_B = _offset_points(store_B, band)
+    tree_A = cKDTree(pts_A)
+    tree_B = cKDTree(pts_B)
+
+    # Nearest opponent for every detection (inf when the other team has no
+    # detections in that frame).
+    limit = frame_size[0] + frame_size[1] + max(press_radius, cluster_radius)
+    dist_AB, idx_AB = tree_B.query(pts_A, distance_upper_bound=limit)
+    dist_BA, _ = tree_A.query(pts_B, distance_upper_bound=limit)
+    dist_AB = np.where(np.isfinite(dist_AB), dist_AB, np.nan)
+    dist_BA = np.where(np.isfinite(dist_BA), dist_BA, np.nan)
+    series["nearest_opponent_A"] = _per_frame_mean(frame_A, dist_AB, num_frames)
+    series["nearest_opponent_B"] = _per_frame_mean(frame_B, dist_BA, num_frames)
+
+    # Pressing pairs: every A-B pair closer than the press radius.
+    pairs = tree_A.sparse_distance_matrix(tree_B, press_radius, output_type="ndarray")
+    pair_frames = frame_A[pairs["i"]] if len(pairs) else np.zeros(0, dtype=np.int64)
+    series["pressing_pairs"] = np.bincount(pair_frames, minlength=num_frames + 1)[1:].astype(float)
+    series["pressing_A"] = _pressed_fraction(pairs["j"], frame_B, num_frames)
+    series["pressing_B"] = _pressed_fraction(pairs["i"], frame_A, num_frames)
+
+    # Ball-side cluster: no ball is detected, so use the closest A-B contest in
+    # each frame as its proxy and count both teams within cluster_radius.
+    has_opp = np.isfinite(dist_AB)
+    if has_opp.any():
+        cand = np.flatnonzero(has_opp)
+        order = cand[np.lexsort((dist_AB[cand], frame_A[cand]))]
+        first = order[np.r_[True, frame_A[order][1:] != frame_A[order][:-1]]]
+        rows = frame_A[first] - 1
+        centre = (pts_A[first] + pts_B[idx_AB[first]]) / 2.0
+        series["ball_side_x"][rows] = centre[:, 0] - frame_A[first] * band
+        series["ball_side_y"][rows] = centre[:, 1]
+        series["ball_side_A"][rows] = tree_A.query_ball_point(centre, cluster_radius, return_length=True)
+        series["ball_side_B"][rows] = tree_B.query_ball_point(centre, cluster_radius, return_length=True)
+
+    return series
+
+
+def summarize_proximity(series, metres_per_px):
+    def mean(key):
+        values = series[key]
+        values = values[np.isfinite(values)]
+        return float(values.mean()) if len(values) else 0.0
+
+    frames = len(series["frame"])
+    return {
+        "teamA": {
+            "avg_nearest_opponent_m": mean("nearest_opponent_A") * metres_per_px,
+            "pressing_index": mean("pressing_A"),
+            "ball_side_players": mean("ball_side_A"),
+        },
+        "teamB": {
+            "avg_nearest_opponent_m": mean("nearest_opponent_B") * metres_per_px,
+            "pressing_index": mean("pressing_B"),
+            "ball_side_players": mean("ball_side_B"),
+        },
+        "pressing_pairs_per_frame": float(series["pressing_pairs"][np.isfinite(series["pressing_pairs"])].sum() / frames)
+        if frames
+        else 0.0,
+    }
+
+
+def build_match_proximity(video_data):
+    detections = video_data.get("detections")
+    frame_size = video_data.get("frame_size")
+    if not detections or not frame_size or not frame_size[0]:
+        return None, None
+    # Same pixel-to-metre scale as the per-player speed metrics.
+    metres_per_px = PITCH_LENGTH_M / float(frame_size[0])
+    series = compute_proximity_series(
+        detections["teamA"],
+        detections["teamB"],
+        video_data["num_frames"],
+        frame_size,
+        PRESS_RADIUS_M / metres_per_px,
+        BALL_SIDE_RADIUS_M / metres_per_px,
+    )
+    return series, summarize_proximity(series, metres_per_px)
@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import SCHEDULER_WORKERS, SCHEDULER_LANES, SCHEDULER_INTERACTIVE_MAX_S
+from app.services.cancellation import check_cancelled
+from app.utils.metrics import observe
+from app.utils.profiling import run_attributed
+
+# Lane scheduler for the CPU-bound stages. Every stage runs in a lane
+# ("interactive" for quick posture checks, "batch" for match analysis and
+# squad uploads) with its own thread pool, so a quick job never queues behind
+# batch work for a thread. SCHEDULER_WORKERS slots are shared between lanes:
+# a lane may use at most its "workers", and the "reserved" slots of other
+# lanes are held back for them even when idle. When a slot frees up, lanes
+# are served by weighted fair queuing (virtual time advanced by cost/weight)
+# and, within a lane, tenants (players) by the same rule, so one player's
+# backlog cannot starve another's.
+
+_lock = threading.Lock()
+_running_total = 0
+_vclock = 0.0
+
+
+def _new_lane(name, config):
+    return {
+        "workers": config["workers"],
+        "weight": config["weight"],
+        "reserved": config.get("reserved", 0),
+        "running": 0,
+        "queued": 0,
+        "vtime": 0.0,
+        "vclock": 0.0,
+        "tenants": {},
+        "executor": ThreadPoolExecutor(max_workers=config["workers"], thread_name_prefix=f"lane-{name}"),
+    }
+
+
+_lanes = {name: _new_lane(name, config) for name, config in SCHEDULER_LANES.items()}
+
+
+def lane_for(estimate):
+    return "interactive" if estimate["cpu_s"] <= SCHEDULER_INTERACTIVE_MAX_S else "batch"
+
+
+def _can_start(name, lane):
+    if lane["running"] >= lane["workers"]:
+        return False
+    held = sum(
+        max(0, other["reserved"] - other["running"])
+        for other_name, other in _lanes.items()
+        if other_name != name
+    )
+    return _running_total + 1 + held <= SCHEDULER_WORKERS
+
+
+def _grant(lane, tenant, cost):
+    global _running_total, _vclock
+    _running_total += 1
+    lane["running"] += 1
+    lane["vclock"] = tenant["vtime"]
+    tenant["vtime"] += cost
+    _vclock = lane["vtime"]
+    lane["vtime"] += cost / lane["weight"]
+
+
+def _dispatch():
+    while True:
+        ready = [
+            (lane["vtime"], name)
+            for name, lane in _lanes.items()
+            if lane["queued"] and _can_start(name, lane)
+        ]
+        if not ready:
+            return
+        _, name = min(ready)
+        lane = _lanes[name]
+        key, tenant = min(
+            ((k, t) for k, t in lane["tenants"].items() if t["queue"]),
+            key=lambda item: item[1]["vtime"],
+        )
+        waiter, cost = tenant["queue"].popleft()
+        lane["queued"] -= 1
+        if not tenant["queue"]:
+            del lane["tenants"][key]
+        _grant(lane, tenant, cost)
+        waiter.get_loop().call_soon_threadsafe(_wake, waiter, name)
+
+
+def _wake(waiter, name):
+    if waiter.done():
+        # Cancelled between grant and wake-up: hand the slot back.
+        _release(name)
+    else:
+        waiter.set_result(None)
+
+
+def _release(name):
+    global _running_total
+    with _lock:
+        _running_total -= 1
+        _lanes[name]["running"] -= 1
+        _dispatch()
+
+
+async def _acquire(name, tenant_key, cost):
+    with _lock:
+        lane = _lanes[name]
+        if not lane["queued"] and _can_start(name, lane):
+            tenant = {"vtime": lane["vclock"]}
+            _grant(lane, tenant, cost)
+            return
+        tenant = lane["tenants"].get(tenant_key)
+        if tenant is None:
+            # Idle tenants and lanes rejoin at the current virtual time rather
+            # than cashing in credit from while they were away.
+            tenant = lane["tenants"][tenant_key] = {"vtime": lane["vclock"], "queue": deque()}
+        if not lane["queued"]:
+            lane["vtime"] = max(lane["vtime"], _vclock)
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, cost)
+        tenant["queue"].append(entry)
+        lane["queued"] += 1
+    try:
+        await waiter
+    except asyncio.CancelledError:
+        with _lock:
+            if entry in tenant["queue"]:
+                tenant["queue"].remove(entry)
+                lane["queued"] -= 1
+                if not tenant["queue"] and lane["tenants"].get(tenant_key) is tenant:
+                    del lane["tenants"][tenant_key]
+        if waiter.done() and not waiter.cancelled():
+            # Granted, but cancelled before the task resumed.
+            _release(name)
+        raise
+
+
+async def run_in_lane(name, tenant, fn, *args, cost=1.0, executor=None):
+    # Runs fn(*args) in the lane's thread pool once the lane gets a slot, or
+    # in the given executor (e.g. the pose process pool). cost is the job's
+    # estimated seconds and sets its fair-queuing weight.
+    started = time.perf_counter()
+    await _acquire(name, tenant, max(cost, 1e-3))
+    observe(f"queue_wait_{name}", time.perf_counter() - started)
+    try:
+        # A job cancelled while it queued for the slot does not start.
+        check_cancelled()
+        loop = asyncio.get_running_loop()
+        if executor is not None:
+            future = executor.submit(fn, *args)
+            waiter = asyncio.wrap_future(future)
+            try:
+                return await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # Work a worker has already picked up cannot be taken back;
+                # it keeps the slot until it returns (cancelled jobs stop at
+                # their next cancel-file check, see in_pool_job).
+                if not future.cancel():
+                    await asyncio.gather(waiter, return_exceptions=True)
+                raise
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            _lanes[name]["executor"], functools.partial(context.run, run_attributed, fn, *args)
+        )
+    finally:
+        _release(name)
+
+
+def scheduler_status():
+    with _lock:
+        return {
+            "workers": SCHEDULER_WORKERS,
+            "running": _running_total,
+            "lanes": {
+                name: {
+                    "workers": lane["workers"],
+                    "weight": lane["weight"],
+                    "reserved": lane["reserved"],
+                    "running": lane["running"],
+                    "queued": lane["queued"],
+                    "tenants_waiting": len(lane["tenants"]),
+                }
+                for name, lane in _lanes.items()
+            },
+        }
@@ -0,0 +1,149 @@
+import numpy as np
+
+from app.config import (
+    FORMATION_WINDOW_S,
+    FORMATION_STEP_S,
+    FORMATION_MIN_RUN_WINDOWS,
+    PITCH_LENGTH_M,
+)
+from app.services.feature_engineer import compute_formation_series, aggregate_formation_windows
+from app.services.proximity import build_match_proximity
+
+FORMATION_LABELS = ("4-3-3", "4-4-2", "Defensive Block")
+GOAL_PROBABILITIES = np.array([0.68, 0.55, 0.35])
+
+
+def analyze_tactics_batch(width, depth, compactness):
+    # Array version of risk_analyzer.analyze_tactics: same thresholds and
+    # formulas, evaluated for every window in one pass.
+    width = np.asarray(width, dtype=np.float64)
+    depth = np.asarray(depth, dtype=np.float64)
+    compactness = np.asarray(compactness, dtype=np.float64)
+
+    formation_code = np.select(
+        [(width > 600) & (depth > 400), width > 400], [0, 1], default=2
+    )
+
+    tactical_score = np.minimum(compactness / 100000, 1)
+
+    pressing_raw = (width / 800.0 + depth / 800.0) / 2.0
+    pressing_intensity = np.clip(pressing_raw, 0.0, 1.0)
+
+    compact_norm = np.minimum(compactness / 300000.0, 1.0)
+    possession_rate = np.where(
+        compactness == 0,
+        0.5,
+        np.clip(0.3 + 0.4 * (1.0 - compact_norm), 0.0, 0.9),
+    )
+
+    return {
+        "formation_code": formation_code,
+        "goal_probability": GOAL_PROBABILITIES[formation_code],
+        "tactical_score": tactical_score,
+        "pressing_intensity": pressing_intensity,
+        "possession_rate": possession_rate,
+    }
+
+
+def detect_formation_changes(formation_code, min_run=1):
+    # Run-length encodes the per-window formation and reports a change each
+    # time the label differs from the previous run that lasted at least
+    # min_run windows (shorter runs are treated as noise).
+    formation_code = np.asarray(formation_code)
+    if len(formation_code) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    run_starts = np.flatnonzero(np.r_[True, formation_code[1:] != formation_code[:-1]])
+    run_lengths = np.diff(np.r_[run_starts, len(formation_code)])
+    run_labels = formation_code[run_starts]
+
+    kept = run_lengths >= min_run
+    kept[0] = True
+    kept_starts = run_starts[kept]
+    kept_labels = run_labels[kept]
+
+    changed = np.flatnonzero(kept_labels[1:] != kept_labels[:-1]) + 1
+    return kept_starts[changed], kept_labels[changed - 1], kept_labels[changed]
+
+
+def build_team_timeline(windows, fps, min_run=FORMATION_MIN_RUN_WINDOWS, proximity=None):
+    width = np.nan_to_num(windows["width"])
+    depth = np.nan_to_num(windows["depth"])
+    compactness = np.nan_to_num(windows["compactness"])
+    tactics = analyze_tactics_batch(width, depth, compactness)
+
+    start_s = (windows["start_frame"] - 1) / fps
+    end_s = windows["end_frame"] / fps
+    labels = np.array(FORMATION_LABELS, dtype=object)
+
+    change_idx, from_code, to_code = detect_formation_changes(tactics["formation_code"], min_run)
+    events = [
+        {
+            "type": "formation_change",
+            "window": int(i),
+            "time_s": float(start_s[i]),
+            "from": FORMATION_LABELS[f],
+            "to": FORMATION_LABELS[t],
+        }
+        for i, f, t in zip(change_idx, from_code, to_code)
+    ]
+
+    timeline = {
+        "start_s": start_s.tolist(),
+        "end_s": end_s.tolist(),
+        "width": width.tolist(),
+        "depth": depth.tolist(),
+        "compactness": compactness.tolist(),
+        "hull_area": np.nan_to_num(windows["hull_area"]).tolist(),
+        "centroid_x": np.nan_to_num(windows["centroid_x"]).tolist(),
+        "centroid_y": np.nan_to_num(windows["centroid_y"]).tolist(),
+        "def_mid_distance": np.nan_to_num(windows["def_mid_distance"]).tolist(),
+        "mid_att_distance": np.nan_to_num(windows["mid_att_distance"]).tolist(),
+        "formation": labels[tactics["formation_code"]].tolist(),
+        "goal_probability": tactics["goal_probability"].tolist(),
+        "tactical_score": tactics["tactical_score"].tolist(),
+        "pressing_intensity": tactics["pressing_intensity"].tolist(),
+        "possession_rate": tactics["possession_rate"].tolist(),
+        "events": events,
+    }
+    if proximity is not None:
+        timeline.update(proximity)
+    return timeline
+
+
+def _team_proximity_windows(windows, team, metres_per_px):
+    side = team[-1]
+    return {
+        "nearest_opponent_m": (np.nan_to_num(windows[f"nearest_opponent_{side}"]) * metres_per_px).tolist(),
+        "opponents_pressed": np.nan_to_num(windows[f"pressing_{side}"]).tolist(),
+        "pressing_pairs": np.nan_to_num(windows["pressing_pairs"]).tolist(),
+        "ball_side_players": np.nan_to_num(windows[f"ball_side_{side}"]).tolist(),
+    }
+
+
+def build_match_timeline(video_data):
+    detections = video_data.get("detections")
+    timeline = {"window_s": FORMATION_WINDOW_S, "step_s": FORMATION_STEP_S}
+    if not detections:
+        timeline.update({"teamA": None, "teamB": None, "proximity": None})
+        return timeline
+
+    fps = video_data.get("fps") or 30
+    window_frames = max(1, int(round(FORMATION_WINDOW_S * fps)))
+    step_frames = max(1, int(round(FORMATION_STEP_S * fps)))
+
+    proximity_series, proximity_summary = build_match_proximity(video_data)
+    proximity_windows = None
+    if proximity_series is not None:
+        proximity_windows = aggregate_formation_windows(proximity_series, window_frames, step_frames)
+        metres_per_px = PITCH_LENGTH_M / float(video_data["frame_size"][0])
+
+    for team in ("teamA", "teamB"):
+        series = compute_formation_series(detections[team], video_data["num_frames"])
+        windows = aggregate_formation_windows(series, window_frames, step_frames)
+        proximity = None
+        if proximity_windows is not None:
+            proximity = _team_proximity_windows(proximity_windows, team, metres_per_px)
+        timeline[team] = build_team_timeline(windows, fps, proximity=proximity)
+    timeline["proximity"] = proximity_summary
+    return timeline
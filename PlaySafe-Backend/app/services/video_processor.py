@@ -2,8 +2,27 @@ import cv2
 import numpy as np
 import os
 import shutil
-import subprocess
 import math
+import uuid
+
+from app.config import CHECKPOINT_EVERY_FRAMES
+from app.models.event_index import record_events
+from app.services.cancellation import JobCancelled, is_cancelled, check_cancelled, run_cancellable
+from app.services.checkpoint import (
+    FRAME_PATTERN,
+    match_key,
+    frames_dir as checkpoint_frames_dir,
+    claim_checkpoint,
+    release_checkpoint,
+    open_checkpoint,
+    save_checkpoint,
+    restore_tracks,
+    clear_checkpoint,
+)
+from app.services.feature_engineer import build_detection_store
+from app.services.heatmaps import new_heatmaps, accumulate_heatmaps, save_heatmaps
+from app.services.overlay_renderer import build_overlay, render_frame
+from app.utils.metrics import stage_timer, inc
 
 OUTPUT_DIR = os.path.join("static", "processed")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -36,6 +55,7 @@ def extract_centroids(mask):
 
 
 def _update_tracks(tracks, detections, frame_index, prefix, next_id, max_distance):
+    assigned = []
     for x, y in detections:
         best_track = None
         best_dist = None
@@ -47,14 +67,19 @@ def _update_tracks(tracks, detections, frame_index, prefix, next_id, max_distanc
                 best_track = track
         if best_track is not None and best_dist is not None and best_dist <= max_distance:
             best_track["positions"].append((frame_index, x, y))
+            assigned.append(best_track["id"])
         else:
             track_id = f"{prefix}{next_id}"
             next_id += 1
             tracks.append({"id": track_id, "positions": [(frame_index, x, y)]})
-    return next_id
+            assigned.append(track_id)
+    return next_id, assigned
 
 
-def _compute_player_metrics(tracks, fps, width, height):
+def _compute_player_metrics(tracks, fps, width, height, events=None):
+    # When events is a list, each sprint and hard deceleration is also
+    # appended to it with its frame range and peak value (m/s for sprints,
+    # m/s^2 for decelerations).
     metrics = []
     if fps <= 0:
         return metrics
@@ -67,6 +92,7 @@ def _compute_player_metrics(tracks, fps, width, height):
             continue
         total_dist_px = 0.0
         speeds = []
+        durations = []
         prev_frame, prev_x, prev_y = pts[0]
         for frame_index, x, y in pts[1:]:
             dx = x - prev_x
@@ -78,6 +104,7 @@ def _compute_player_metrics(tracks, fps, width, height):
             v = dist / dt
             total_dist_px += dist
             speeds.append(v)
+            durations.append(dt)
             prev_frame, prev_x, prev_y = frame_index, x, y
         if not speeds:
             continue
@@ -87,18 +114,35 @@ def _compute_player_metrics(tracks, fps, width, height):
         avg_speed_mps = total_distance_m / duration_s if duration_s > 0 else 0.0
         sprint_count = 0
         in_sprint = False
+        sprint_start = 0
         hard_decelerations = 0
+        # speeds[i] covers pts[i] -> pts[i + 1].
         for i, v in enumerate(speeds):
             if v > sprint_threshold:
                 if not in_sprint:
                     sprint_count += 1
                     in_sprint = True
+                    sprint_start = i
             else:
+                if in_sprint and events is not None:
+                    events.append(_sprint_event(track["id"], pts, speeds, sprint_start, i, scale))
                 in_sprint = False
             if i > 0:
                 prev_v = speeds[i - 1]
                 if prev_v > sprint_threshold and v < prev_v * 0.55:
                     hard_decelerations += 1
+                    if events is not None:
+                        events.append(
+                            {
+                                "track_id": track["id"],
+                                "event_type": "hard_deceleration",
+                                "start_frame": pts[i - 1][0],
+                                "end_frame": pts[i + 1][0],
+                                "peak": (prev_v - v) * scale / durations[i],
+                            }
+                        )
+        if in_sprint and events is not None:
+            events.append(_sprint_event(track["id"], pts, speeds, sprint_start, len(speeds), scale))
         metrics.append(
             {
                 "id": track["id"],
@@ -113,7 +157,31 @@ def _compute_player_metrics(tracks, fps, width, height):
     return metrics
 
 
-def process_video(video_path):
+def _sprint_event(track_id, pts, speeds, first, stop, scale):
+    return {
+        "track_id": track_id,
+        "event_type": "sprint",
+        "start_frame": pts[first][0],
+        "end_frame": pts[stop][0],
+        "peak": max(speeds[first:stop]) * scale,
+    }
+
+
+def _restore_team(columns, prefix, team, store, heatmaps):
+    frames = columns["frame"].tolist()
+    xs = columns["x"].tolist()
+    ys = columns["y"].tolist()
+    tids = columns["tid"].tolist()
+    store[0].extend(frames)
+    store[1].extend(xs)
+    store[2].extend(ys)
+    store[3].extend(tids)
+    positions = list(zip(xs, ys))
+    accumulate_heatmaps(heatmaps, team, positions, [f"{prefix}{t}" for t in tids])
+    return positions, restore_tracks(columns, prefix)
+
+
+def run_detection(video_path):
     cap = cv2.VideoCapture(video_path)
 
     if not cap.isOpened():
@@ -123,7 +191,8 @@ def process_video(video_path):
             "processed_video": video_path,
         }
 
-    ret, frame = cap.read()
+    with stage_timer("decode"):
+        ret, frame = cap.read()
     if not ret:
         cap.release()
         return {
@@ -132,11 +201,22 @@ def process_video(video_path):
             "processed_video": video_path,
         }
 
-    base_name = os.path.basename(video_path)
-    name_no_ext, _ = os.path.splitext(base_name)
-    frames_dir = os.path.join(OUTPUT_DIR, f"frames_{name_no_ext}")
-    os.makedirs(frames_dir, exist_ok=True)
+    # Checkpoint, rendered frames, heatmaps, events and output are keyed on
+    # the video content rather than the upload name. A run of a video that is
+    # already being processed gets a one-off key and starts from scratch.
+    match_id = match_key(video_path)
+    lock = claim_checkpoint(match_id)
+    if lock is None:
+        match_id = f"{match_id}-{uuid.uuid4().hex[:8]}"
+    try:
+        return _detect_frames(cap, frame, video_path, match_id)
+    finally:
+        cap.release()
+        if lock is not None:
+            release_checkpoint(lock)
+
 
+def _detect_frames(cap, frame, video_path, match_id):
     height, width = frame.shape[:2]
     fps = cap.get(cv2.CAP_PROP_FPS)
     if not fps or fps <= 1 or fps > 240:
@@ -144,74 +224,145 @@ def process_video(video_path):
 
     teamA_positions = []
     teamB_positions = []
+    # frame, x, y, track number per detection
+    store_A = ([], [], [], [])
+    store_B = ([], [], [], [])
     tracks_A = []
     tracks_B = []
     next_id_A = 1
     next_id_B = 1
     max_assign_distance = max(width, height) * 0.08
+    heatmaps = new_heatmaps(width, height)
+    overlay = build_overlay(width, height)
 
     frame_count = 0
+    resumed_from = 0
+    ret = True
+
+    # A checkpoint is only reopened when every frame it covers is still
+    # rendered in frames_dir; otherwise this is a fresh run.
+    manifest, restored = open_checkpoint(match_id, video_path)
+    frames_dir = checkpoint_frames_dir(match_id)
+    os.makedirs(frames_dir, exist_ok=True)
+    if restored is not None and manifest["frame_count"] > 0:
+        frame_count = resumed_from = manifest["frame_count"]
+        next_id_A = manifest["next_id"]["teamA"]
+        next_id_B = manifest["next_id"]["teamB"]
+        teamA_positions, tracks_A = _restore_team(restored["teamA"], "A", "teamA", store_A, heatmaps)
+        teamB_positions, tracks_B = _restore_team(restored["teamB"], "B", "teamB", store_B, heatmaps)
+        # Frames up to the checkpoint are already rendered; skip them without
+        # decoding.
+        with stage_timer("resume_seek"):
+            for _ in range(frame_count - 1):
+                cap.grab()
+            ret, frame = cap.read()
 
     while ret:
+        if is_cancelled():
+            # Drop everything this run wrote: the resume checkpoint and the
+            # rendered frames under it.
+            cap.release()
+            clear_checkpoint(match_id)
+            check_cancelled()
         frame_count += 1
 
-        maskA, maskB = detect_players_by_color(frame)
+        with stage_timer("detect"):
+            maskA, maskB = detect_players_by_color(frame)
 
-        teamA = extract_centroids(maskA)
-        teamB = extract_centroids(maskB)
+            teamA = extract_centroids(maskA)
+            teamB = extract_centroids(maskB)
         teamA_positions.extend(teamA)
         teamB_positions.extend(teamB)
 
-        next_id_A = _update_tracks(tracks_A, teamA, frame_count, "A", next_id_A, max_assign_distance)
-        next_id_B = _update_tracks(tracks_B, teamB, frame_count, "B", next_id_B, max_assign_distance)
+        with stage_timer("track"):
+            next_id_A, ids_A = _update_tracks(tracks_A, teamA, frame_count, "A", next_id_A, max_assign_distance)
+            next_id_B, ids_B = _update_tracks(tracks_B, teamB, frame_count, "B", next_id_B, max_assign_distance)
+            accumulate_heatmaps(heatmaps, "teamA", teamA, ids_A)
+            accumulate_heatmaps(heatmaps, "teamB", teamB, ids_B)
+            for store, centers, ids in ((store_A, teamA, ids_A), (store_B, teamB, ids_B)):
+                store[0].extend([frame_count] * len(centers))
+                store[1].extend(c[0] for c in centers)
+                store[2].extend(c[1] for c in centers)
+                store[3].extend(int(track_id[1:]) for track_id in ids)
+
+        with stage_timer("render"):
+            render_frame(frame, overlay, teamA, teamB)
+
+        frame_path = os.path.join(frames_dir, FRAME_PATTERN % frame_count)
+        with stage_timer("png_write"):
+            cv2.imwrite(frame_path, frame)
+
+        if CHECKPOINT_EVERY_FRAMES > 0 and frame_count % CHECKPOINT_EVERY_FRAMES == 0:
+            with stage_timer("checkpoint"):
+                save_checkpoint(
+                    match_id,
+                    manifest,
+                    frame_count,
+                    {"teamA": next_id_A, "teamB": next_id_B},
+                    {"teamA": store_A, "teamB": store_B},
+                )
+
+        with stage_timer("decode"):
+            ret, frame = cap.read()
 
-        for c in teamA:
-            cv2.circle(frame, c, 8, (0, 0, 255), -1)
+    cap.release()
+    inc("playsafe_frames_processed_total", frame_count - resumed_from)
 
-        for c in teamB:
-            cv2.circle(frame, c, 8, (255, 0, 0), -1)
+    with stage_timer("save_heatmaps"):
+        save_heatmaps(match_id, heatmaps)
 
-        if len(teamA) > 1:
-            for i in range(len(teamA) - 1):
-                cv2.line(frame, teamA[i], teamA[i + 1], (0, 255, 255), 2)
+    events = []
+    with stage_timer("player_metrics"):
+        player_metrics_A = _compute_player_metrics(tracks_A, fps, width, height, events)
+        player_metrics_B = _compute_player_metrics(tracks_B, fps, width, height, events)
+    with stage_timer("record_events"):
+        record_events(match_id, events, fps, first_frame=1)
 
-        border_color = (255, 0, 0)
-        cv2.rectangle(frame, (0, 0), (width - 1, height - 1), border_color, 4)
+    # The finished frames move out of the checkpoint to a directory of this
+    # run's own, so a later run of the same video cannot touch them before
+    # the encode reads them.
+    encode_dir = os.path.join(OUTPUT_DIR, f"frames_{match_id}_{uuid.uuid4().hex[:8]}")
+    shutil.move(frames_dir, encode_dir)
+    clear_checkpoint(match_id)
 
-        banner_height = int(0.1 * height)
-        overlay = frame.copy()
-        cv2.rectangle(
-            overlay,
-            (0, 0),
-            (width, banner_height),
-            (0, 0, 0),
-            -1,
-        )
-        alpha = 0.6
-        frame = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
-
-        cv2.putText(
-            frame,
-            "TactIQ Analysis Overlay",
-            (20, int(banner_height * 0.7)),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            1.0,
-            (255, 255, 255),
-            2,
-            cv2.LINE_AA,
-        )
+    output_file = "processed_" + match_id + ".mp4"
 
-        frame_path = os.path.join(frames_dir, f"frame_{frame_count:04d}.png")
-        cv2.imwrite(frame_path, frame)
+    return {
+        "teamA_positions": teamA_positions,
+        "teamB_positions": teamB_positions,
+        "player_metrics": {
+            "teamA": player_metrics_A,
+            "teamB": player_metrics_B,
+        },
+        "detections": {
+            "teamA": build_detection_store(*store_A[:3]),
+            "teamB": build_detection_store(*store_B[:3]),
+        },
+        "num_frames": frame_count,
+        "frame_size": (width, height),
+        "match_id": match_id,
+        "heatmap_id": match_id,
+        "event_count": len(events),
+        "video_path": video_path,
+        "frames_dir": encode_dir,
+        "fps": fps,
+        "output_path": os.path.join(OUTPUT_DIR, output_file),
+    }
 
-        ret, frame = cap.read()
 
-    cap.release()
+def encode_processed_video(video_data):
+    # Second half of process_video: turns the rendered frames left by
+    # run_detection into the processed mp4. Safe to run concurrently with
+    # anything that only needs the detection results.
+    frames_dir = video_data.get("frames_dir")
+    if not frames_dir:
+        return video_data["processed_video"]
 
-    output_file = "processed_" + name_no_ext + ".mp4"
-    output_path = os.path.join(OUTPUT_DIR, output_file)
+    video_path = video_data["video_path"]
+    output_path = video_data["output_path"]
+    fps = video_data["fps"]
 
-    input_pattern = os.path.join(frames_dir, "frame_%04d.png")
+    input_pattern = os.path.join(frames_dir, FRAME_PATTERN)
     cmd = [
         "ffmpeg",
         "-y",
@@ -227,8 +378,16 @@ def process_video(video_path):
     ]
 
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        check_cancelled()
+        with stage_timer("ffmpeg_encode"):
+            run_cancellable(cmd)
+    except JobCancelled:
+        shutil.rmtree(frames_dir, ignore_errors=True)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
     except Exception:
+        inc("playsafe_encode_fallbacks_total")
         shutil.copy(video_path, output_path)
 
     if os.path.isdir(frames_dir):
@@ -237,15 +396,11 @@ def process_video(video_path):
     if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
         shutil.copy(video_path, output_path)
 
-    player_metrics_A = _compute_player_metrics(tracks_A, fps, width, height)
-    player_metrics_B = _compute_player_metrics(tracks_B, fps, width, height)
+    video_data["processed_video"] = output_path
+    return output_path
 
-    return {
-        "teamA_positions": teamA_positions,
-        "teamB_positions": teamB_positions,
-        "player_metrics": {
-            "teamA": player_metrics_A,
-            "teamB": player_metrics_B,
-        },
-        "processed_video": output_path,
-    }
+
+def process_video(video_path):
+    video_data = run_detection(video_path)
+    encode_processed_video(video_data)
+    return video_data
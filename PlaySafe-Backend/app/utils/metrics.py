@@ -0,0 +1,138 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process stage timers. Every timed stage feeds a process-wide latency
+# histogram (exported by /metrics in Prometheus text format) and, when the
+# caller opened one with start_breakdown(), a per-request breakdown that the
+# analysis endpoints return with their response. The breakdown dict travels in
+# a ContextVar, so it follows asyncio tasks and asyncio.to_thread workers.
+
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_breakdown = contextvars.ContextVar("stage_breakdown", default=None)
+
+
+def observe(stage, seconds):
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = {
+                "buckets": [0] * (len(STAGE_BUCKETS) + 1),
+                "sum": 0.0,
+                "count": 0,
+            }
+        hist["buckets"][bisect.bisect_left(STAGE_BUCKETS, seconds)] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        entry = breakdown.get(stage)
+        if entry is None:
+            breakdown[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+
+def inc(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def timed_call(fn, *args):
+    # Returns (fn(*args), seconds). For work handed to a lane or the pose
+    # pool: the caller observes the seconds, so queue wait is not counted and
+    # process pool workers (which have no breakdown) are timed too.
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def start_breakdown():
+    breakdown = {}
+    _breakdown.set(breakdown)
+    return breakdown
+
+
+def use_breakdown(breakdown):
+    # Re-attaches a breakdown in code that runs outside the request's context
+    # (e.g. a StreamingResponse body generator).
+    _breakdown.set(breakdown)
+
+
+def timing_breakdown():
+    # {stage: {"seconds": total, "calls": n}} for the current request.
+    breakdown = _breakdown.get() or {}
+    return {
+        stage: {"seconds": round(total, 6), "calls": calls}
+        for stage, (total, calls) in sorted(breakdown.items())
+    }
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render_prometheus(gauges=None):
+    # gauges: optional {name: (help, value)} snapshot values appended as-is.
+    with _lock:
+        histograms = {k: {**v, "buckets": list(v["buckets"])} for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [
+        "# HELP playsafe_stage_duration_seconds Time spent in each pipeline stage.",
+        "# TYPE playsafe_stage_duration_seconds histogram",
+    ]
+    for stage in sorted(histograms):
+        hist = histograms[stage]
+        cumulative = 0
+        for bound, count in zip(STAGE_BUCKETS, hist["buckets"]):
+            cumulative += count
+            lines.append(
+                f'playsafe_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(
+            f'playsafe_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}'
+        )
+        lines.append(f'playsafe_stage_duration_seconds_sum{{stage="{stage}"}} {hist["sum"]}')
+        lines.append(f'playsafe_stage_duration_seconds_count{{stage="{stage}"}} {hist["count"]}')
+
+    names = sorted({name for name, _ in counters})
+    for name in names:
+        lines.append(f"# TYPE {name} counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name, (help_text, value) in sorted((gauges or {}).items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,235 @@
+import asyncio
+import contextvars
+import cProfile
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from starlette.datastructures import Headers
+
+from app.config import (
+    PROFILE_ENABLED,
+    PROFILE_TOKEN,
+    PROFILE_PATH,
+    PROFILE_MAX_CONCURRENT,
+    PROFILE_MAX_FILES,
+    PROFILE_SAMPLE_INTERVAL_S,
+)
+
+# Opt-in request profiling. A request carrying the X-PlaySafe-Profile header
+# (equal to PROFILE_TOKEN when one is configured) runs under a stdlib sampling
+# profiler: a background thread snapshots stacks with sys._current_frames()
+# every PROFILE_SAMPLE_INTERVAL_S. Only the request's own work is kept: event
+# loop samples while the request's task is the one running, and lane worker
+# threads while they run a callable submitted from the request (the profile
+# travels in a ContextVar, see run_attributed). Output goes to PROFILE_PATH as
+# <id>.folded (flamegraph collapsed stacks) plus <id>.json (metadata and top
+# functions), written off the event loop. profile_call() runs a function under
+# cProfile instead, for offline runs.
+
+PROFILE_HEADER = "x-playsafe-profile"
+
+_slots = threading.BoundedSemaphore(max(1, PROFILE_MAX_CONCURRENT))
+_active = contextvars.ContextVar("request_profile", default=None)
+# worker thread ident -> profile it is currently working for
+_thread_owners = {}
+
+
+def profiling_requested(headers):
+    if not PROFILE_ENABLED:
+        return False
+    value = headers.get(PROFILE_HEADER)
+    if not value:
+        return False
+    if PROFILE_TOKEN:
+        return value == PROFILE_TOKEN
+    return True
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def run_attributed(fn, *args):
+    # Runs fn in the current (worker) thread; while it runs, the thread's
+    # samples count towards the profile of the request that submitted it.
+    profile = _active.get()
+    if profile is None:
+        return fn(*args)
+    ident = threading.get_ident()
+    _thread_owners[ident] = profile
+    try:
+        return fn(*args)
+    finally:
+        _thread_owners.pop(ident, None)
+
+
+def _owns(profile, ident):
+    if ident == profile["loop_thread"]:
+        return asyncio.current_task(profile["loop"]) is profile["task"]
+    return _thread_owners.get(ident) is profile
+
+
+def _sample_loop(stop, interval, profile):
+    stacks = profile["stacks"]
+    while not stop.wait(interval):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if not _owns(profile, ident):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(labels))] += 1
+
+
+def _top_functions(stacks, limit=25):
+    self_counts = Counter()
+    total_counts = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]
+        if not frames:
+            continue
+        self_counts[frames[-1]] += count
+        for label in set(frames):
+            total_counts[label] += count
+    return {
+        "self": self_counts.most_common(limit),
+        "inclusive": total_counts.most_common(limit),
+    }
+
+
+def _prune():
+    metas = sorted(glob.glob(os.path.join(PROFILE_PATH, "*.json")), key=os.path.getmtime)
+    for meta in metas[: max(0, len(metas) - PROFILE_MAX_FILES)]:
+        stem = os.path.splitext(meta)[0]
+        for path in glob.glob(stem + ".*"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _write_profile(profile_id, meta, folded=None, stats=None):
+    os.makedirs(PROFILE_PATH, exist_ok=True)
+    stem = os.path.join(PROFILE_PATH, profile_id)
+    if folded is not None:
+        with open(stem + ".folded", "w") as f:
+            for stack, count in sorted(folded.items()):
+                f.write(f"{stack} {count}\n")
+    if stats is not None:
+        stats.dump_stats(stem + ".prof")
+    with open(stem + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    _prune()
+
+
+@asynccontextmanager
+async def request_profile(label):
+    # Yields the profile id, or None when every profiling slot is taken (the
+    # request then runs unprofiled rather than waiting).
+    if not _slots.acquire(blocking=False):
+        yield None
+        return
+    profile_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    profile = {
+        "loop": asyncio.get_running_loop(),
+        "loop_thread": threading.get_ident(),
+        "task": asyncio.current_task(),
+        "stacks": Counter(),
+    }
+    stop = threading.Event()
+    sampler = threading.Thread(
+        target=_sample_loop,
+        args=(stop, PROFILE_SAMPLE_INTERVAL_S, profile),
+        name="playsafe-profiler",
+        daemon=True,
+    )
+    token = _active.set(profile)
+    started = time.time()
+    sampler.start()
+    try:
+        yield profile_id
+    finally:
+        stop.set()
+        _active.reset(token)
+        duration = time.time() - started
+        await asyncio.to_thread(_finish_profile, sampler, profile_id, label, started, duration, profile["stacks"])
+
+
+def _finish_profile(sampler, profile_id, label, started, duration, stacks):
+    sampler.join()
+    _slots.release()
+    _write_profile(
+        profile_id,
+        {
+            "id": profile_id,
+            "mode": "sample",
+            "label": label,
+            "started_at": started,
+            "duration_s": duration,
+            "interval_s": PROFILE_SAMPLE_INTERVAL_S,
+            "samples": sum(stacks.values()),
+            "top": _top_functions(stacks),
+        },
+        folded=stacks,
+    )
+
+
+class ProfileMiddleware:
+    # Plain ASGI middleware rather than BaseHTTPMiddleware: the endpoint runs
+    # in this task (so event loop samples can be attributed to it), streaming
+    # bodies are profiled to the end, and request.is_disconnected() keeps
+    # working. Only installed when PROFILE_ENABLED is set.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling_requested(Headers(scope=scope)):
+            await self.app(scope, receive, send)
+            return
+        async with request_profile(scope["path"]) as profile_id:
+            if profile_id is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_id)
+
+
+def profile_call(label, fn, *args, **kwargs):
+    # cProfile variant for offline runs (single thread, deterministic); writes
+    # <id>.prof for pstats/snakeviz and returns (result, profile_id).
+    profile_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    profiler = cProfile.Profile()
+    started = time.time()
+    try:
+        result = profiler.runcall(fn, *args, **kwargs)
+    finally:
+        _write_profile(
+            profile_id,
+            {
+                "id": profile_id,
+                "mode": "cprofile",
+                "label": label,
+                "started_at": started,
+                "duration_s": time.time() - started,
+            },
+            stats=profiler,
+        )
+    return result, profile_id
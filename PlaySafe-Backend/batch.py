@@ -0,0 +1,236 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from app.services.video_processor import process_video
+from app.services.feature_engineer import compute_formation_metrics
+from app.services.risk_analyzer import analyze_tactics
+from app.services.tactical_timeline import build_match_timeline
+from app.utils.metrics import start_breakdown, timing_breakdown
+from app.utils.profiling import profile_call
+
+# Offline batch analysis of a directory (or manifest) of match videos.
+#
+#   python batch.py data/season_2025/ --workers 4 --pose
+#   python batch.py manifest.txt --output data/batch/
+#
+# A manifest is a text file with one video path per line, or a JSON list of
+# paths / {"path": ...} objects. Each video runs process_video, formation
+# metrics, the tactical timeline and optionally pose analysis in a worker
+# process (no LLM calls). Columnar outputs go to <output>/<match_id>.npz
+# (per-team detections and timeline series), everything else to
+# <output>/index.json keyed by the video's SHA-256, which is also how
+# already-processed videos are skipped on the next run.
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v", ".webm")
+INDEX_NAME = "index.json"
+
+
+def content_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_videos(source):
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        if source.endswith(".json"):
+            entries = [e["path"] if isinstance(e, dict) else e for e in json.load(f)]
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    # Relative manifest entries are relative to the manifest.
+    return [e if os.path.isabs(e) else os.path.join(base, e) for e in entries]
+
+
+def load_index(output_dir):
+    path = os.path.join(output_dir, INDEX_NAME)
+    if not os.path.exists(path):
+        return {"version": 1, "matches": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_index(output_dir, index):
+    path = os.path.join(output_dir, INDEX_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _timeline_columns(timeline):
+    # Numeric/label series of the per-team timeline, for the npz.
+    columns = {}
+    for team in ("teamA", "teamB"):
+        for name, values in (timeline.get(team) or {}).items():
+            if isinstance(values, list) and values and not isinstance(values[0], dict):
+                columns[f"timeline_{team}_{name}"] = np.asarray(values)
+    return columns
+
+
+def _analyse(video_path, match_id, output_dir, pose):
+    video_data = process_video(video_path)
+    if not video_data.get("num_frames"):
+        # An unreadable video is an error, so the next run retries it.
+        raise ValueError(f"No frames decoded from {video_path}")
+    metrics_A = compute_formation_metrics(video_data["teamA_positions"])
+    metrics_B = compute_formation_metrics(video_data["teamB_positions"])
+    timeline = build_match_timeline(video_data)
+
+    columns = _timeline_columns(timeline)
+    for team, store in (video_data.get("detections") or {}).items():
+        for name, values in store.items():
+            columns[f"{team}_{name}"] = values
+    npz_name = f"{match_id}.npz"
+    np.savez_compressed(os.path.join(output_dir, npz_name), **columns)
+
+    entry = {
+        "match_id": match_id,
+        "frames": video_data.get("num_frames", 0),
+        "fps": video_data.get("fps"),
+        "frame_size": video_data.get("frame_size"),
+        "formation_metrics": {"teamA": metrics_A, "teamB": metrics_B},
+        "tactics": {"teamA": analyze_tactics(metrics_A), "teamB": analyze_tactics(metrics_B)},
+        "formation_changes": {
+            team: (timeline.get(team) or {}).get("events", []) for team in ("teamA", "teamB")
+        },
+        "proximity": timeline.get("proximity"),
+        "player_metrics": video_data.get("player_metrics", {}),
+        "event_count": video_data.get("event_count", 0),
+        "processed_video": video_data.get("processed_video"),
+        "columns": npz_name,
+    }
+    if pose:
+        from app.services.pose_extractor import analyze_posture_file
+
+        entry["pose"] = analyze_posture_file(video_path)
+    return entry
+
+
+def process_one(path, digest, output_dir, pose=False, profile=False):
+    # Runs in a worker process.
+    match_id = digest[:16]
+    start_breakdown()
+    started = time.perf_counter()
+    try:
+        if profile:
+            entry, profile_id = profile_call(f"batch:{match_id}", _analyse, path, match_id, output_dir, pose)
+            entry["profile_id"] = profile_id
+        else:
+            entry = _analyse(path, match_id, output_dir, pose)
+        entry["status"] = "success"
+    except Exception as e:
+        entry = {"match_id": match_id, "status": "error", "message": str(e)}
+    entry["seconds"] = time.perf_counter() - started
+    entry["timings"] = timing_breakdown()
+    return entry
+
+
+def run_batch(source, output_dir, workers, pose=False, force=False, profile=False):
+    os.makedirs(output_dir, exist_ok=True)
+    index = load_index(output_dir)
+    videos = collect_videos(source)
+
+    pending = []
+    skipped = 0
+    seen = set()
+    for path in videos:
+        digest = content_hash(path)
+        done = index["matches"].get(digest)
+        if digest in seen or (not force and done and done.get("status") == "success"):
+            skipped += 1
+            continue
+        seen.add(digest)
+        pending.append((path, digest))
+
+    print(
+        f"{len(videos)} videos, {skipped} skipped (already processed or duplicate content), "
+        f"{len(pending)} to run on {workers} workers",
+        flush=True,
+    )
+
+    started = time.perf_counter()
+    frames = 0
+    video_seconds = 0.0
+    failed = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {
+                pool.submit(process_one, path, digest, output_dir, pose, profile): (path, digest)
+                for path, digest in pending
+            }
+            for future in as_completed(futures):
+                path, digest = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    entry = {"match_id": digest[:16], "status": "error", "message": str(e)}
+                entry["path"] = path
+                entry["processed_at"] = time.time()
+                index["matches"][digest] = entry
+                save_index(output_dir, index)
+
+                if entry["status"] == "success":
+                    frames += entry["frames"]
+                    video_seconds += entry["frames"] / float(entry["fps"] or 30)
+                    print(
+                        f"  {os.path.basename(path)}: {entry['frames']} frames in {entry['seconds']:.1f}s",
+                        flush=True,
+                    )
+                else:
+                    failed += 1
+                    print(f"  {os.path.basename(path)}: error: {entry.get('message')}", flush=True)
+
+    elapsed = time.perf_counter() - started
+
+    summary = {
+        "videos": len(videos),
+        "processed": len(pending) - failed,
+        "failed": failed,
+        "skipped": skipped,
+        "frames": frames,
+        "elapsed_s": elapsed,
+        "frames_per_s": frames / elapsed if elapsed > 0 else 0.0,
+        "realtime_factor": video_seconds / elapsed if elapsed > 0 else 0.0,
+    }
+    print(
+        f"done: {summary['processed']} processed, {failed} failed, {skipped} skipped; "
+        f"{frames} frames in {elapsed:.1f}s ({summary['frames_per_s']:.1f} fps, "
+        f"{summary['realtime_factor']:.2f}x realtime)"
+    )
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline batch match analysis")
+    parser.add_argument("source", help="directory of videos or a manifest (.txt / .json)")
+    parser.add_argument("--output", default="data/batch/", help="output directory for npz files and index.json")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--pose", action="store_true", help="also run pose analysis on each video")
+    parser.add_argument("--force", action="store_true", help="reprocess videos already in the index")
+    parser.add_argument("--profile", action="store_true", help="cProfile each video (written to PROFILE_PATH)")
+    args = parser.parse_args(argv)
+    summary = run_batch(args.source, args.output, args.workers, args.pose, args.force, args.profile)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
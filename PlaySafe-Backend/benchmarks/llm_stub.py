@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-in for the OpenAI-compatible /chat/completions endpoint used by
+# llm_client. Answers tactics, single-player injury and squad injury prompts
+# with schema-valid JSON after a configurable delay, fails a configurable
+# fraction of calls with 429/500/503, and supports stream=true (SSE).
+#
+#   python -m benchmarks.llm_stub --port 8900 --latency 0.8 --failure-rate 0.05
+
+TACTICS_RESULT = {
+    "teamA": {
+        "formation_label": "4-3-3 high line",
+        "strategy_label": "Possession build-up",
+        "key_phases": ["Build-up through the back line", "Wide overloads"],
+    },
+    "teamB": {
+        "formation_label": "4-4-2 mid block",
+        "strategy_label": "Counter-attack",
+        "key_phases": ["Compact mid block", "Direct transitions"],
+    },
+}
+
+INJURY_RESULT = {
+    "risk_score": 0.42,
+    "risk_level": "moderate",
+    "primary_risks": ["Knee valgus under load", "Trunk lean on landing"],
+    "explanations": [
+        "Left knee flexion is below the player's baseline.",
+        "Trunk angle variability is elevated this session.",
+    ],
+    "recommendations": [
+        "Add single-leg landing drills.",
+        "Monitor load over the next two sessions.",
+    ],
+    "zone_risks": [
+        {"zone": "left_knee", "level": "medium", "description": "reduced flexion"},
+        {"zone": "lower_back", "level": "low", "description": "mild lean"},
+    ],
+}
+
+_PLAYER_HEADER = re.compile(r'^### Player (".*?")$', re.MULTILINE)
+
+
+def _answer(payload):
+    prompt = payload["messages"][-1]["content"]
+    if '"players": {' in prompt:
+        ids = [json.loads(match) for match in _PLAYER_HEADER.findall(prompt)]
+        return {"players": {player_id: INJURY_RESULT for player_id in ids}}
+    if "risk_score" in prompt:
+        return INJURY_RESULT
+    return TACTICS_RESULT
+
+
+def create_app(latency=0.5, jitter=0.25, failure_rate=0.0, chunk_chars=24, chunk_delay=0.01, seed=None):
+    rng = random.Random(seed)
+    app = FastAPI(title="LLM stub")
+    app.state.stats = {"requests": 0, "failures": 0, "streams": 0, "inflight": 0, "max_inflight": 0}
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+        stats["inflight"] += 1
+        stats["max_inflight"] = max(stats["max_inflight"], stats["inflight"])
+        try:
+            await asyncio.sleep(max(0.0, rng.gauss(latency, jitter)))
+        finally:
+            stats["inflight"] -= 1
+
+        if rng.random() < failure_rate:
+            stats["failures"] += 1
+            status = rng.choice((429, 500, 503))
+            headers = {"Retry-After": "1"} if status == 429 else None
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=status, headers=headers)
+
+        content = json.dumps(_answer(payload))
+        if not payload.get("stream"):
+            return {
+                "id": "stub",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                ],
+            }
+
+        stats["streams"] += 1
+
+        async def events():
+            for start in range(0, len(content), chunk_chars):
+                chunk = {"choices": [{"index": 0, "delta": {"content": content[start:start + chunk_chars]}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(chunk_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local chat-completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean response delay (s)")
+    parser.add_argument("--jitter", type=float, default=0.25, help="delay std deviation (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    app = create_app(args.latency, args.jitter, args.failure_rate, seed=args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+# End-to-end load test. Starts the LLM stub (benchmarks.llm_stub) and the
+# FastAPI app as uvicorn subprocesses, the app inside a scratch directory and
+# pointed at the stub, then drives a weighted mix of analyze-match and
+# analyze-posture uploads (plus cheap reads) at each concurrency step with a
+# closed loop of workers.
+#
+#   python -m benchmarks.loadtest
+#   python -m benchmarks.loadtest --concurrency 1,4,16 --duration 60 \
+#       --llm-latency 1.5 --llm-failure-rate 0.05 --mix match=1,posture=3
+#
+# Run from PlaySafe-Backend/. Reports requests, throughput, p50/p95/p99 latency
+# and error rate per endpoint and step, and writes the report to
+# benchmarks/results/load-<time>-<commit>.json.
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_ROOT, "benchmarks", "results")
+SAMPLE_DIR = os.path.join(BACKEND_ROOT, "data", "raw_videos")
+
+DEFAULT_MIX = "match=1,posture=2,posture_stream=1,events=1"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, proc, timeout=60.0):
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode} before becoming ready")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} not ready after {timeout:.0f}s")
+
+
+def start_servers(args, workdir):
+    stub_port = _free_port()
+    app_port = _free_port()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_ROOT, env.get("PYTHONPATH")]))
+    env["NVIDIA_BASE_URL"] = f"http://127.0.0.1:{stub_port}"
+    env["NVIDIA_API_KEY"] = "stub"
+    if not args.llm_cache:
+        env["LLM_CACHE_TTL_S"] = "0"
+
+    stub_cmd = [
+        sys.executable, "-m", "benchmarks.llm_stub",
+        "--port", str(stub_port),
+        "--latency", str(args.llm_latency),
+        "--jitter", str(args.llm_jitter),
+        "--failure-rate", str(args.llm_failure_rate),
+        "--seed", str(args.seed),
+    ]
+    app_cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1",
+        "--port", str(app_port),
+        "--log-level", "warning",
+    ]
+    # The app mounts processed/ and static/ relative to the cwd and writes
+    # every data/ path there too, so a scratch cwd keeps the tree clean.
+    for name in ("processed", "static", "data"):
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+
+    log = open(os.path.join(workdir, "servers.log"), "w")
+    stub = subprocess.Popen(stub_cmd, cwd=BACKEND_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    app = subprocess.Popen(app_cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        _wait_ready(f"http://127.0.0.1:{stub_port}/stats", stub)
+        _wait_ready(f"http://127.0.0.1:{app_port}/metrics", app)
+    except Exception:
+        stop_servers([stub, app])
+        raise
+    return f"http://127.0.0.1:{app_port}", f"http://127.0.0.1:{stub_port}", [stub, app]
+
+
+def stop_servers(procs):
+    for proc in procs:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {name!r}; choose from {sorted(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _upload(videos, kind):
+    # The app prefixes uploads with the job id and keys frame and checkpoint
+    # directories on the content, so the name suffix only tells runs apart in
+    # logs. Every request sends the same clip: concurrent match runs find its
+    # checkpoint locked and take the uuid-suffixed fallback key (no resume),
+    # which is the cold path this load test should measure anyway.
+    path, data = videos[kind]
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f"{stem}-{uuid.uuid4().hex[:10]}{ext}", data
+
+
+async def _match(client, videos):
+    name, data = _upload(videos, "match")
+    response = await client.post(
+        "/analyze-match/",
+        data={"player_id": "load"},
+        files={"file": (name, data, "video/mp4")},
+    )
+    return response, response.json() if response.status_code == 200 else None
+
+
+async def _posture(client, videos):
+    name, data = _upload(videos, "posture")
+    response = await client.post(
+        "/analyze-posture/",
+        data={"player_id": f"load-{random.randrange(8)}"},
+        files={"file": (name, data, "video/mp4")},
+    )
+    return response, response.json() if response.status_code == 200 else None
+
+
+async def _posture_stream(client, videos):
+    # Counts time to the last NDJSON line; the first line's latency is kept as
+    # time-to-first-byte.
+    name, data = _upload(videos, "posture")
+    started = time.perf_counter()
+    ttfb = None
+    last = None
+    async with client.stream(
+        "POST",
+        "/analyze-posture/",
+        data={"player_id": f"load-{random.randrange(8)}", "stream": "true"},
+        files={"file": (name, data, "video/mp4")},
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            last = json.loads(line)
+    response.ttfb = ttfb
+    return response, last
+
+
+async def _events(client, videos):
+    response = await client.get("/events", params={"limit": 100})
+    return response, response.json() if response.status_code == 200 else None
+
+
+ENDPOINTS = {
+    "match": _match,
+    "posture": _posture,
+    "posture_stream": _posture_stream,
+    "events": _events,
+}
+
+
+def _is_error(response, body):
+    if response.status_code >= 400:
+        return True
+    if isinstance(body, dict):
+        return body.get("status") == "error" or body.get("type") == "error"
+    return body is None
+
+
+async def _worker(client, mix, videos, deadline, samples, rng):
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        sample = {"endpoint": name, "start": started}
+        try:
+            response, body = await ENDPOINTS[name](client, videos)
+            sample["status"] = response.status_code
+            sample["error"] = _is_error(response, body)
+            if sample["error"] and isinstance(body, dict):
+                sample["message"] = str(body.get("message"))[:200]
+            sample["ttfb"] = getattr(response, "ttfb", None)
+        except Exception as e:
+            sample["status"] = None
+            sample["error"] = True
+            sample["message"] = f"{type(e).__name__}: {e}"[:200]
+        sample["latency"] = time.perf_counter() - started
+        samples.append(sample)
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples, elapsed):
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample["endpoint"], []).append(sample)
+    by_endpoint["all"] = samples
+
+    summary = {}
+    for name, group in sorted(by_endpoint.items()):
+        latencies = [s["latency"] for s in group]
+        errors = [s for s in group if s["error"]]
+        messages = {}
+        for s in errors:
+            key = s.get("message") or f"HTTP {s['status']}"
+            messages[key] = messages.get(key, 0) + 1
+        entry = {
+            "requests": len(group),
+            "throughput_rps": len(group) / elapsed if elapsed > 0 else None,
+            "p50_s": _percentile(latencies, 50),
+            "p95_s": _percentile(latencies, 95),
+            "p99_s": _percentile(latencies, 99),
+            "max_s": max(latencies) if latencies else None,
+            "errors": len(errors),
+            "error_rate": len(errors) / len(group) if group else 0.0,
+            "top_errors": sorted(messages.items(), key=lambda kv: -kv[1])[:5],
+        }
+        ttfbs = [s["ttfb"] for s in group if s.get("ttfb") is not None]
+        if ttfbs:
+            entry["ttfb_p50_s"] = _percentile(ttfbs, 50)
+            entry["ttfb_p95_s"] = _percentile(ttfbs, 95)
+        summary[name] = entry
+    return summary
+
+
+async def run_step(base_url, concurrency, duration, mix, videos, timeout, seed):
+    import httpx
+
+    samples = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(
+            *(
+                _worker(client, mix, videos, deadline, samples, random.Random(seed * 1000 + i))
+                for i in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed), elapsed
+
+
+def _fmt(value, scale=1.0, width=8, digits=2):
+    if value is None:
+        return "-".rjust(width)
+    return f"{value * scale:{width}.{digits}f}"
+
+
+def print_step(concurrency, summary):
+    print(f"\nconcurrency {concurrency}")
+    print(f"  {'endpoint':16s} {'reqs':>6s} {'rps':>8s} {'p50 s':>8s} {'p95 s':>8s} {'p99 s':>8s} {'err %':>7s}")
+    for name, entry in summary.items():
+        print(
+            f"  {name:16s} {entry['requests']:6d} {_fmt(entry['throughput_rps'])} "
+            f"{_fmt(entry['p50_s'])} {_fmt(entry['p95_s'])} {_fmt(entry['p99_s'])} "
+            f"{_fmt(entry['error_rate'], 100, 7, 1)}",
+            flush=True,
+        )
+
+
+def run_load(args):
+    sys.path.insert(0, BACKEND_ROOT)
+    import httpx
+    from benchmarks.run import _environment
+
+    mix = parse_mix(args.mix)
+    sample_videos = {"match": args.match_video, "posture": args.posture_video}
+    videos = {}
+    for kind, path in sample_videos.items():
+        with open(path, "rb") as f:
+            videos[kind] = (path, f.read())
+
+    workdir = tempfile.mkdtemp(prefix="playsafe-load-")
+    procs = []
+    steps = []
+    try:
+        base_url, stub_url, procs = start_servers(args, workdir)
+        if args.warmup:
+            asyncio.run(run_step(base_url, 1, args.warmup, mix, videos, args.timeout, args.seed))
+        for concurrency in args.concurrency:
+            summary, elapsed = asyncio.run(
+                run_step(base_url, concurrency, args.duration, mix, videos, args.timeout, args.seed)
+            )
+            print_step(concurrency, summary)
+            steps.append({"concurrency": concurrency, "elapsed_s": elapsed, "endpoints": summary})
+        stub_stats = httpx.get(f"{stub_url}/stats", timeout=5).json()
+        server_metrics = httpx.get(f"{base_url}/metrics", timeout=5).text
+    finally:
+        stop_servers(procs)
+        if args.keep:
+            print(f"kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "environment": _environment(),
+        "config": {
+            "mix": mix,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "llm_latency_s": args.llm_latency,
+            "llm_jitter_s": args.llm_jitter,
+            "llm_failure_rate": args.llm_failure_rate,
+            "llm_cache": args.llm_cache,
+            "videos": sample_videos,
+        },
+        "steps": steps,
+        "llm_stub": stub_stats,
+        "server_metrics": server_metrics,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"load-{stamp}-{report['environment']['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nLLM stub: {stub_stats}")
+    print(f"wrote {output}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PlaySafe end-to-end load test")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per concurrency step")
+    parser.add_argument("--warmup", type=float, default=5.0, help="single-worker warm-up seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight list")
+    parser.add_argument("--match-video", default=os.path.join(SAMPLE_DIR, "match.mp4"))
+    parser.add_argument("--posture-video", default=os.path.join(SAMPLE_DIR, "baseline.mp4"))
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache enabled")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request client timeout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="report JSON path")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory and server log")
+    args = parser.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    run_load(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
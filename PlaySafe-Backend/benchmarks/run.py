@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Reproducible backend benchmarks on synthetic inputs.
+#
+#   python -m benchmarks.run                    full matrix
+#   python -m benchmarks.run --quick            smallest match + posture case
+#   python -m benchmarks.run --compare a.json b.json
+#
+# Run from PlaySafe-Backend/. Each case runs in a fresh interpreter inside a
+# scratch directory (so peak RSS is per case and no data/ or static/ files are
+# touched). Results are written to benchmarks/results/<time>-<commit>.json.
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_ROOT, "benchmarks", "results")
+
+MATCH_RESOLUTIONS = ((640, 360), (1280, 720), (1920, 1080))
+MATCH_SECONDS = (5, 20)
+POSTURE_FRAMES = (300, 3000, 30000)
+
+
+def build_cases(quick=False):
+    if quick:
+        return [
+            {"kind": "match", "width": 640, "height": 360, "seconds": 5, "fps": 25},
+            {"kind": "posture", "frames": 300},
+        ]
+    cases = [
+        {"kind": "match", "width": w, "height": h, "seconds": s, "fps": 25}
+        for (w, h) in MATCH_RESOLUTIONS
+        for s in MATCH_SECONDS
+    ]
+    cases += [{"kind": "posture", "frames": n} for n in POSTURE_FRAMES]
+    return cases
+
+
+def case_name(case):
+    if case["kind"] == "match":
+        return f"match_{case['width']}x{case['height']}_{case['seconds']}s"
+    return f"posture_{case['frames']}f"
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _run_match_case(case, video_path):
+    from app.services.video_processor import run_detection, encode_processed_video
+    from app.services.tactical_timeline import build_match_timeline
+    from app.utils.metrics import start_breakdown, timing_breakdown, stage_timer
+
+    start_breakdown()
+    started = time.perf_counter()
+    with stage_timer("run_detection"):
+        video_data = run_detection(video_path)
+    detection_s = time.perf_counter() - started
+    with stage_timer("tactical_timeline"):
+        build_match_timeline(video_data)
+    encode_processed_video(video_data)
+    total_s = time.perf_counter() - started
+
+    frames = video_data.get("num_frames", 0)
+    return {
+        "frames": frames,
+        "detections": len(video_data.get("teamA_positions", [])) + len(video_data.get("teamB_positions", [])),
+        "detection_s": detection_s,
+        "total_s": total_s,
+        "fps": frames / detection_s if detection_s > 0 else None,
+        "end_to_end_fps": frames / total_s if total_s > 0 else None,
+        "stages": timing_breakdown(),
+    }
+
+
+def _run_posture_case(case):
+    from app.services.pose_extractor import compute_joint_metrics
+    from benchmarks.synthetic import landmark_sequence
+
+    sequence = landmark_sequence(case["frames"], seed=case.get("seed", 0))
+    repeats = max(1, 30000 // case["frames"])
+    started = time.perf_counter()
+    for _ in range(repeats):
+        events = []
+        compute_joint_metrics(sequence, events)
+    elapsed = time.perf_counter() - started
+    frames = case["frames"] * repeats
+    return {
+        "frames": frames,
+        "repeats": repeats,
+        "total_s": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else None,
+        "events": len(events),
+        "stages": {"joint_metrics": {"seconds": elapsed, "calls": repeats}},
+    }
+
+
+def run_child(case, workdir, video_path):
+    # Import the app only after moving into the scratch directory: output
+    # paths in app.config and video_processor are relative to the cwd.
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_ROOT)
+    if case["kind"] == "match":
+        result = _run_match_case(case, video_path)
+    else:
+        result = _run_posture_case(case)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    print(json.dumps(result))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _environment():
+    import cv2
+    import numpy as np
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def run_suite(cases, output=None, keep=False):
+    sys.path.insert(0, BACKEND_ROOT)
+    from benchmarks.synthetic import write_match_video
+
+    results = []
+    scratch = tempfile.mkdtemp(prefix="playsafe-bench-")
+    try:
+        for case in cases:
+            name = case_name(case)
+            workdir = os.path.join(scratch, name)
+            os.makedirs(workdir, exist_ok=True)
+            video_path = None
+            if case["kind"] == "match":
+                video_path = os.path.join(workdir, f"{name}.mp4")
+                write_match_video(
+                    video_path,
+                    case["width"],
+                    case["height"],
+                    case["seconds"],
+                    case["fps"],
+                    seed=case.get("seed", 0),
+                )
+
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.run",
+                    "--child",
+                    json.dumps(case),
+                    "--workdir",
+                    workdir,
+                    "--video",
+                    video_path or "",
+                ],
+                cwd=BACKEND_ROOT,
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                entry = {"name": name, "case": case, "error": proc.stderr.strip().splitlines()[-1:]}
+            else:
+                entry = {"name": name, "case": case, **json.loads(proc.stdout.strip().splitlines()[-1])}
+            results.append(entry)
+            fps = entry.get("fps")
+            print(
+                f"{name:28s} "
+                + (f"{fps:10.1f} fps  " if fps else "     error    ")
+                + (f"{entry['peak_rss_mb']:8.1f} MB" if entry.get("peak_rss_mb") else ""),
+                flush=True,
+            )
+    finally:
+        if not keep:
+            import shutil
+
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {"environment": _environment(), "results": results}
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['environment']['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {output}")
+    return report
+
+
+def compare(old_path, new_path, threshold=0.1):
+    # Prints fps and peak RSS per case; flags throughput drops larger than
+    # threshold. Returns 1 if any case regressed.
+    with open(old_path) as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressed = False
+    print(f"{'case':28s} {'old fps':>10s} {'new fps':>10s} {'change':>8s} {'old MB':>8s} {'new MB':>8s}")
+    for name in sorted(set(old) & set(new)):
+        a, b = old[name], new[name]
+        if not a.get("fps") or not b.get("fps"):
+            print(f"{name:28s} {'-':>10s} {'-':>10s}")
+            continue
+        change = b["fps"] / a["fps"] - 1.0
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(
+            f"{name:28s} {a['fps']:10.1f} {b['fps']:10.1f} {change:+7.1%} "
+            f"{a.get('peak_rss_mb') or 0:8.1f} {b.get('peak_rss_mb') or 0:8.1f}{flag}"
+        )
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PlaySafe backend benchmarks")
+    parser.add_argument("--quick", action="store_true", help="run only the smallest cases")
+    parser.add_argument("--output", help="result JSON path")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--video", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(json.loads(args.child), args.workdir, args.video or None)
+        return 0
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+    run_suite(build_cases(args.quick), args.output, args.keep)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import math
+
+import cv2
+import numpy as np
+
+# Deterministic synthetic inputs for the benchmarks: match footage with red
+# and blue "players" (colours inside detect_players_by_color's HSV ranges)
+# moving over a striped green pitch, and MediaPipe-shaped landmark sequences
+# for compute_joint_metrics.
+
+PITCH_GREEN = (40, 140, 40)
+PITCH_STRIPE = (34, 122, 34)
+TEAM_A_BGR = (0, 0, 230)
+TEAM_B_BGR = (230, 60, 0)
+
+POSE_LANDMARKS = 33
+
+
+def _player_paths(rng, players, frames, width, height):
+    # Smooth random walks with occasional bursts so the tracker sees sprints,
+    # decelerations and direction changes.
+    pos = np.column_stack(
+        [rng.uniform(0.1, 0.9, players) * width, rng.uniform(0.15, 0.9, players) * height]
+    )
+    heading = rng.uniform(0, 2 * math.pi, players)
+    base_speed = max(width, height) * 0.002
+    paths = np.empty((frames, players, 2))
+    for f in range(frames):
+        heading += rng.normal(0, 0.15, players)
+        burst = rng.random(players) < 0.02
+        speed = base_speed * np.where(burst, 6.0, rng.uniform(0.5, 1.5, players))
+        pos[:, 0] += np.cos(heading) * speed
+        pos[:, 1] += np.sin(heading) * speed
+        # Bounce off the touchlines.
+        for axis, limit in ((0, width), (1, height)):
+            low = pos[:, axis] < 0.05 * limit
+            high = pos[:, axis] > 0.95 * limit
+            if axis == 0:
+                heading[low | high] = math.pi - heading[low | high]
+            else:
+                heading[low | high] = -heading[low | high]
+            pos[:, axis] = np.clip(pos[:, axis], 0.05 * limit, 0.95 * limit)
+        paths[f] = pos
+    return paths
+
+
+def _pitch(width, height):
+    pitch = np.empty((height, width, 3), dtype=np.uint8)
+    pitch[:] = PITCH_GREEN
+    stripe = max(1, width // 12)
+    for x in range(0, width, 2 * stripe):
+        pitch[:, x:x + stripe] = PITCH_STRIPE
+    cv2.line(pitch, (width // 2, 0), (width // 2, height - 1), (220, 220, 220), 2)
+    cv2.circle(pitch, (width // 2, height // 2), max(4, height // 8), (220, 220, 220), 2)
+    return pitch
+
+
+def write_match_video(path, width=1280, height=720, seconds=10, fps=25, players=11, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = int(round(seconds * fps))
+    # Large enough to pass extract_centroids' 200 px^2 contour-area filter.
+    radius = max(10, int(round(min(width, height) * 0.02)))
+    paths_A = _player_paths(rng, players, frames, width, height)
+    paths_B = _player_paths(rng, players, frames, width, height)
+    pitch = _pitch(width, height)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for {path}")
+    try:
+        for f in range(frames):
+            frame = pitch.copy()
+            for paths, color in ((paths_A, TEAM_A_BGR), (paths_B, TEAM_B_BGR)):
+                for x, y in paths[f]:
+                    cv2.circle(frame, (int(x), int(y)), radius, color, -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return {"path": path, "width": width, "height": height, "fps": fps, "frames": frames}
+
+
+def landmark_sequence(frames=300, seed=0):
+    # A runner seen side-on: the hip midpoint travels and turns, knees flex
+    # periodically, the trunk leans; coordinates are normalised like
+    # MediaPipe's (x, y, z).
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames)
+    heading = np.cumsum(rng.normal(0, 0.08, frames))
+    step = 0.004 * (1 + 0.8 * (np.sin(t / 37.0) > 0.7))
+    hip_x = 0.5 + np.cumsum(np.cos(heading) * step) % 0.6 - 0.3
+    hip_y = 0.55 + 0.02 * np.sin(t / 5.0) + np.cumsum(np.sin(heading) * step * 0.2) % 0.1
+    phase = t / 4.0
+    lean = 0.05 + 0.03 * np.sin(t / 23.0)
+
+    sequence = []
+    for i in range(frames):
+        lm = [(0.5, 0.5, 0.0)] * POSE_LANDMARKS
+        hx, hy = hip_x[i], hip_y[i]
+        for side, sign in ((0, -1), (1, 1)):
+            swing = math.sin(phase[i] + side * math.pi)
+            hip = (hx + sign * 0.03, hy, 0.0)
+            knee = (hip[0] + 0.04 * swing, hy + 0.12, 0.01 * sign)
+            ankle = (knee[0] - 0.03 * max(0.0, swing), knee[1] + 0.12, 0.0)
+            shoulder = (hx + sign * 0.05 + lean[i], hy - 0.25, 0.0)
+            lm[23 + side] = hip
+            lm[25 + side] = knee
+            lm[27 + side] = ankle
+            lm[11 + side] = shoulder
+        sequence.append(
+            [(x + rng.normal(0, 0.002), y + rng.normal(0, 0.002), z) for x, y, z in lm]
+        )
+    return sequence
@@ -0,0 +1,52 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+# The app creates and resolves its data directories relative to the working
+# directory at import time, so the suite runs in a scratch directory.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp(prefix="playsafe-tests-"))
+os.makedirs("static", exist_ok=True)
+os.makedirs("processed", exist_ok=True)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def llm_stub():
+    # Starts benchmarks.llm_stub in a background uvicorn server; call the
+    # fixture with the stub's create_app() arguments. Returns (base_url, app).
+    import uvicorn
+
+    from benchmarks.llm_stub import create_app
+
+    servers = []
+
+    def start(**options):
+        app = create_app(**options)
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        deadline = time.time() + 10
+        while not server.started:
+            if time.time() > deadline:
+                raise RuntimeError("LLM stub did not start")
+            time.sleep(0.01)
+        servers.append((server, thread))
+        return f"http://127.0.0.1:{port}", app
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
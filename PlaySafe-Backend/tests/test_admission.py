@@ -0,0 +1,182 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import admission
+
+
+def _write_video(path, frames=50, fourcc="MJPG"):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), 25, (160, 120))
+    for _ in range(frames):
+        writer.write(np.random.randint(0, 255, (120, 160, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_probe_reads_container_metadata(tmp_path):
+    probe = admission.probe_media(_write_video(str(tmp_path / "clip.avi")))
+
+    assert probe["frames"] == 50
+    assert (probe["width"], probe["height"], probe["fps"]) == (160, 120, 25.0)
+    assert probe["duration_s"] == pytest.approx(2.0)
+
+
+def test_missing_frame_count_is_estimated_from_bitrate(monkeypatch, tmp_path):
+    path = tmp_path / "clip.bin"
+    path.write_bytes(b"\0" * 250_000)
+    props = {
+        cv2.CAP_PROP_FRAME_COUNT: -1.0,
+        cv2.CAP_PROP_FPS: 25.0,
+        cv2.CAP_PROP_FRAME_WIDTH: 640.0,
+        cv2.CAP_PROP_FRAME_HEIGHT: 360.0,
+        cv2.CAP_PROP_BITRATE: 500.0,
+    }
+
+    class FakeCapture:
+        def __init__(self, path):
+            pass
+
+        def isOpened(self):
+            return True
+
+        def get(self, prop):
+            return props[prop]
+
+        def grab(self):
+            raise AssertionError("probe must not demux the file")
+
+        def release(self):
+            pass
+
+    monkeypatch.setattr(admission.cv2, "VideoCapture", FakeCapture)
+
+    # 250 kB at 500 kbit/s is 4 s, 100 frames at 25 fps.
+    assert admission.probe_media(str(path))["frames"] == 100
+    props[cv2.CAP_PROP_BITRATE] = 0.0
+    assert admission.probe_media(str(path)) is None
+
+
+def test_failed_probe_is_costed_as_unknown_media():
+    unknown = admission.estimate_job("match", [None])
+    assumed = admission.estimate_job("match", [dict(admission.ADMISSION_UNKNOWN_MEDIA)])
+
+    assert unknown["cpu_s"] > 0
+    assert unknown["cpu_s"] == assumed["cpu_s"]
+    assert admission.estimate_job("posture", [None])["units"]["pose"] > 0
+
+
+def _plan(frames, ms_per_frame, stride=1):
+    return {"tier": "t", "stride": stride, "frames": frames, "ms_per_frame": ms_per_frame}
+
+
+def test_posture_cost_follows_the_pose_plan(monkeypatch):
+    monkeypatch.setattr(admission, "_rates", dict(admission._rates, pose=1.0))
+    probe = {"frames": 300, "fps": 30.0, "width": 640, "height": 360}
+
+    full = admission.estimate_job("posture", [probe], plans=[_plan(300, 30.0)])
+    strided_lite = admission.estimate_job("posture", [probe], plans=[_plan(30, 12.0, stride=10)])
+    heavy = admission.estimate_job("posture", [probe], plans=[_plan(300, 95.0)])
+
+    assert full["stages"]["pose"] == pytest.approx(9.0)
+    assert strided_lite["stages"]["pose"] == pytest.approx(0.36)
+    assert heavy["stages"]["pose"] == pytest.approx(28.5)
+    squad = admission.estimate_job("squad", [probe, probe], plans=[_plan(300, 30.0), _plan(30, 12.0)])
+    assert squad["units"]["pose"] == pytest.approx(9.36)
+
+
+def test_pose_calibration_is_per_planned_model_second(monkeypatch):
+    monkeypatch.setattr(admission, "_rates", dict(admission._rates, pose=1.0))
+    monkeypatch.setattr(admission, "ADMISSION_CALIBRATION_ALPHA", 1.0)
+    probe = {"frames": 3000, "fps": 30.0, "width": 640, "height": 360}
+    # Stride 10 samples 30 of the 300-frame window at 30 ms: 0.9 s planned.
+    estimate = admission.estimate_job("posture", [probe], plans=[_plan(30, 30.0, stride=10)])
+
+    admission.calibrate(estimate["units"], {"pose_analysis": {"seconds": 1.8}})
+    assert admission._rates["pose"] == pytest.approx(2.0)
+
+
+@pytest.fixture
+def capacity(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "ADMISSION_CAPACITY_S", 100.0)
+    monkeypatch.setattr(admission, "ADMISSION_INTERACTIVE_RESERVED_S", 20.0)
+    monkeypatch.setattr(admission, "ADMISSION_MAX_STARVE_S", 60.0)
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE_S", 1e9)
+    monkeypatch.setattr(admission, "_running", {})
+    monkeypatch.setattr(admission, "_waiting", [])
+    monkeypatch.setattr(admission, "calibrate", lambda units, breakdown: None)
+
+
+def _estimate(kind, cpu_s):
+    return {"kind": kind, "cpu_s": cpu_s, "wall_s": cpu_s, "units": {}, "stages": {}}
+
+
+async def _job(estimate, started, release):
+    async with admission.admission(estimate) as ticket:
+        started.append((estimate["kind"], estimate["cpu_s"]))
+        await release.wait()
+        return ticket
+
+
+def _run_jobs(estimates, check):
+    async def run():
+        started = []
+        releases = [asyncio.Event() for _ in estimates]
+        tasks = []
+        for estimate, release in zip(estimates, releases):
+            tasks.append(asyncio.create_task(_job(estimate, started, release)))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        await check(started, releases)
+        for release in releases:
+            release.set()
+        return await asyncio.gather(*tasks)
+
+    return asyncio.run(run())
+
+
+def test_posture_is_not_blocked_behind_queued_match_jobs(capacity):
+    async def check(started, releases):
+        # match2 does not fit next to match1; the posture job queued after it
+        # starts right away anyway.
+        assert started == [("match", 60.0), ("posture", 5.0)]
+        assert [t["kind"] for t in admission._waiting] == ["match"]
+
+    tickets = _run_jobs([_estimate("match", 60.0), _estimate("match", 60.0), _estimate("posture", 5.0)], check)
+    assert tickets[2]["started_at"] - tickets[2]["queued_at"] < 0.05
+
+
+def test_interactive_reserve_survives_an_oversized_batch_job(capacity):
+    async def check(started, releases):
+        assert started == [("match", 150.0), ("posture", 5.0)]
+
+    _run_jobs([_estimate("match", 150.0), _estimate("posture", 5.0)], check)
+
+
+def test_later_batch_jobs_that_fit_pass_a_blocked_head(capacity):
+    async def check(started, releases):
+        assert started == [("match", 50.0), ("squad", 20.0)]
+        releases[0].set()
+        await asyncio.sleep(0.01)
+        assert started[-1] == ("match", 60.0)
+
+    _run_jobs([_estimate("match", 50.0), _estimate("match", 60.0), _estimate("squad", 20.0)], check)
+
+
+def test_starving_head_stops_batch_backfill_but_not_the_reserve(capacity, monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_MAX_STARVE_S", 0.0)
+
+    async def check(started, releases):
+        # The 70s match has waited past the bound: the 20s squad queued after
+        # it must wait, the posture job still gets the reserve.
+        assert started == [("match", 50.0), ("posture", 5.0)]
+        releases[0].set()
+        await asyncio.sleep(0.01)
+        assert started[2:] == [("match", 70.0)]
+
+    _run_jobs(
+        [_estimate("match", 50.0), _estimate("match", 70.0), _estimate("squad", 20.0), _estimate("posture", 5.0)],
+        check,
+    )
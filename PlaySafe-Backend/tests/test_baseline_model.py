@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from app.models import baseline_storage
+from app.services import baseline_model
+
+SESSION = {"left_knee_mean": 150.0, "right_knee_mean": 148.0, "trunk_angle_mean": 8.0}
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(baseline_storage, "BASELINE_DB_PATH", str(tmp_path / "baselines.db"))
+    monkeypatch.setattr(baseline_storage, "BASELINE_PATH", str(tmp_path))
+    monkeypatch.setattr(baseline_storage, "_local", threading.local())
+
+
+def _legacy(player_id, sessions=20):
+    # Pre-statistics record: running means only.
+    baseline_storage.update_baseline(
+        player_id, lambda _: {"sessions": sessions, "baseline": dict(SESSION)}
+    )
+
+
+def test_legacy_record_has_no_variance_or_z_scores():
+    _legacy("p1")
+    info = baseline_model.load_posture_baseline("p1", {**SESSION, "left_knee_mean": 151.0})
+
+    assert info["sessions"] == 20
+    assert set(info["z_scores"].values()) == {None}
+    summary = baseline_model.summarize_posture_baseline(baseline_storage.get_baseline("p1"))
+    assert summary["metrics"]["left_knee_mean"]["std"] is None
+
+
+def test_legacy_record_is_not_treated_as_zero_variance():
+    _legacy("p1")
+    baseline_model.update_posture_baseline("p1", {**SESSION, "left_knee_mean": 154.0})
+    info = baseline_model.update_posture_baseline("p1", {**SESSION, "left_knee_mean": 152.0})
+
+    # Seeded as 20 observations with m2 = 0 this would be a z-score of about 4.
+    assert abs(info["z_scores"]["left_knee_mean"]) < 1.0
+    assert info["sessions"] == 22
+
+
+def test_new_players_build_variance_from_sessions():
+    for value in (150.0, 152.0, 148.0):
+        info = baseline_model.update_posture_baseline("p2", {**SESSION, "left_knee_mean": value})
+
+    record = baseline_storage.get_baseline("p2")
+    assert record["stats"]["left_knee_mean"]["count"] == 3
+    # Against the first two sessions: mean 151, sample std sqrt(2).
+    assert info["z_scores"]["left_knee_mean"] == pytest.approx(-3.0 / 2 ** 0.5)
@@ -0,0 +1,106 @@
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from app.models import baseline_storage
+from app.services import baseline_model
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    json_dir = tmp_path / "baselines"
+    json_dir.mkdir()
+    db_path = str(tmp_path / "baselines.db")
+    monkeypatch.setenv("BASELINE_DB_PATH", db_path)
+    monkeypatch.setattr(baseline_storage, "BASELINE_DB_PATH", db_path)
+    monkeypatch.setattr(baseline_storage, "BASELINE_PATH", str(json_dir))
+    monkeypatch.setattr(baseline_storage, "_local", threading.local())
+    return json_dir
+
+
+def _increment(record):
+    record = dict(record or {"sessions": 0, "writers": []})
+    record["sessions"] += 1
+    return record
+
+
+def _write_many(player_id, count):
+    for _ in range(count):
+        baseline_storage.update_baseline(player_id, _increment)
+
+
+def test_parallel_thread_writers_lose_no_updates(store):
+    threads = [threading.Thread(target=_write_many, args=("p1", 25)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert baseline_storage.get_baseline("p1")["sessions"] == 200
+
+
+def test_parallel_process_writers_lose_no_updates(store):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_write_many, args=("p1", 20)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    assert baseline_storage.get_baseline("p1")["sessions"] == 80
+
+
+def test_parallel_posture_uploads_count_every_session(store):
+    metrics = {"left_knee_mean": 150.0, "right_knee_mean": 148.0, "trunk_angle_mean": 8.0}
+    threads = [
+        threading.Thread(target=baseline_model.update_posture_baseline, args=("p1", metrics))
+        for _ in range(12)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    record = baseline_storage.get_baseline("p1")
+    assert record["sessions"] == 12
+    assert record["stats"]["left_knee_mean"]["count"] == 12
+
+
+def test_json_baselines_are_imported_on_first_open(store):
+    (store / "p1_posture.json").write_text(json.dumps({"sessions": 3, "baseline": {"left_knee_mean": 150.0}}))
+    (store / "p2_posture.json").write_text(json.dumps({"sessions": 1, "baseline": {"left_knee_mean": 140.0}}))
+    (store / "broken_posture.json").write_text("{not json")
+
+    baselines = baseline_storage.get_baselines()
+
+    assert set(baselines) == {"p1", "p2"}
+    assert baselines["p1"] == {"sessions": 3, "baseline": {"left_knee_mean": 150.0}}
+    version = baseline_storage._connect().execute("PRAGMA user_version").fetchone()[0]
+    assert version == baseline_storage.SCHEMA_VERSION
+
+
+def test_json_migration_keeps_existing_rows(store):
+    baseline_storage.update_baseline("p1", lambda _: {"sessions": 9, "baseline": {}})
+    (store / "p1_posture.json").write_text(json.dumps({"sessions": 2, "baseline": {}}))
+    (store / "p3_posture.json").write_text(json.dumps({"sessions": 4, "baseline": {}}))
+
+    assert baseline_storage.migrate_json_baselines(str(store)) == 1
+    assert baseline_storage.get_baseline("p1")["sessions"] == 9
+    assert baseline_storage.get_baseline("p3")["sessions"] == 4
+
+
+def test_bulk_query_filters_players(store):
+    for player_id in ("a", "b", "c"):
+        baseline_storage.update_baseline(player_id, _increment)
+
+    assert set(baseline_storage.get_baselines(["a", "c", "missing"])) == {"a", "c"}
+
+
+def test_update_returning_none_leaves_row(store):
+    baseline_storage.update_baseline("p1", _increment)
+    assert baseline_storage.update_baseline("p1", lambda record: None) == {"sessions": 1, "writers": []}
+    assert os.path.exists(baseline_storage.BASELINE_DB_PATH)
@@ -0,0 +1,11 @@
+import batch
+
+
+def test_undecodable_video_is_recorded_as_an_error(tmp_path):
+    video = tmp_path / "broken.mp4"
+    video.write_bytes(b"not a video")
+
+    entry = batch.process_one(str(video), batch.content_hash(str(video)), str(tmp_path / "out"))
+
+    assert entry["status"] == "error"
+    assert "No frames decoded" in entry["message"]
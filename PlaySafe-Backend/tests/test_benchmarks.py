@@ -0,0 +1,53 @@
+import json
+
+import cv2
+
+from app.services.video_processor import detect_players_by_color, extract_centroids
+from benchmarks import run
+from benchmarks.synthetic import landmark_sequence, write_match_video
+
+
+def test_synthetic_players_are_detected(tmp_path):
+    info = write_match_video(str(tmp_path / "m.mp4"), 320, 180, seconds=0.2, fps=25, players=5)
+    cap = cv2.VideoCapture(info["path"])
+    ok, frame = cap.read()
+    cap.release()
+
+    assert ok and info["frames"] == 5
+    mask_A, mask_B = detect_players_by_color(frame)
+    # Players can overlap, so allow merged blobs.
+    assert 1 <= len(extract_centroids(mask_A)) <= 5
+    assert 1 <= len(extract_centroids(mask_B)) <= 5
+
+
+def test_landmark_sequence_is_deterministic():
+    assert landmark_sequence(20, seed=3) == landmark_sequence(20, seed=3)
+    assert landmark_sequence(20, seed=3) != landmark_sequence(20, seed=4)
+
+
+def test_suite_runs_small_cases(tmp_path):
+    output = str(tmp_path / "results.json")
+    cases = [
+        {"kind": "match", "width": 320, "height": 180, "seconds": 1, "fps": 25},
+        {"kind": "posture", "frames": 60},
+    ]
+    report = run.run_suite(cases, output=output)
+
+    with open(output) as f:
+        assert json.load(f) == report
+    match, posture = report["results"]
+    assert "error" not in match and "error" not in posture
+    assert match["frames"] == 25 and match["detections"] > 0 and match["fps"] > 0
+    assert posture["fps"] > 0 and posture["peak_rss_mb"] > 0
+
+
+def test_compare_flags_throughput_regressions(tmp_path):
+    def write(path, fps):
+        results = [{"name": "a", "fps": fps, "peak_rss_mb": 10.0}, {"name": "b", "fps": 100.0}]
+        with open(path, "w") as f:
+            json.dump({"results": results}, f)
+        return path
+
+    old = write(str(tmp_path / "old.json"), 100.0)
+    assert run.compare(old, write(str(tmp_path / "same.json"), 95.0)) == 0
+    assert run.compare(old, write(str(tmp_path / "slow.json"), 80.0)) == 1
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+import threading
+
+import cv2
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI
+
+from app.api import routes
+from app.models import baseline_storage, event_index, session_history
+from app.services import cancellation, llm_tactics, pose_extractor
+from app.services.scheduler import run_in_lane
+
+
+@pytest.fixture
+def posture_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(baseline_storage, "BASELINE_DB_PATH", str(tmp_path / "baselines.db"))
+    monkeypatch.setattr(baseline_storage, "BASELINE_PATH", str(tmp_path / "baselines"))
+    monkeypatch.setattr(baseline_storage, "_local", threading.local())
+    monkeypatch.setattr(session_history, "HISTORY_PATH", str(tmp_path / "history"))
+    monkeypatch.setattr(event_index, "EVENTS_DB_PATH", str(tmp_path / "events.db"))
+    monkeypatch.setattr(event_index, "_local", threading.local())
+    monkeypatch.setattr(llm_tactics, "cache_lookup", lambda key: None)
+    monkeypatch.setattr(llm_tactics, "cache_put", lambda key, value: None)
+    monkeypatch.setattr(pose_extractor, "available_tiers", lambda: list(pose_extractor.TIER_ORDER))
+    metrics = {
+        "left_knee_mean": 150.0,
+        "right_knee_mean": 148.0,
+        "trunk_angle_mean": 8.0,
+        "frames_analyzed": 1,
+        "fps_used": 30.0,
+    }
+    monkeypatch.setattr(routes, "analyze_posture_events", lambda path, plan: (dict(metrics), []))
+    app = FastAPI()
+    app.include_router(routes.router)
+    return app
+
+
+def _image(tmp_path):
+    path = str(tmp_path / "frame.png")
+    cv2.imwrite(path, np.zeros((32, 32, 3), dtype=np.uint8))
+    return path
+
+
+def test_cancelling_a_streamed_posture_job_stops_the_llm_stream(monkeypatch, posture_app, tmp_path):
+    seen = {"deltas": 0, "registered": None}
+
+    async def fake_stream(payload):
+        for _ in range(50):
+            seen["deltas"] += 1
+            if seen["deltas"] == 3:
+                seen["registered"] = [j["job_id"] for j in cancellation.active_jobs()]
+                cancellation.cancel_job("job-1")
+            await asyncio.sleep(0.005)
+            yield "x"
+
+    monkeypatch.setattr(llm_tactics, "stream_chat_completion", fake_stream)
+
+    async def run():
+        transport = httpx.ASGITransport(app=posture_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            with open(_image(tmp_path), "rb") as f:
+                return await client.post(
+                    "/analyze-posture/",
+                    data={"player_id": "p1", "stream": "true", "job_id": "job-1"},
+                    files={"file": ("frame.png", f, "image/png")},
+                )
+
+    response = asyncio.run(run())
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert seen["registered"] == ["job-1"]
+    assert seen["deltas"] < 50
+    assert lines[0]["type"] == "metrics"
+    assert lines[-1]["type"] == "end" and lines[-1]["status"] == "cancelled"
+    assert cancellation.active_jobs() == []
+
+
+def test_gather_cancellable_drops_unfinished_work():
+    finished = []
+
+    async def clip(i, delay):
+        await asyncio.sleep(delay)
+        finished.append(i)
+        return i
+
+    async def run():
+        job = cancellation.start_job("squad-1")
+        tasks = [asyncio.ensure_future(clip(i, 0.01 if i == 0 else 5.0)) for i in range(4)]
+        asyncio.get_running_loop().call_later(0.05, cancellation.cancel_job, "squad-1")
+        try:
+            with pytest.raises(cancellation.JobCancelled):
+                await cancellation.gather_cancellable(tasks, poll_interval=0.01)
+        finally:
+            cancellation.finish_job(job)
+        await asyncio.sleep(0)
+        return tasks
+
+    tasks = asyncio.run(run())
+    assert finished == [0]
+    assert all(task.cancelled() for task in tasks[1:])
+
+
+def test_duplicate_active_job_id_is_rejected():
+    job = cancellation.start_job("dup-1")
+    try:
+        with pytest.raises(ValueError, match="already running"):
+            cancellation.start_job("dup-1")
+        assert [j["job_id"] for j in cancellation.active_jobs()] == ["dup-1"]
+    finally:
+        cancellation.finish_job(job)
+    cancellation.finish_job(cancellation.start_job("dup-1"))
+
+
+def test_running_pool_work_stops_before_its_slot_is_released():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.services import scheduler
+
+    state = {"started": threading.Event(), "stopped": None}
+
+    def clip():
+        # Stands in for a pose worker: no job context, only the cancel file.
+        state["started"].set()
+        for _ in range(500):
+            if cancellation.is_cancelled():
+                state["stopped"] = "cancelled"
+                cancellation.check_cancelled()
+            threading.Event().wait(0.01)
+        state["stopped"] = "finished"
+
+    async def run(pool):
+        job = cancellation.start_job("squad-2")
+        task = asyncio.ensure_future(
+            run_in_lane("batch", "p1", cancellation.in_pool_job, "squad-2", job["cancel_file"], clip, executor=pool)
+        )
+        await asyncio.to_thread(state["started"].wait, 2)
+        cancellation.cancel_job("squad-2")
+        try:
+            with pytest.raises(cancellation.JobCancelled):
+                await cancellation.gather_cancellable([task], poll_interval=0.01)
+            return state["stopped"], scheduler.scheduler_status()["lanes"]["batch"]["running"]
+        finally:
+            cancellation.finish_job(job)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        stopped, running = asyncio.run(run(pool))
+    assert stopped == "cancelled"
+    assert running == 0
+
+
+def test_cancelled_job_does_not_start_lane_work():
+    ran = []
+
+    async def run():
+        job = cancellation.start_job("batch-1")
+        cancellation.cancel_job("batch-1")
+        try:
+            with pytest.raises(cancellation.JobCancelled):
+                await run_in_lane("batch", "p1", ran.append, 1)
+        finally:
+            cancellation.finish_job(job)
+
+    asyncio.run(run())
+    assert ran == []
+
+
+def test_failing_timeline_cancels_the_overlapped_encode(monkeypatch, tmp_path):
+    from app.services import admission, scheduler
+
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", False)
+    # Enough batch slots for the encode and the timeline to run side by side.
+    monkeypatch.setattr(scheduler, "SCHEDULER_WORKERS", 4)
+    monkeypatch.setattr(scheduler, "_lanes", {"batch": scheduler._new_lane("batch", {"workers": 3, "weight": 1})})
+    monkeypatch.setattr(routes, "probe_media", lambda path: None)
+    monkeypatch.setattr(
+        routes,
+        "run_detection",
+        lambda path: {"teamA_positions": [(10, 10)] * 3, "teamB_positions": [(50, 50)] * 3},
+    )
+    encode = {"started": threading.Event(), "stopped": None}
+    llm = {"cancelled": False}
+
+    def fake_encode(video_data):
+        # Polls the job token the way run_cancellable does around ffmpeg.
+        encode["started"].set()
+        for _ in range(500):
+            if cancellation.is_cancelled():
+                encode["stopped"] = "cancelled"
+                cancellation.check_cancelled()
+            threading.Event().wait(0.01)
+        encode["stopped"] = "finished"
+        return "out.mp4"
+
+    async def fake_llm(metrics_a, metrics_b):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            llm["cancelled"] = True
+            raise
+
+    def failing_timeline(video_data):
+        encode["started"].wait(2)
+        raise RuntimeError("timeline failed")
+
+    monkeypatch.setattr(routes, "encode_processed_video", fake_encode)
+    monkeypatch.setattr(routes, "enrich_tactics_with_llm", fake_llm)
+    monkeypatch.setattr(routes, "build_match_timeline", failing_timeline)
+    app = FastAPI()
+    app.include_router(routes.router)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            with open(_image(tmp_path), "rb") as f:
+                response = await client.post(
+                    "/analyze-match/",
+                    data={"player_id": "p1", "job_id": "match-1"},
+                    files={"file": ("match.png", f, "image/png")},
+                )
+        # The lane thread notices the cancelled token at its next poll.
+        for _ in range(100):
+            if encode["stopped"]:
+                break
+            await asyncio.sleep(0.01)
+        return response.json()
+
+    body = asyncio.run(run())
+    assert body == {"status": "error", "message": "timeline failed"}
+    assert encode["stopped"] == "cancelled"
+    assert llm["cancelled"]
+    assert cancellation.active_jobs() == []
+
+
+def test_posture_uploads_are_keyed_by_job(monkeypatch, posture_app, tmp_path):
+    seen = []
+    metrics = {"left_knee_mean": 150.0, "right_knee_mean": 148.0, "frames_analyzed": 1, "fps_used": 30.0}
+    monkeypatch.setattr(routes, "analyze_posture_events", lambda path, plan: seen.append(path) or (dict(metrics), []))
+
+    async def fake_injury(bundle):
+        return {}
+
+    monkeypatch.setattr(routes, "analyze_injury_with_llm", fake_injury)
+
+    async def run():
+        transport = httpx.ASGITransport(app=posture_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for job_id in ("up-1", "up-2"):
+                with open(_image(tmp_path), "rb") as f:
+                    await client.post(
+                        "/analyze-posture/",
+                        data={"player_id": "p1", "job_id": job_id},
+                        files={"file": ("frame.png", f, "image/png")},
+                    )
+
+    asyncio.run(run())
+    assert [os.path.basename(path) for path in seen] == ["up-1_frame.png", "up-2_frame.png"]
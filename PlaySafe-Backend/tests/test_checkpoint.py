@@ -0,0 +1,187 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import checkpoint, heatmaps, video_processor
+from app.models import event_index
+
+
+@pytest.fixture(autouse=True)
+def data_dirs(monkeypatch, tmp_path):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_PATH", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(heatmaps, "HEATMAP_PATH", str(tmp_path / "heatmaps"))
+    monkeypatch.setattr(event_index, "EVENTS_DB_PATH", str(tmp_path / "events.db"))
+    monkeypatch.setattr(video_processor, "CHECKPOINT_EVERY_FRAMES", 10)
+
+
+def _write_video(path, frames=45, width=320, height=180):
+    # Two red and two blue squares drifting across a dark pitch.
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (width, height))
+    for i in range(frames):
+        frame = np.full((height, width, 3), 30, dtype=np.uint8)
+        for k, (color, y) in enumerate((((0, 0, 255), 40), ((0, 0, 255), 120), ((255, 0, 0), 70), ((255, 0, 0), 150))):
+            x = 20 + (3 + k) * i % (width - 40)
+            cv2.rectangle(frame, (x, y - 10), (x + 20, y + 10), color, -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def _stores(rows):
+    return {team: tuple(list(col) for col in zip(*rows)) if rows else ([], [], [], []) for team in ("teamA", "teamB")}
+
+
+def _render_frames(match_id, count):
+    directory = checkpoint.frames_dir(match_id)
+    os.makedirs(directory, exist_ok=True)
+    for index in range(1, count + 1):
+        open(os.path.join(directory, checkpoint.FRAME_PATTERN % index), "wb").close()
+    return directory
+
+
+def test_segments_round_trip(tmp_path):
+    video = _write_video(str(tmp_path / "clip.avi"), frames=2)
+    manifest, restored = checkpoint.open_checkpoint("m1", video)
+    assert restored is None
+    _render_frames("m1", 20)
+
+    checkpoint.save_checkpoint("m1", manifest, 10, {"teamA": 3, "teamB": 1}, _stores([(1, 5, 6, 1), (2, 7, 8, 2)]))
+    stores = _stores([(1, 5, 6, 1), (2, 7, 8, 2), (11, 9, 9, 2)])
+    checkpoint.save_checkpoint("m1", manifest, 20, {"teamA": 3, "teamB": 1}, stores)
+
+    manifest, restored = checkpoint.open_checkpoint("m1", video)
+    assert manifest["segments"] == ["seg_000001.npz", "seg_000002.npz"]
+    assert manifest["frame_count"] == 20
+    assert restored["teamA"]["frame"].tolist() == [1, 2, 11]
+    assert restored["teamB"]["tid"].tolist() == [1, 2, 2]
+
+
+def test_changed_video_discards_checkpoint(tmp_path):
+    video = _write_video(str(tmp_path / "clip.avi"), frames=2)
+    manifest, _ = checkpoint.open_checkpoint("m1", video)
+    checkpoint.save_checkpoint("m1", manifest, 10, {"teamA": 2, "teamB": 1}, _stores([(1, 5, 6, 1)]))
+
+    _write_video(video, frames=3)
+    manifest, restored = checkpoint.open_checkpoint("m1", video)
+    assert restored is None
+    assert manifest["segments"] == []
+
+
+def test_missing_rendered_frames_discard_checkpoint(tmp_path):
+    video = _write_video(str(tmp_path / "clip.avi"), frames=2)
+    manifest, _ = checkpoint.open_checkpoint("m1", video)
+    directory = _render_frames("m1", 10)
+    checkpoint.save_checkpoint("m1", manifest, 10, {"teamA": 2, "teamB": 1}, _stores([(1, 5, 6, 1)]))
+
+    os.remove(os.path.join(directory, checkpoint.FRAME_PATTERN % 7))
+    manifest, restored = checkpoint.open_checkpoint("m1", video)
+    assert restored is None
+    assert manifest["frame_count"] == 0
+    assert not os.path.exists(directory)
+
+
+def test_same_named_videos_get_separate_keys(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first = _write_video(str(tmp_path / "a" / "match.avi"), frames=3)
+    second = _write_video(str(tmp_path / "b" / "match.avi"), frames=4)
+    assert checkpoint.match_key(first) != checkpoint.match_key(second)
+
+    lock = checkpoint.claim_checkpoint(checkpoint.match_key(first))
+    assert lock is not None
+    assert checkpoint.claim_checkpoint(checkpoint.match_key(first)) is None
+    assert checkpoint.claim_checkpoint(checkpoint.match_key(second)) is not None
+    checkpoint.release_checkpoint(lock)
+    assert checkpoint.claim_checkpoint(checkpoint.match_key(first)) is not None
+
+
+def test_restore_tracks_orders_by_track_then_frame():
+    columns = {
+        "frame": np.array([2, 1, 1, 3]),
+        "x": np.array([20, 10, 30, 40]),
+        "y": np.array([0, 0, 0, 0]),
+        "tid": np.array([1, 1, 2, 1]),
+    }
+    tracks = checkpoint.restore_tracks(columns, "A")
+
+    assert [t["id"] for t in tracks] == ["A1", "A2"]
+    assert tracks[0]["positions"] == [(1, 10, 0), (2, 20, 0), (3, 40, 0)]
+
+
+def test_resumed_detection_matches_uninterrupted_run(monkeypatch, tmp_path):
+    video = _write_video(str(tmp_path / "match.avi"))
+    match_id = checkpoint.match_key(video)
+    expected = video_processor.run_detection(video)
+    assert expected["num_frames"] == 45
+    assert expected["match_id"] == match_id
+    assert len(expected["teamA_positions"]) == len(expected["teamB_positions"]) == 90
+    assert not os.path.exists(checkpoint._checkpoint_dir(match_id))
+    expected_frames = sorted(os.listdir(expected["frames_dir"]))
+    assert len(expected_frames) == 45
+
+    render = video_processor.render_frame
+    rendered = []
+
+    def crash_at_frame_25(frame, *args):
+        rendered.append(1)
+        if len(rendered) == 25:
+            raise RuntimeError("worker died")
+        return render(frame, *args)
+
+    monkeypatch.setattr(video_processor, "render_frame", crash_at_frame_25)
+    with pytest.raises(RuntimeError):
+        video_processor.run_detection(video)
+    assert checkpoint._load_manifest(checkpoint._checkpoint_dir(match_id))["frame_count"] == 20
+
+    monkeypatch.setattr(video_processor, "render_frame", render)
+    resumed = video_processor.run_detection(video)
+
+    for key in ("teamA_positions", "teamB_positions", "player_metrics", "num_frames", "event_count"):
+        assert resumed[key] == expected[key]
+    for team in ("teamA", "teamB"):
+        for column in ("frame", "x", "y"):
+            np.testing.assert_array_equal(resumed["detections"][team][column], expected["detections"][team][column])
+    assert not os.path.exists(checkpoint._checkpoint_dir(match_id))
+    assert resumed["frames_dir"] != expected["frames_dir"]
+    assert sorted(os.listdir(resumed["frames_dir"])) == expected_frames
+
+
+def test_resume_without_rendered_frames_starts_over(monkeypatch, tmp_path):
+    video = _write_video(str(tmp_path / "match.avi"))
+    match_id = checkpoint.match_key(video)
+    expected = video_processor.run_detection(video)
+
+    render = video_processor.render_frame
+    rendered = []
+
+    def crash_at_frame_25(frame, *args):
+        rendered.append(1)
+        if len(rendered) == 25:
+            raise RuntimeError("worker died")
+        return render(frame, *args)
+
+    monkeypatch.setattr(video_processor, "render_frame", crash_at_frame_25)
+    with pytest.raises(RuntimeError):
+        video_processor.run_detection(video)
+    os.remove(os.path.join(checkpoint.frames_dir(match_id), checkpoint.FRAME_PATTERN % 3))
+
+    monkeypatch.setattr(video_processor, "render_frame", render)
+    rerun = video_processor.run_detection(video)
+    assert rerun["teamA_positions"] == expected["teamA_positions"]
+    assert len(os.listdir(rerun["frames_dir"])) == 45
+
+
+def test_concurrent_run_of_the_same_video_does_not_share_state(tmp_path):
+    video = _write_video(str(tmp_path / "match.avi"), frames=12)
+    match_id = checkpoint.match_key(video)
+    lock = checkpoint.claim_checkpoint(match_id)
+    try:
+        result = video_processor.run_detection(video)
+    finally:
+        checkpoint.release_checkpoint(lock)
+
+    assert result["match_id"].startswith(match_id + "-")
+    assert result["num_frames"] == 12
+    assert not os.path.exists(checkpoint._checkpoint_dir(result["match_id"]))
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from app.models import event_index
+
+
+@pytest.fixture(autouse=True)
+def events_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(event_index, "EVENTS_DB_PATH", str(tmp_path / "events.db"))
+    monkeypatch.setattr(event_index, "_local", threading.local())
+
+
+def _event(track_id, start_frame, end_frame, event_type="sprint", peak=None):
+    return {
+        "track_id": track_id,
+        "event_type": event_type,
+        "start_frame": start_frame,
+        "end_frame": end_frame,
+        "peak": peak,
+    }
+
+
+def test_detection_frames_are_one_based():
+    event_index.record_events("m1", [_event("A1", 1, 26), _event("A2", 51, 76)], 25, first_frame=1)
+
+    rows = event_index.query_events(source="m1")
+    assert [(r["start_s"], r["end_s"]) for r in rows] == [(0.0, 1.0), (2.0, 3.0)]
+
+
+def test_pose_frames_are_zero_based():
+    event_index.record_events("posture:p1:1", [_event("p1", 0, 30, "knee_valgus")], 30)
+
+    row = event_index.query_events(source="posture:p1:1")[0]
+    assert (row["start_s"], row["end_s"]) == (0.0, 1.0)
+
+
+def test_rerecording_a_source_replaces_its_events():
+    event_index.record_events("m1", [_event("A1", 1, 26), _event("A2", 51, 76)], 25, first_frame=1)
+    event_index.record_events("m1", [_event("B1", 26, 51, peak=7.5)], 25, first_frame=1)
+    event_index.record_events("m2", [_event("A1", 1, 26)], 25, first_frame=1)
+
+    rows = event_index.query_events(source="m1")
+    assert len(rows) == 1
+    assert rows[0]["track_id"] == "B1"
+    assert rows[0]["peak"] == 7.5
+
+
+def test_range_query_returns_overlapping_events():
+    # A long event that starts well before the range must still match.
+    events = [_event("A1", 1, 1001), _event("A2", 101, 126), _event("A3", 2001, 2026)]
+    event_index.record_events("m1", events, 25, first_frame=1)
+
+    rows = event_index.query_events(source="m1", start=30.0, end=50.0)
+    assert [r["track_id"] for r in rows] == ["A1"]
+    rows = event_index.query_events(start=4.0, end=4.5)
+    assert [r["track_id"] for r in rows] == ["A1", "A2"]
+
+
+def test_filters_and_limit():
+    events = [_event("A1", 1, 26), _event("A1", 51, 76, "pressing"), _event("A2", 101, 126)]
+    event_index.record_events("m1", events, 25, first_frame=1)
+
+    assert len(event_index.query_events(track_id="A1")) == 2
+    assert [r["event_type"] for r in event_index.query_events(event_type="pressing")] == ["pressing"]
+    assert len(event_index.query_events(limit=1)) == 1
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from scipy.spatial import ConvexHull, QhullError
+
+from app.services.feature_engineer import _hull_areas, compute_formation_series, build_detection_store
+
+
+def _reference_area(px, py):
+    points = np.unique(np.stack([px, py], axis=1), axis=0)
+    if len(points) < 3:
+        return 0.0
+    try:
+        # In 2-D, ConvexHull.volume is the area.
+        return ConvexHull(points).volume
+    except QhullError:
+        # Collinear points.
+        return 0.0
+
+
+def _segments(counts):
+    counts = np.asarray(counts)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    return starts, counts
+
+
+def _check(x, y, counts):
+    starts, counts = _segments(counts)
+    areas = _hull_areas(x, y, starts, counts)
+    expected = [
+        _reference_area(x[s:s + c], y[s:s + c]) if c >= 3 else 0.0 for s, c in zip(starts, counts)
+    ]
+    np.testing.assert_allclose(areas, expected, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("k", [3, 4, 7, 11, 22, 32])
+def test_random_float_frames_match_reference_hull(k):
+    rng = np.random.default_rng(k)
+    frames = 500
+    x = rng.uniform(0, 1280, frames * k)
+    y = rng.uniform(0, 720, frames * k)
+    _check(x, y, [k] * frames)
+
+
+def test_integer_frames_with_duplicates_match_reference_hull():
+    rng = np.random.default_rng(1)
+    counts = rng.integers(3, 14, 2000)
+    x = rng.integers(0, 5, counts.sum()).astype(float)
+    y = rng.integers(0, 5, counts.sum()).astype(float)
+    _check(x, y, counts)
+
+
+def test_degenerate_frames():
+    # All points equal, collinear with duplicates, a triangle with repeated
+    # vertices, and a square with its centre.
+    frames = [
+        ([2.0, 2.0, 2.0, 2.0], [3.0, 3.0, 3.0, 3.0]),
+        ([0.0, 1.0, 1.0, 2.0, 3.0, 0.0], [0.0, 1.0, 1.0, 2.0, 3.0, 0.0]),
+        ([0.0, 4.0, 0.0, 4.0, 0.0], [0.0, 0.0, 3.0, 0.0, 0.0]),
+        ([0.0, 2.0, 2.0, 0.0, 1.0], [0.0, 0.0, 2.0, 2.0, 1.0]),
+    ]
+    x = np.concatenate([np.array(f[0]) for f in frames])
+    y = np.concatenate([np.array(f[1]) for f in frames])
+    starts, counts = _segments([len(f[0]) for f in frames])
+
+    np.testing.assert_allclose(_hull_areas(x, y, starts, counts), [0.0, 0.0, 6.0, 4.0])
+
+
+def test_crowded_frames_use_fallback():
+    rng = np.random.default_rng(3)
+    k = 40
+    x = rng.uniform(0, 100, 3 * k)
+    y = rng.uniform(0, 100, 3 * k)
+    starts, counts = _segments([k] * 3)
+    areas = _hull_areas(x, y, starts, counts)
+    expected = [_reference_area(x[s:s + k], y[s:s + k]) for s in starts]
+    # cv2 works in float32.
+    np.testing.assert_allclose(areas, expected, rtol=1e-5)
+
+
+def test_formation_series_hull_area():
+    store = build_detection_store(
+        [1, 1, 1, 1, 3, 3, 3],
+        [0.0, 10.0, 10.0, 0.0, 0.0, 5.0, 0.0],
+        [0.0, 0.0, 10.0, 10.0, 0.0, 0.0, 5.0],
+    )
+    series = compute_formation_series(store, 3)
+
+    assert series["hull_area"][0] == pytest.approx(100.0)
+    assert np.isnan(series["hull_area"][1])
+    assert series["hull_area"][2] == pytest.approx(12.5)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.services import heatmaps
+
+
+@pytest.fixture(autouse=True)
+def heatmap_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(heatmaps, "HEATMAP_PATH", str(tmp_path))
+    # Compact often so merging across batches is exercised.
+    monkeypatch.setattr(heatmaps, "HEATMAP_COMPACT_EVERY", 50)
+
+
+def _dense(points, width, height, rows, cols):
+    grid = np.zeros((rows, cols), dtype=np.int64)
+    for x, y in points:
+        grid[min(int(y * rows / height), rows - 1), min(int(x * cols / width), cols - 1)] += 1
+    return grid
+
+
+def _fill(frames=300, tracks=40, seed=0):
+    rng = np.random.default_rng(seed)
+    state = heatmaps.new_heatmaps(1280, 720, rows=8, cols=12)
+    seen = {}
+    for _ in range(frames):
+        for team, prefix in (("teamA", "A"), ("teamB", "B")):
+            count = int(rng.integers(0, 6))
+            centers = [(float(x), float(y)) for x, y in zip(rng.uniform(0, 1280, count), rng.uniform(0, 720, count))]
+            ids = [f"{prefix}{t}" for t in rng.integers(0, tracks, count)]
+            heatmaps.accumulate_heatmaps(state, team, centers, ids)
+            for track_id, center in zip(ids, centers):
+                seen.setdefault(track_id, []).append(center)
+            seen.setdefault(team, []).extend(centers)
+    return state, seen
+
+
+def test_player_and_team_grids_match_dense_reference():
+    state, seen = _fill()
+    heatmaps.save_heatmaps("m1", state)
+
+    for key, points in seen.items():
+        if key.startswith("team"):
+            result = heatmaps.load_heatmap("m1", team=key)
+        else:
+            result = heatmaps.load_heatmap("m1", player_id=key)
+        np.testing.assert_array_equal(result["counts"], _dense(points, 1280, 720, 8, 12))
+        assert result["total"] == len(points)
+
+    assert result["player_ids"] == sorted(k for k in seen if not k.startswith("team"))
+
+
+def test_player_counts_are_stored_sparsely():
+    state, _ = _fill(frames=50, tracks=500, seed=1)
+    heatmaps._compact(state)
+
+    # One entry per distinct (track, cell) pair, not a grid per track.
+    hits = int(state["counts"].sum())
+    assert len(state["keys"]) <= hits
+    assert state["teams"]["teamA"].sum() + state["teams"]["teamB"].sum() == hits
+
+
+def test_unknown_player_and_downsample():
+    state, seen = _fill(frames=20)
+    heatmaps.save_heatmaps("m1", state)
+
+    with pytest.raises(ValueError):
+        heatmaps.load_heatmap("m1", player_id="Z1")
+    result = heatmaps.load_heatmap("m1", team="teamB", downsample=5)
+    assert result["shape"] == [2, 3]
+    assert result["total"] == len(seen["teamB"])
+    assert heatmaps.load_heatmap("missing") is None
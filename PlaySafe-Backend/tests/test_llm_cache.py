@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services import llm_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", os.path.join(str(tmp_path), "llm_cache.db"))
+    monkeypatch.setattr(llm_cache, "_conn", None)
+    monkeypatch.setattr(llm_cache, "_inflight", {})
+    yield
+    if llm_cache._conn is not None:
+        llm_cache._conn.close()
+
+
+def _fetcher(calls, delay=0.05, result=None):
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result or {"answer": len(calls)}
+
+    return fetch
+
+
+def test_concurrent_misses_coalesce():
+    calls = []
+
+    async def run():
+        fetch = _fetcher(calls)
+        return await asyncio.gather(*[llm_cache.get_or_fetch("k", fetch) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert calls == [1]
+    assert results == [{"answer": 1}] * 5
+    assert llm_cache.cache_get("k") == {"answer": 1}
+
+
+def test_cancelled_leader_hands_over_to_follower():
+    calls = []
+
+    async def run():
+        fetch = _fetcher(calls, delay=0.2)
+        leader = asyncio.create_task(llm_cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.05)
+        followers = [asyncio.create_task(llm_cache.get_or_fetch("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    results = asyncio.run(run())
+    # One follower re-fetched; the others coalesced onto it.
+    assert calls == [1, 1]
+    assert results == [{"answer": 2}] * 3
+
+
+def test_upstream_error_reaches_followers():
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(
+            *[llm_cache.get_or_fetch("k", failing) for _ in range(3)], return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert llm_cache.cache_get("k") is None
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import llm_client
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "tactics"}]}
+
+
+@pytest.fixture
+def client_config(monkeypatch, llm_stub):
+    def configure(concurrency=8, retries=3, **stub_options):
+        base_url, app = llm_stub(**stub_options)
+        monkeypatch.setenv("NVIDIA_API_KEY", "stub")
+        monkeypatch.setattr(llm_client, "LLM_BASE_URL", base_url)
+        monkeypatch.setattr(llm_client, "LLM_MAX_CONCURRENCY", concurrency)
+        monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", retries)
+        monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE_S", 0.01)
+        monkeypatch.setattr(llm_client, "LLM_BACKOFF_MAX_S", 0.02)
+        monkeypatch.setattr(llm_client, "_client", None)
+        return app.state.stats
+
+    return configure
+
+
+async def _run_calls(count):
+    try:
+        return await asyncio.gather(*[llm_client.post_chat_completion(PAYLOAD) for _ in range(count)])
+    finally:
+        await llm_client.close_client()
+
+
+def test_concurrency_is_bounded_by_semaphore(client_config):
+    stats = client_config(concurrency=4, latency=0.1, jitter=0.0)
+    results = asyncio.run(_run_calls(16))
+
+    assert all(r["choices"][0]["message"]["content"] for r in results)
+    assert stats["requests"] == 16
+    assert stats["max_inflight"] == 4
+
+
+def test_concurrent_throughput(client_config):
+    stats = client_config(concurrency=8, latency=0.1, jitter=0.0)
+    started = time.perf_counter()
+    results = asyncio.run(_run_calls(32))
+    elapsed = time.perf_counter() - started
+
+    assert len(results) == 32
+    # 32 calls of 100 ms through 8 pooled slots: about 0.4 s, not 3.2 s.
+    assert elapsed < 1.6
+    assert stats["max_inflight"] == 8
+
+
+def test_retries_transient_failures(client_config):
+    stats = client_config(concurrency=8, retries=8, latency=0.0, jitter=0.0, failure_rate=0.3, seed=7)
+    results = asyncio.run(_run_calls(20))
+
+    assert all(r["choices"] for r in results)
+    assert stats["failures"] > 0
+    assert stats["requests"] == 20 + stats["failures"]
+
+
+def test_no_api_key_skips_upstream(client_config, monkeypatch):
+    stats = client_config()
+    monkeypatch.delenv("NVIDIA_API_KEY")
+
+    assert asyncio.run(_run_calls(1)) == [None]
+    assert stats["requests"] == 0
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import llm_tactics
+
+
+def _bundle():
+    return {
+        "current": {"left_knee_mean": 151.3, "trunk_angle_mean": 12.4},
+        "baseline": {"left_knee_mean": 148.9, "trunk_angle_mean": 11.6},
+        "deltas": {"left_knee_mean": 2.43, "trunk_angle_mean": 0.84},
+        "sessions": 6,
+        "z_scores": {"left_knee_mean": 1.37, "trunk_angle_mean": -0.62},
+        "anthropometrics": None,
+    }
+
+
+def _prompt_line(prompt, prefix):
+    line = next(line for line in prompt.splitlines() if line.startswith(prefix))
+    return json.loads(line.split(": ", 1)[1])
+
+
+def test_deviations_keep_their_resolution_in_the_prompt():
+    prompt = llm_tactics._injury_payload(_bundle())["messages"][1]["content"]
+
+    # Raw metrics still use the per-metric buckets...
+    assert _prompt_line(prompt, "Current metrics") == {"left_knee_mean": 152.0, "trunk_angle_mean": 12.0}
+    # ...but z-scores and deltas are not snapped to those (2.0 for knees).
+    assert _prompt_line(prompt, "Z-scores") == {"left_knee_mean": 1.4, "trunk_angle_mean": -0.6}
+    assert _prompt_line(prompt, "Current minus baseline deltas") == {"left_knee_mean": 2.4, "trunk_angle_mean": 0.8}
+
+
+def test_squad_blocks_quantize_deviations_the_same_way():
+    block = llm_tactics.build_injury_metrics_block(llm_tactics.quantize_injury_bundle(_bundle()))
+    prompt = llm_tactics._injury_payload(_bundle())["messages"][1]["content"]
+    assert prompt.endswith(block)
+
+
+LLM_ANSWER = {
+    "risk_score": 0.62,
+    "risk_level": "moderate",
+    "primary_risks": ["left knee valgus"],
+    "explanations": ["Knee flexion is 1.4 SD below baseline.", 'Trunk lean "spikes" at decel.'],
+    "recommendations": ["Reduce cutting volume", "Eccentric hamstring work", "Re-test in 7 days"],
+    "zone_risks": [{"zone": "left_knee", "level": "high", "description": "valgus under load"}],
+}
+
+
+@pytest.fixture
+def llm_stream(monkeypatch):
+    state = {"chunks": [], "puts": []}
+
+    async def fake_stream(payload):
+        for chunk in state["chunks"]:
+            await asyncio.sleep(0)
+            yield chunk
+
+    monkeypatch.setattr(llm_tactics, "stream_chat_completion", fake_stream)
+    monkeypatch.setattr(llm_tactics, "cache_lookup", lambda key: None)
+    monkeypatch.setattr(llm_tactics, "cache_put", lambda key, value: state["puts"].append((key, value)))
+    return state
+
+
+def _collect(bundle):
+    async def run():
+        return [event async for event in llm_tactics.stream_injury_analysis(bundle)]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 10_000])
+def test_stream_emits_tokens_items_then_validated_result(llm_stream, chunk_size):
+    content = json.dumps(LLM_ANSWER, indent=2)
+    llm_stream["chunks"] = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+
+    events = _collect(_bundle())
+
+    tokens = [e for e in events if e["type"] == "token"]
+    items = [e for e in events if e["type"] == "item"]
+    assert "".join(e["text"] for e in tokens) == content
+    assert [(e["field"], e["index"], e["text"]) for e in items] == [
+        ("explanations", i, text) for i, text in enumerate(LLM_ANSWER["explanations"])
+    ] + [("recommendations", i, text) for i, text in enumerate(LLM_ANSWER["recommendations"])]
+    # Items are sent as their strings close, not when the stream ends.
+    if len(tokens) > 1:
+        first_item = next(i for i, e in enumerate(events) if e["type"] == "item")
+        assert first_item < events.index(tokens[-1])
+
+    assert events[-1]["type"] == "result" and events[-1]["cached"] is False
+    assert events[-1]["injury_analysis"] == llm_tactics.normalize_injury_result(LLM_ANSWER)
+    key = llm_tactics.cache_key(llm_tactics._injury_payload(_bundle()))
+    assert llm_stream["puts"] == [(key, LLM_ANSWER)]
+
+
+def test_invalid_streamed_payload_is_not_cached(llm_stream):
+    llm_stream["chunks"] = ['{"risk_score": "high", "explanations": ["a", "b"]', "}"]
+
+    events = _collect(_bundle())
+
+    assert [e["text"] for e in events if e["type"] == "item"] == ["a", "b"]
+    assert events[-1] == {
+        "type": "result",
+        "injury_analysis": llm_tactics._empty_injury_result(),
+        "error": "invalid_llm_payload",
+    }
+    assert llm_stream["puts"] == []
+
+
+def test_cached_analysis_skips_the_stream(llm_stream, monkeypatch):
+    monkeypatch.setattr(llm_tactics, "cache_lookup", lambda key: LLM_ANSWER)
+    llm_stream["chunks"] = ["never sent"]
+
+    events = _collect(_bundle())
+
+    assert events == [
+        {"type": "result", "cached": True, "injury_analysis": llm_tactics.normalize_injury_result(LLM_ANSWER)}
+    ]
+
+
+def test_list_scan_only_reads_new_text():
+    scan = llm_tactics._new_list_scan("explanations")
+    text = '{"risk_score": 0.1, "expla'
+    assert llm_tactics._scan_list_items(text, scan) == []
+    text += 'nations": ["one", "tw'
+    assert llm_tactics._scan_list_items(text, scan) == ["one"]
+    offset = scan["pos"]
+    text += 'o", "three"], "recommendations": ["x"]}'
+    assert llm_tactics._scan_list_items(text, scan) == ["two", "three"]
+    assert scan["pos"] > offset and scan["closed"]
+    assert llm_tactics._scan_list_items(text, scan) == []
@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.services import pose_extractor
+
+
+@pytest.fixture(autouse=True)
+def tiers(monkeypatch):
+    monkeypatch.setattr(pose_extractor, "_tier_ms", {"lite": 10.0, "full": 30.0, "heavy": 100.0})
+    monkeypatch.setattr(pose_extractor, "POSE_DEFAULT_TIER", "full")
+    monkeypatch.setattr(pose_extractor, "POSE_MIN_SAMPLED_FRAMES", 30)
+    monkeypatch.setattr(pose_extractor, "available_tiers", lambda: ["lite", "full", "heavy"])
+
+
+def test_default_plan_reads_every_frame():
+    plan = pose_extractor.select_pose_plan(120)
+    assert (plan["tier"], plan["stride"], plan["frames"], plan["fallback_from"]) == ("full", 1, 120, None)
+
+
+def test_budget_picks_heaviest_tier_that_samples_enough_frames():
+    # heavy: 3000 ms / 100 ms = 30 samples of 300 -> stride 10.
+    plan = pose_extractor.select_pose_plan(300, latency_budget_ms=3000)
+    assert (plan["tier"], plan["stride"], plan["frames"]) == ("heavy", 10, 30)
+    assert plan["estimated_ms"] <= 3000
+
+    # heavy would only get 9 samples; full gets 30 of 300.
+    plan = pose_extractor.select_pose_plan(300, latency_budget_ms=900)
+    assert (plan["tier"], plan["stride"], plan["frames"]) == ("full", 10, 30)
+
+
+def test_budget_below_the_lightest_tier_still_samples_one_frame():
+    plan = pose_extractor.select_pose_plan(300, latency_budget_ms=5)
+    assert (plan["tier"], plan["frames"], plan["stride"]) == ("lite", 1, 300)
+
+
+def test_quality_thins_frames_to_fit_the_budget():
+    plan = pose_extractor.select_pose_plan(200, latency_budget_ms=1000, quality="lite")
+    assert (plan["tier"], plan["stride"], plan["frames"]) == ("lite", 2, 100)
+
+
+def test_window_is_capped_at_max_posture_frames():
+    plan = pose_extractor.select_pose_plan(10_000)
+    assert plan["window_frames"] == pose_extractor.MAX_POSTURE_FRAMES
+    assert plan["frames"] == pose_extractor.MAX_POSTURE_FRAMES
+
+
+def test_unknown_quality_is_rejected():
+    with pytest.raises(ValueError):
+        pose_extractor.select_pose_plan(100, quality="ultra")
+
+
+def test_uninstalled_quality_falls_back_to_nearest_installed_tier(monkeypatch):
+    monkeypatch.setattr(pose_extractor, "available_tiers", lambda: ["lite", "full"])
+
+    plan = pose_extractor.select_pose_plan(100, quality="heavy")
+    assert (plan["tier"], plan["fallback_from"]) == ("full", "heavy")
+    assert plan["ms_per_frame"] == 30.0
+
+    plan = pose_extractor.select_pose_plan(300, latency_budget_ms=300, quality="heavy")
+    assert (plan["tier"], plan["frames"], plan["fallback_from"]) == ("full", 10, "heavy")
+
+
+def test_uninstalled_default_tier_falls_back(monkeypatch):
+    monkeypatch.setattr(pose_extractor, "available_tiers", lambda: ["lite"])
+
+    assert pose_extractor.select_pose_plan(100)["tier"] == "lite"
+    # A budget picks among installed tiers, so nothing was substituted.
+    plan = pose_extractor.select_pose_plan(100, latency_budget_ms=3000)
+    assert (plan["tier"], plan["fallback_from"]) == ("lite", None)
+
+
+def test_no_installed_model_is_an_error(monkeypatch):
+    monkeypatch.setattr(pose_extractor, "available_tiers", lambda: [])
+
+    with pytest.raises(RuntimeError, match="No pose model is installed"):
+        pose_extractor.select_pose_plan(100)
+
+
+def test_stride_decodes_only_sampled_frames(monkeypatch, tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for i in range(50):
+        writer.write(np.full((48, 64, 3), i * 5, dtype=np.uint8))
+    writer.release()
+
+    seen = []
+
+    def fake_extract(frame, tier=None):
+        seen.append((int(frame[0, 0, 0]), tier))
+        return [(0.5, 0.1 + 0.01 * j, 0.0) for j in range(33)]
+
+    monkeypatch.setattr(pose_extractor, "get_landmarker", lambda tier=None: object())
+    monkeypatch.setattr(pose_extractor, "extract_pose", fake_extract)
+
+    plan = pose_extractor.select_pose_plan(50, latency_budget_ms=130, quality="lite")
+    assert (plan["stride"], plan["frames"]) == (4, 13)
+    metrics = pose_extractor.analyze_posture_file(path, plan=plan)
+
+    assert metrics["frames_analyzed"] == 13
+    assert len(seen) == 13 and {tier for _, tier in seen} == {"lite"}
+    # Frames 0, 4, 8, ... were decoded (pixel value 5 * index, MJPG-lossy).
+    assert [value for value, _ in seen][:3] == pytest.approx([0, 20, 40], abs=3)
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.services.scheduler import run_in_lane
+from app.utils import profiling
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def profiled_lane_work():
+    _spin(0.2)
+
+
+def other_lane_work():
+    _spin(0.3)
+
+
+def profiled_loop_work():
+    _spin(0.1)
+
+
+def other_loop_work():
+    _spin(0.1)
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/profiled")
+    async def profiled():
+        profiled_loop_work()
+        await run_in_lane("interactive", "p1", profiled_lane_work)
+        return {"ok": True}
+
+    @app.get("/other")
+    async def other():
+        await asyncio.sleep(0.05)
+        other_loop_work()
+        await run_in_lane("batch", "p2", other_lane_work)
+        return {"ok": True}
+
+    app.add_middleware(profiling.ProfileMiddleware)
+    return app
+
+
+def test_profile_only_samples_the_requests_own_work(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    monkeypatch.setattr(profiling, "PROFILE_PATH", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_INTERVAL_S", 0.002)
+
+    async def run():
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                client.get("/profiled", headers={"X-PlaySafe-Profile": "1"}),
+                client.get("/other"),
+            )
+
+    profiled, other = asyncio.run(run())
+
+    profile_id = profiled.headers["x-profile-id"]
+    assert "x-profile-id" not in other.headers
+    with open(os.path.join(str(tmp_path), profile_id + ".folded")) as f:
+        folded = f.read()
+    assert "profiled_lane_work" in folded
+    assert "profiled_loop_work" in folded
+    assert "other_lane_work" not in folded
+    assert "other_loop_work" not in folded
+
+
+def test_profiling_disabled_skips_middleware():
+    from app.main import app
+
+    assert all(m.cls is not profiling.ProfileMiddleware for m in app.user_middleware)
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+
+import pytest
+
+from app.models import session_history
+
+DAY = session_history.DAY_S
+T0 = 1_700_000_000.0
+SERIES_KEYS = {"mean", "std", "min", "max", "count"}
+
+
+@pytest.fixture(autouse=True)
+def history_dir(monkeypatch, tmp_path):
+    path = str(tmp_path / "history")
+    monkeypatch.setenv("HISTORY_PATH", path)
+    monkeypatch.setenv("HISTORY_CHUNK_ROWS", "4")
+    monkeypatch.setattr(session_history, "HISTORY_PATH", path)
+    monkeypatch.setattr(session_history, "HISTORY_CHUNK_ROWS", 4)
+    return path
+
+
+def _append_days(player_id, values, start=T0, step=DAY):
+    for i, value in enumerate(values):
+        session_history.append_session(player_id, {"knee": value, "label": "x"}, ts=start + i * step)
+
+
+def _append_many(player_id, offset, count):
+    for i in range(count):
+        session_history.append_session(player_id, {"knee": float(offset + i)}, ts=T0 + offset + i)
+
+
+def test_raw_history_round_trips_across_sealed_segments():
+    _append_days("p1", [float(v) for v in range(10)])
+
+    directory = session_history._player_dir("p1")
+    assert len(session_history._load_index(directory)["chunks"]) == 2
+    result = session_history.get_history("p1")
+
+    assert result["resolution"] == "raw"
+    assert result["t"] == [T0 + i * DAY for i in range(10)]
+    assert result["series"]["knee"]["mean"] == [float(v) for v in range(10)]
+    assert set(result["series"]["knee"]) == SERIES_KEYS
+
+
+def test_rollups_include_active_segment_and_share_keys():
+    midnight = (T0 // DAY) * DAY
+    _append_days("p1", [1.0, 3.0, 5.0, 7.0, 9.0, 11.0], start=midnight, step=DAY / 2)
+    result = session_history.get_history("p1", max_points=3)
+
+    assert result["resolution"] == "day"
+    knee = result["series"]["knee"]
+    assert set(knee) == SERIES_KEYS
+    assert knee["count"] == [2, 2, 2]
+    assert knee["mean"] == [2.0, 6.0, 10.0]
+    assert knee["std"] == pytest.approx([2 ** 0.5] * 3)
+    assert knee["min"] == [1.0, 5.0, 9.0]
+
+
+def test_week_rollup_when_days_exceed_max_points():
+    _append_days("p1", [float(v) for v in range(21)])
+    result = session_history.get_history("p1", max_points=5)
+
+    assert result["resolution"] == "week"
+    assert sum(result["series"]["knee"]["count"]) == 21
+    total = sum(m * c for m, c in zip(result["series"]["knee"]["mean"], result["series"]["knee"]["count"]))
+    assert total == pytest.approx(sum(range(21)))
+
+
+def test_append_only_rewrites_rollups_when_a_segment_seals():
+    _append_days("p1", [1.0, 2.0, 3.0, 4.0])
+    directory = session_history._player_dir("p1")
+    rollup = os.path.join(directory, "rollup_day.npz")
+    sealed_at = os.stat(rollup).st_mtime_ns
+
+    _append_days("p1", [5.0, 6.0], start=T0 + 10 * DAY)
+
+    assert os.stat(rollup).st_mtime_ns == sealed_at
+    assert session_history.get_history("p1")["series"]["knee"]["mean"][-2:] == [5.0, 6.0]
+
+
+def test_parallel_process_appends_lose_no_rows():
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_append_many, args=("p1", i * 100, 15)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    result = session_history.get_history("p1", max_points=1000)
+    assert len(result["t"]) == 60
+    assert sorted(result["series"]["knee"]["mean"]) == sorted(
+        float(i * 100 + j) for i in range(4) for j in range(15)
+    )
+
+
+def test_seal_interrupted_before_the_index_is_redone_once(monkeypatch):
+    real_save_index = session_history._save_index
+
+    def crash(directory, index):
+        raise OSError("crashed")
+
+    monkeypatch.setattr(session_history, "_save_index", crash)
+    with pytest.raises(OSError):
+        _append_days("p1", [1.0, 2.0, 3.0, 4.0])
+    monkeypatch.setattr(session_history, "_save_index", real_save_index)
+
+    # Chunk and rollups were written, the index was not: a query finishes it.
+    result = session_history.get_history("p1")
+    assert result["series"]["knee"]["mean"] == [1.0, 2.0, 3.0, 4.0]
+    assert session_history.get_history("p1", max_points=1)["series"]["knee"]["count"] == [4]
+
+    _append_days("p1", [5.0], start=T0 + 10 * DAY)
+    assert session_history.get_history("p1", max_points=1)["series"]["knee"]["count"] == [5]
+    directory = session_history._player_dir("p1")
+    assert not [name for name in os.listdir(directory) if name.startswith("sealing_")]
+
+
+def test_sealing_file_left_after_the_index_is_not_sealed_again():
+    _append_days("p1", [1.0, 2.0, 3.0, 4.0])
+    directory = session_history._player_dir("p1")
+    # A crash between writing the index and removing the sealing file.
+    with open(session_history._sealing_path(directory, 1), "w") as f:
+        for i, value in enumerate([1.0, 2.0, 3.0, 4.0]):
+            f.write('{"ts": %r, "is_baseline": 0.0, "m__knee": %r}\n' % (T0 + i * DAY, value))
+
+    _append_days("p1", [5.0], start=T0 + 10 * DAY)
+
+    assert session_history.get_history("p1", max_points=1)["series"]["knee"]["count"] == [5]
+    assert len(session_history._load_index(directory)["chunks"]) == 1
+    assert not os.path.exists(session_history._sealing_path(directory, 1))
+
+
+def test_unknown_player_has_empty_history():
+    assert session_history.get_history("nobody") == {"resolution": "raw", "t": [], "series": {}}
+    assert not os.path.exists(session_history._player_dir("nobody"))
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.services.feature_engineer import (
+    build_detection_store,
+    compute_formation_metrics,
+    compute_formation_series,
+    aggregate_formation_windows,
+)
+from app.services.risk_analyzer import analyze_tactics
+from app.services.tactical_timeline import FORMATION_LABELS, analyze_tactics_batch, build_team_timeline
+
+TACTIC_FIELDS = ("goal_probability", "tactical_score", "pressing_intensity", "possession_rate")
+
+
+def _assert_window_matches(batch, i, expected):
+    assert FORMATION_LABELS[batch["formation_code"][i]] == expected["formation"]
+    for field in TACTIC_FIELDS:
+        assert batch[field][i] == expected[field], (i, field)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_matches_scalar_on_random_metrics(seed):
+    rng = np.random.default_rng(seed)
+    n = 500
+    width = rng.uniform(0, 1000, n)
+    depth = rng.uniform(0, 700, n)
+    compactness = rng.uniform(0, 400000, n)
+    # Threshold edges and the empty-window case.
+    width[:6] = [600, 600.0001, 400, 400.0001, 0, 0]
+    depth[:6] = [400.0001, 400, 0, 500, 0, 0]
+    compactness[:6] = [100000, 300000, 0, 1, 0, 0]
+
+    batch = analyze_tactics_batch(width, depth, compactness)
+    for i in range(n):
+        expected = analyze_tactics({"width": width[i], "depth": depth[i], "compactness": compactness[i]})
+        _assert_window_matches(batch, i, expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_timeline_windows_match_scalar_analysis(seed):
+    # One frame per window, so each timeline window is exactly one frame's
+    # detections; includes empty and single-player windows.
+    rng = np.random.default_rng(seed)
+    num_frames = 200
+    frames, xs, ys, per_frame = [], [], [], []
+    for frame in range(1, num_frames + 1):
+        players = int(rng.choice([0, 1, 2, rng.integers(3, 12)]))
+        positions = [(int(rng.integers(0, 1280)), int(rng.integers(0, 720))) for _ in range(players)]
+        per_frame.append(positions)
+        for x, y in positions:
+            frames.append(frame)
+            xs.append(x)
+            ys.append(y)
+    assert any(len(p) == 0 for p in per_frame) and any(len(p) == 1 for p in per_frame)
+
+    series = compute_formation_series(build_detection_store(frames, xs, ys), num_frames)
+    windows = aggregate_formation_windows(series, 1, 1)
+    timeline = build_team_timeline(windows, fps=25.0)
+
+    assert len(timeline["formation"]) == num_frames
+    for i, positions in enumerate(per_frame):
+        expected = analyze_tactics(compute_formation_metrics(positions))
+        assert timeline["formation"][i] == expected["formation"]
+        for field in TACTIC_FIELDS:
+            assert timeline[field][i] == expected[field], (i, field)
+
+
+def test_empty_input_gives_empty_batch():
+    batch = analyze_tactics_batch([], [], [])
+    assert all(len(values) == 0 for values in batch.values())
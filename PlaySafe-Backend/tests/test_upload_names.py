@@ -0,0 +1,24 @@
+import pytest
+
+from app.api.routes import _safe_name
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("match.mp4", "match.mp4"),
+        ("../../etc/passwd", "passwd"),
+        ("..\\..\\app\\config.py", "config.py"),
+        ("..hidden.mp4", "hidden.mp4"),
+        ("clip 1 (final).mp4", "clip_1__final_.mp4"),
+        ("p/../../x", "x"),
+    ],
+)
+def test_safe_name_strips_paths(name, expected):
+    assert _safe_name(name) == expected
+
+
+@pytest.mark.parametrize("name", ["", "..", "/", None])
+def test_safe_name_rejects_empty(name):
+    with pytest.raises(ValueError):
+        _safe_name(name)
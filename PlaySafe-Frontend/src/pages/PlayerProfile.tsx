@@ -186,6 +186,7 @@ const PlayerProfile = () => {
     formData.append("position", player.position);
     formData.append("preferred_foot", player.foot);
     formData.append("mode", treatAsBaseline ? "baseline" : "analysis");
+    formData.append("stream", "true");
     try {
       setInjuryLoading(true);
       setInjuryError(null);
@@ -193,11 +194,50 @@ const PlayerProfile = () => {
         method: "POST",
         body: formData,
       });
-      const data = await res.json();
-      setInjuryResult(data);
-      if (data.status !== "success") {
-        setInjuryError(data.message || "No pose detected in the uploaded media.");
+      const contentType = res.headers.get("content-type") || "";
+      if (!contentType.includes("ndjson") || !res.body) {
+        const data = await res.json();
+        setInjuryResult(data);
+        if (data.status !== "success") {
+          setInjuryError(data.message || "No pose detected in the uploaded media.");
+        }
+        return;
       }
+
+      // Streamed response: show pose metrics immediately, then fill in
+      // explanations/recommendations as the model produces them.
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      const handleEvent = (event: any) => {
+        if (event.type === "metrics") {
+          setInjuryResult({
+            ...event,
+            injury_analysis: { explanations: [], recommendations: [], zone_risks: [] },
+          });
+        } else if (event.type === "item") {
+          setInjuryResult((prev: any) => {
+            if (!prev) return prev;
+            const analysis = prev.injury_analysis || {};
+            const items = [...(analysis[event.field] || [])];
+            items[event.index] = event.text;
+            return { ...prev, injury_analysis: { ...analysis, [event.field]: items } };
+          });
+        } else if (event.type === "result") {
+          setInjuryResult(event);
+        }
+      };
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop() || "";
+        for (const line of lines) {
+          if (line.trim()) handleEvent(JSON.parse(line));
+        }
+      }
+      if (buffer.trim()) handleEvent(JSON.parse(buffer));
     } catch {
       setInjuryError("Injury analysis backend error");
     } finally {